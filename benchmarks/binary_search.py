@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark of sorted array membership: previous recursive binary search and per value
+utils.binary_search_number against batch membership.contains_batch
+(bisect fallback and numpy searchsorted when numpy is installed).
+
+run: binary_search.py --sizes 1e3,1e4,1e5,1e6,1e7,1e8 --queries 100000 --output results.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyfastogt import membership, utils  # noqa: E402
+
+PROJECT_NAME = 'binary_search'
+DEFAULT_SIZES = '1e3,1e4,1e5,1e6,1e7,1e8'
+DEFAULT_QUERIES = 100000
+
+
+def recursive_binary_search(number, array, lo, hi):  # implementation replaced by iterative one, baseline
+    if hi < lo:
+        return False
+
+    mid = (lo + hi) // 2
+    if number == array[mid]:
+        return True
+    elif number < array[mid]:
+        return recursive_binary_search(number, array, lo, mid - 1)
+    else:
+        return recursive_binary_search(number, array, mid + 1, hi)
+
+
+def make_data(size: int, queries: int, seed: int):
+    # even numbers are stored, so about half of random queries miss
+    sorted_values = array('q', range(0, 2 * size, 2))
+    rnd = random.Random(seed)
+    values = array('q', (rnd.randrange(2 * size) for _ in range(queries)))
+    return sorted_values, values
+
+
+def measure(func, repeat: int) -> float:  # best of repeat, seconds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_size(size: int, queries: int, repeat: int, seed: int) -> dict:
+    sorted_values, values = make_data(size, queries, seed)
+    expected = [utils.binary_search_number(value, sorted_values) for value in values]
+    methods = {
+        'recursive': lambda: [recursive_binary_search(value, sorted_values, 0, len(sorted_values) - 1)
+                              for value in values],
+        'binary_search_number': lambda: [utils.binary_search_number(value, sorted_values) for value in values],
+        'contains_batch_bisect': lambda: membership.contains_batch(sorted_values, values, use_numpy=False)
+    }
+    if membership.numpy:
+        methods['contains_batch_numpy'] = lambda: membership.contains_batch(sorted_values, values)
+
+    results = {}
+    for name, func in methods.items():
+        if list(func()) != expected:
+            raise RuntimeError('{0} mismatch at size {1}'.format(name, size))
+        elapsed = measure(func, repeat)
+        results[name] = {'time': elapsed, 'queries_per_second': queries / elapsed if elapsed else 0.0}
+    return results
+
+
+def print_results(results: dict):
+    print('{0:>12} {1:<24} {2:>10} {3:>16} {4:>9}'.format('size', 'method', 'time, s', 'queries/s', 'speedup'))
+    for size, methods in results['sizes'].items():
+        base = methods['recursive']['time']
+        for name, metrics in methods.items():
+            speedup = base / metrics['time'] if metrics['time'] else 0.0
+            print('{0:>12} {1:<24} {2:>10.4f} {3:>16.0f} {4:>8.1f}x'.format(size, name, metrics['time'],
+                                                                           metrics['queries_per_second'], speedup))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog=PROJECT_NAME, usage='%(prog)s [options]')
+    parser.add_argument('--sizes', help='comma separated sorted array sizes (default: {0})'.format(DEFAULT_SIZES),
+                        default=DEFAULT_SIZES)
+    parser.add_argument('--queries', help='values looked up per size (default: {0})'.format(DEFAULT_QUERIES),
+                        type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--repeat', help='runs per method, best is taken (default: 3)', type=int, default=3)
+    parser.add_argument('--seed', help='random seed of queries (default: 0)', type=int, default=0)
+    parser.add_argument('--output', help='json results file')
+
+    argv = parser.parse_args()
+    results = {'queries': argv.queries, 'numpy': bool(membership.numpy), 'sizes': {}}
+    for size in argv.sizes.split(','):
+        size = int(float(size))
+        results['sizes'][size] = run_size(size, argv.queries, argv.repeat, argv.seed)
+
+    print_results(results)
+    if argv.output:
+        with open(argv.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0)
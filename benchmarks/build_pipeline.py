@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of BuildRequest clone/download/build pipeline on small local fixture projects.
+
+run:     build_pipeline.py run --repeat 3 --output results.json
+compare: build_pipeline.py compare baseline.json results.json --threshold 10
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyfastogt import build_trace  # noqa: E402
+from pyfastogt.build_utils import BuildRequest  # noqa: E402
+
+PROJECT_NAME = 'build_pipeline'
+FIXTURE_VERSION = '1.0.0'
+
+CMAKE_PROJECT = {
+    'CMakeLists.txt': 'cmake_minimum_required(VERSION 3.5)\n'
+                      'project(tiny_cmake C)\n'
+                      'add_library(tiny_cmake STATIC tiny.c)\n'
+                      'install(TARGETS tiny_cmake DESTINATION lib)\n'
+                      'install(FILES tiny.h DESTINATION include)\n',
+    'tiny.c': '#include "tiny.h"\nint tiny_cmake(void) { return 42; }\n',
+    'tiny.h': 'int tiny_cmake(void);\n'
+}
+
+# hand written configure script keeps fixture free of autoconf/automake
+CONFIGURE_PROJECT = {
+    'configure': '#!/bin/sh\n'
+                 'prefix=/usr/local\n'
+                 'for arg in "$@"; do case $arg in --prefix=*) prefix=${arg#--prefix=};; esac; done\n'
+                 'sed "s|@prefix@|$prefix|" Makefile.in > Makefile\n',
+    'Makefile.in': 'prefix = @prefix@\n'
+                   'CC ?= cc\n'
+                   'all: libtiny_configure.a\n'
+                   'tiny.o: tiny.c\n'
+                   '\t$(CC) -c tiny.c -o tiny.o\n'
+                   'libtiny_configure.a: tiny.o\n'
+                   '\tar rcs libtiny_configure.a tiny.o\n'
+                   'install: all\n'
+                   '\tmkdir -p $(DESTDIR)$(prefix)/lib $(DESTDIR)$(prefix)/include\n'
+                   '\tcp libtiny_configure.a $(DESTDIR)$(prefix)/lib/\n'
+                   '\tcp tiny.h $(DESTDIR)$(prefix)/include/tiny_configure.h\n',
+    'tiny.c': 'int tiny_configure(void) { return 42; }\n',
+    'tiny.h': 'int tiny_configure(void);\n'
+}
+
+MESON_PROJECT = {
+    'meson.build': "project('tiny_meson', 'c')\n"
+                   "library('tiny_meson', 'tiny.c', install: true)\n",
+    'tiny.c': 'int tiny_meson(void) { return 42; }\n'
+}
+
+
+def write_project(path: str, files: dict):
+    os.makedirs(path)
+    for name, content in files.items():
+        file_path = os.path.join(path, name)
+        with open(file_path, 'w') as f:
+            f.write(content)
+        if name == 'configure':
+            os.chmod(file_path, 0o755)
+
+
+def make_git_repo(path: str, files: dict) -> str:
+    write_project(path, files)
+    git_env = dict(os.environ, GIT_AUTHOR_NAME=PROJECT_NAME, GIT_AUTHOR_EMAIL='bench@localhost',
+                   GIT_COMMITTER_NAME=PROJECT_NAME, GIT_COMMITTER_EMAIL='bench@localhost')
+    for line in (['git', 'init', '-q'], ['git', 'add', '.'], ['git', 'commit', '-q', '-m', 'fixture']):
+        subprocess.check_call(line, cwd=path, env=git_env)
+    return 'file://' + path
+
+
+def make_tarball(dir_path: str, name: str, files: dict) -> str:
+    project_dir = os.path.join(dir_path, 'src', '{0}-{1}'.format(name, FIXTURE_VERSION))
+    write_project(project_dir, files)
+    archive_name = '{0}-{1}.tar.gz'.format(name, FIXTURE_VERSION)
+    with tarfile.open(os.path.join(dir_path, archive_name), 'w:gz') as tar:
+        tar.add(project_dir, arcname=os.path.basename(project_dir))
+    return archive_name
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(object):
+    def __init__(self, root_path: str):
+        handler = functools.partial(QuietHandler, directory=root_path)
+        self.server_ = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread_ = threading.Thread(target=self.server_.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        return 'http://127.0.0.1:{0}/{1}'.format(self.server_.server_address[1], name)
+
+    def __enter__(self):
+        self.thread_.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server_.shutdown()
+        self.server_.server_close()
+
+
+class Scenario(object):
+    def __init__(self, name: str, tools: list, run_func):
+        self.name_ = name
+        self.tools_ = tools
+        self.run_func_ = run_func
+
+    def name(self) -> str:
+        return self.name_
+
+    def missing_tools(self) -> list:
+        return [tool for tool in self.tools_ if not shutil.which(tool)]
+
+    def run(self, request: BuildRequest):
+        self.run_func_(request)
+
+
+def make_scenarios(fixtures_path: str, server: FixtureServer) -> [Scenario]:
+    cmake_url = make_git_repo(os.path.join(fixtures_path, 'git', 'tiny_cmake'), CMAKE_PROJECT)
+    configure_url = make_git_repo(os.path.join(fixtures_path, 'git', 'tiny_configure'), CONFIGURE_PROJECT)
+    meson_url = make_git_repo(os.path.join(fixtures_path, 'git', 'tiny_meson'), MESON_PROJECT)
+    http_path = os.path.join(fixtures_path, 'http')
+    cmake_archive = server.url(make_tarball(http_path, 'tiny_cmake', CMAKE_PROJECT))
+    configure_archive = server.url(make_tarball(http_path, 'tiny_configure', CONFIGURE_PROJECT))
+    meson_archive = server.url(make_tarball(http_path, 'tiny_meson', MESON_PROJECT))
+
+    return [
+        Scenario('clone_cmake', ['git', 'cmake', 'ninja'], lambda r: r._clone_and_build_via_cmake(cmake_url, [])),
+        Scenario('clone_configure', ['git', 'make', 'cc'],
+                 lambda r: r._clone_and_build_via_configure(configure_url, [], use_platform_flags=False)),
+        Scenario('clone_meson', ['git', 'meson', 'ninja'], lambda r: r._clone_and_build_via_meson(meson_url, [])),
+        Scenario('download_cmake', ['cmake', 'ninja'], lambda r: r._download_and_build_via_cmake(cmake_archive, [])),
+        Scenario('download_configure', ['make', 'cc'],
+                 lambda r: r._download_and_build_via_configure(configure_archive, [], use_platform_flags=False)),
+        Scenario('download_meson', ['meson', 'ninja'],
+                 lambda r: r._download_and_build_via_meson(meson_archive, []))
+    ]
+
+
+def run_scenario(scenario: Scenario, work_path: str, iteration: int) -> dict:
+    tracer = build_trace.BuildTracer(measure_resources=True)
+    build_trace.set_tracer(tracer)
+    pwd = os.getcwd()
+    try:
+        base_path = os.path.join(work_path, '{0}_{1}'.format(scenario.name(), iteration))
+        os.makedirs(base_path)
+        request = BuildRequest('linux', 'x86_64', os.path.join(base_path, 'build'), os.path.join(base_path, 'prefix'))
+        with tracer.phase('total', scenario.name()):
+            scenario.run(request)
+    finally:
+        os.chdir(pwd)
+        build_trace.set_tracer(None)
+
+    phases = {}
+    for event in tracer.events():
+        phase = phases.setdefault(event.name(), {'wall_time': 0.0, 'cpu_time': 0.0, 'read_bytes': 0,
+                                                 'write_bytes': 0})
+        phase['wall_time'] += event.duration()
+        for key in ('cpu_time', 'read_bytes', 'write_bytes'):
+            phase[key] += event.args().get(key, 0)
+    return phases
+
+
+def summarize(runs: [dict]) -> dict:  # median of every metric of every phase
+    summary = {}
+    for phase in sorted(set(name for run in runs for name in run)):
+        metrics = {}
+        for key in ('wall_time', 'cpu_time', 'read_bytes', 'write_bytes'):
+            metrics[key] = statistics.median(run.get(phase, {}).get(key, 0) for run in runs)
+        summary[phase] = metrics
+    return summary
+
+
+def print_results(results: dict):
+    print('{0:<20} {1:<16} {2:>10} {3:>10} {4:>12} {5:>12}'.format('scenario', 'phase', 'wall, s', 'cpu, s',
+                                                                   'read, KiB', 'write, KiB'))
+    for scenario, phases in results['scenarios'].items():
+        for phase, metrics in phases.items():
+            print('{0:<20} {1:<16} {2:>10.3f} {3:>10.3f} {4:>12.1f} {5:>12.1f}'.format(
+                scenario, phase, metrics['wall_time'], metrics['cpu_time'], metrics['read_bytes'] / 1024.0,
+                metrics['write_bytes'] / 1024.0))
+
+
+def run_command(argv):
+    work_path = tempfile.mkdtemp(prefix='pyfastogt_bench_')
+    results = {'repeat': argv.repeat, 'scenarios': {}, 'skipped': {}}
+    try:
+        fixtures_path = os.path.join(work_path, 'fixtures')
+        with FixtureServer(os.path.join(fixtures_path, 'http')) as server:
+            for scenario in make_scenarios(fixtures_path, server):
+                if argv.scenario and scenario.name() not in argv.scenario:
+                    continue
+                missing = scenario.missing_tools()
+                if missing:
+                    results['skipped'][scenario.name()] = 'missing tools: %s' % ', '.join(missing)
+                    continue
+
+                runs = [run_scenario(scenario, os.path.join(work_path, 'runs'), i) for i in range(argv.repeat)]
+                results['scenarios'][scenario.name()] = summarize(runs)
+    finally:
+        if not argv.keep:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    print_results(results)
+    for scenario, reason in results['skipped'].items():
+        print('skipped {0}: {1}'.format(scenario, reason))
+    if argv.output:
+        with open(argv.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def compare_command(argv):
+    with open(argv.baseline, 'r') as f:
+        baseline = json.load(f)
+    with open(argv.current, 'r') as f:
+        current = json.load(f)
+
+    regressions = []
+    print('{0:<20} {1:<16} {2:>10} {3:>10} {4:>9}'.format('scenario', 'phase', 'base, s', 'curr, s', 'change'))
+    for scenario, phases in current['scenarios'].items():
+        base_phases = baseline['scenarios'].get(scenario, {})
+        for phase, metrics in phases.items():
+            base = base_phases.get(phase)
+            if not base:
+                continue
+            base_time = base['wall_time']
+            change = (metrics['wall_time'] - base_time) / base_time * 100.0 if base_time else 0.0
+            marker = ''
+            # tiny phases are noise dominated
+            if change > argv.threshold and metrics['wall_time'] - base_time > argv.min_delta:
+                marker = ' REGRESSION'
+                regressions.append((scenario, phase))
+            print('{0:<20} {1:<16} {2:>10.3f} {3:>10.3f} {4:>8.1f}%{5}'.format(scenario, phase, base_time,
+                                                                               metrics['wall_time'], change, marker))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog=PROJECT_NAME, usage='%(prog)s [options]')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run benchmark')
+    run_parser.add_argument('--repeat', help='runs per scenario (default: 3)', type=int, default=3)
+    run_parser.add_argument('--scenario', help='scenario name, can be repeated', action='append')
+    run_parser.add_argument('--output', help='json results file')
+    run_parser.add_argument('--keep', help='keep work directory', action='store_true')
+    compare_parser = subparsers.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline', help='baseline json results')
+    compare_parser.add_argument('current', help='current json results')
+    compare_parser.add_argument('--threshold', help='regression threshold, percent (default: 10)', type=float,
+                                default=10.0)
+    compare_parser.add_argument('--min_delta', help='ignore slowdowns below, seconds (default: 0.05)', type=float,
+                                default=0.05)
+
+    argv = parser.parse_args()
+    if argv.command == 'run':
+        sys.exit(run_command(argv))
+    elif argv.command == 'compare':
+        sys.exit(compare_command(argv))
+    parser.print_help()
+    sys.exit(2)
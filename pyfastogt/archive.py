@@ -0,0 +1,178 @@
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+import zipfile
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+# extension -> format
+ARCHIVE_FORMATS = [('.tar.gz', 'gz'), ('.tgz', 'gz'), ('.tar.xz', 'xz'), ('.txz', 'xz'), ('.tar.bz2', 'bz2'),
+                   ('.tbz2', 'bz2'), ('.tar.zst', 'zst'), ('.tzst', 'zst'), ('.tar', 'tar'), ('.zip', 'zip')]
+
+# format -> parallel (or at least native) decompressors writing to stdout, first found is used
+DECOMPRESSORS = {
+    'gz': [['pigz', '-dc'], ['gzip', '-dc']],
+    'xz': [['xz', '-dc', '-T0']],
+    'bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc']],
+    'zst': [['zstd', '-dc', '-T0']]
+}
+
+# python decompressors for tarfile stream mode
+TARFILE_MODES = {'gz': 'r|gz', 'xz': 'r|xz', 'bz2': 'r|bz2', 'tar': 'r|'}
+
+
+class ArchiveError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+def get_archive_format(name: str):
+    lower_name = name.lower()
+    for ext, archive_format in ARCHIVE_FORMATS:
+        if lower_name.endswith(ext):
+            return archive_format
+    return None
+
+
+def find_decompressor(archive_format: str):
+    for cmd in DECOMPRESSORS.get(archive_format, []):
+        if shutil.which(cmd[0]):
+            return cmd
+    return None
+
+
+class TopLevelDir(object):
+    """
+    Works out common top-level folder of archive members as they come
+    """
+
+    def __init__(self):
+        self.name_ = None
+        self.common_ = True
+        self.nested_ = False
+
+    def add(self, member_name: str):
+        name = member_name
+        while name.startswith('./'):
+            name = name[2:]
+        first, sep, _ = name.strip('/').partition('/')
+        if not first:
+            return
+        if sep:
+            self.nested_ = True
+        if self.name_ is None:
+            self.name_ = first
+        elif self.name_ != first:
+            self.common_ = False
+
+    def path(self, dest_dir: str) -> str:  # top-level folder or dest_dir if members do not share one
+        if self.common_ and self.name_ and self.nested_ and os.path.isdir(os.path.join(dest_dir, self.name_)):
+            return os.path.join(dest_dir, self.name_)
+        return dest_dir
+
+
+def _extract_members(tar: tarfile.TarFile, dest_dir: str) -> str:
+    top_level = TopLevelDir()
+    extract_filter = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+    for member in tar:
+        top_level.add(member.name)
+        tar.extract(member, dest_dir, **extract_filter)
+    return top_level.path(dest_dir)
+
+
+def _copy_to_stdin(fileobj, proc: subprocess.Popen, errors: list):
+    try:
+        while True:
+            buffer = fileobj.read(READ_BLOCK_SIZE)
+            if not buffer:
+                break
+            proc.stdin.write(buffer)
+    except BrokenPipeError:  # decompressor failed, reported by its exit code
+        pass
+    except Exception as ex:
+        errors.append(ex)
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _extract_via_decompressor(cmd: list, dest_dir: str, path=None, fileobj=None) -> str:
+    proc = subprocess.Popen(cmd + ([path] if path else []), stdin=subprocess.PIPE if fileobj else None,
+                            stdout=subprocess.PIPE)
+    errors = []
+    writer = None
+    if fileobj:
+        writer = threading.Thread(target=_copy_to_stdin, args=(fileobj, proc, errors), daemon=True)
+        writer.start()
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode='r|') as tar:
+            top_level = _extract_members(tar, dest_dir)
+        while proc.stdout.read(READ_BLOCK_SIZE):  # tar end padding
+            pass
+    finally:
+        proc.stdout.close()
+        if writer:
+            writer.join()
+        code = proc.wait()
+
+    if errors:
+        raise errors[0]
+    if code != 0:
+        raise ArchiveError('{0} failed with exit code {1}'.format(cmd[0], code))
+    return top_level
+
+
+def extract_tar_stream(fileobj, archive_format: str, dest_dir: str) -> str:
+    """
+    Extracts tar read from fileobj (e.g. http response) in one pass, returns top-level folder
+    """
+    cmd = find_decompressor(archive_format) if archive_format != 'tar' else None
+    if cmd:
+        return _extract_via_decompressor(cmd, dest_dir, fileobj=fileobj)
+
+    mode = TARFILE_MODES.get(archive_format)
+    if not mode:
+        raise ArchiveError('no decompressor found for: %s' % archive_format)
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        top_level = _extract_members(tar, dest_dir)
+    while fileobj.read(READ_BLOCK_SIZE):
+        pass
+    return top_level
+
+
+def extract_zip(path: str, dest_dir: str) -> str:
+    top_level = TopLevelDir()
+    with zipfile.ZipFile(path) as zip_file:
+        for info in zip_file.infolist():
+            top_level.add(info.filename)
+            extracted_path = zip_file.extract(info, dest_dir)
+            mode = (info.external_attr >> 16) & 0o777
+            if mode and not info.is_dir():  # zipfile drops permissions, executables need them
+                os.chmod(extracted_path, mode)
+    return top_level.path(dest_dir)
+
+
+def extract_archive(path: str, dest_dir: str) -> str:
+    """
+    Extracts tar.gz/xz/bz2/zst, tar or zip archive into dest_dir with parallel decompressor when available,
+    returns top-level folder of archive (dest_dir if members do not share one)
+    """
+    archive_format = get_archive_format(path)
+    if archive_format == 'zip' or (not archive_format and zipfile.is_zipfile(path)):
+        return extract_zip(path, dest_dir)
+
+    cmd = find_decompressor(archive_format) if archive_format and archive_format != 'tar' else None
+    if cmd:
+        return _extract_via_decompressor(cmd, dest_dir, path=path)
+
+    if archive_format == 'zst':
+        raise ArchiveError('zstd not found to extract: %s' % path)
+    with tarfile.open(path, 'r|*') as tar:  # format detected by tarfile
+        return _extract_members(tar, dest_dir)
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+
+from pyfastogt.build_cache import source_id
+from pyfastogt.system_info import Architecture
+
+ARTIFACT_MANIFEST_NAME = 'manifest.json'
+ARTIFACT_FILES_DIR_NAME = 'files'
+ARTIFACT_PREFIX_PLACEHOLDER = '@PYFASTOGT_PREFIX@'
+ARTIFACT_FORMAT_VERSION = 1
+TEXT_PROBE_SIZE = 8192
+
+COMPRESSION_ZSTD = 'zstd'
+COMPRESSION_XZ = 'xz'
+COMPRESSION_EXTENSIONS = {COMPRESSION_ZSTD: 'tar.zst', COMPRESSION_XZ: 'tar.xz'}
+
+
+class ArtifactError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+def default_compression() -> str:
+    return COMPRESSION_ZSTD if shutil.which('zstd') else COMPRESSION_XZ
+
+
+def make_artifact_version(source_dir: str, build_kind: str, flags: list, build_type: str) -> str:
+    # prefix is not part of version, artifacts are relocated on install
+    config = json.dumps({'kind': build_kind, 'flags': flags, 'build_type': build_type}, sort_keys=True)
+    source = source_id(source_dir).split(':', 1)[-1]
+    return '{0}-{1}'.format(source[:12], hashlib.sha256(config.encode('utf-8')).hexdigest()[:8])
+
+
+def make_artifact_name(target: str, version: str, platform_name: str, arch_name: str, compression: str) -> str:
+    return '{0}-{1}-{2}-{3}.{4}'.format(target, version, platform_name, arch_name,
+                                        COMPRESSION_EXTENSIONS[compression])
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _is_text_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return b'\0' not in f.read(TEXT_PROBE_SIZE)
+
+
+def _replace_in_file(path: str, old: bytes, new: bytes) -> bool:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if old not in data:
+        return False
+
+    with open(path, 'wb') as f:
+        f.write(data.replace(old, new))
+    return True
+
+
+class ArtifactManifest(object):
+    def __init__(self, target: str, version: str, platform_name: str, arch_name: str, prefix_path: str,
+                 files=None, relocated=None, created=None):
+        self.target_ = target
+        self.version_ = version
+        self.platform_name_ = platform_name
+        self.arch_name_ = arch_name
+        self.prefix_path_ = prefix_path
+        self.files_ = files if files else {}  # relative path -> sha256, None for symlinks
+        self.relocated_ = relocated if relocated else []
+        self.created_ = created if created else time.time()
+
+    def target(self) -> str:
+        return self.target_
+
+    def version(self) -> str:
+        return self.version_
+
+    def platform_name(self) -> str:
+        return self.platform_name_
+
+    def arch_name(self) -> str:
+        return self.arch_name_
+
+    def prefix_path(self) -> str:  # prefix artifact was built for
+        return self.prefix_path_
+
+    def files(self) -> dict:
+        return self.files_
+
+    def relocated(self) -> list:  # text files with prefix replaced by placeholder
+        return self.relocated_
+
+    def to_dict(self) -> dict:
+        return {'format': ARTIFACT_FORMAT_VERSION, 'target': self.target_, 'version': self.version_,
+                'platform': self.platform_name_, 'arch': self.arch_name_, 'prefix': self.prefix_path_,
+                'files': self.files_, 'relocated': self.relocated_, 'created': self.created_}
+
+    @staticmethod
+    def from_dict(data: dict):
+        if data.get('format') != ARTIFACT_FORMAT_VERSION:
+            raise ArtifactError('unsupported artifact format: %s' % data.get('format'))
+        return ArtifactManifest(data['target'], data['version'], data['platform'], data['arch'], data['prefix'],
+                                data['files'], data['relocated'], data['created'])
+
+
+def _write_archive(source_dir: str, archive_path: str, compression: str):
+    if compression == COMPRESSION_XZ:
+        with tarfile.open(archive_path, 'w:xz') as tar:
+            for name in sorted(os.listdir(source_dir)):
+                tar.add(os.path.join(source_dir, name), arcname=name)
+        return
+
+    with open(archive_path, 'wb') as out:
+        zstd = subprocess.Popen(['zstd', '-T0', '-q', '-c'], stdin=subprocess.PIPE, stdout=out)
+        with tarfile.open(fileobj=zstd.stdin, mode='w|') as tar:
+            for name in sorted(os.listdir(source_dir)):
+                tar.add(os.path.join(source_dir, name), arcname=name)
+        zstd.stdin.close()
+        if zstd.wait() != 0:
+            raise ArtifactError('zstd failed to compress: %s' % archive_path)
+
+
+def _extract_archive(archive_path: str, dest_dir: str):
+    extract_filter = getattr(tarfile, 'data_filter', None)
+    kwargs = {'filter': extract_filter} if extract_filter else {}
+    if archive_path.endswith(COMPRESSION_EXTENSIONS[COMPRESSION_XZ]):
+        with tarfile.open(archive_path, 'r:xz') as tar:
+            tar.extractall(dest_dir, **kwargs)
+        return
+
+    zstd = subprocess.Popen(['zstd', '-d', '-q', '-c', archive_path], stdout=subprocess.PIPE)
+    with tarfile.open(fileobj=zstd.stdout, mode='r|') as tar:
+        tar.extractall(dest_dir, **kwargs)
+    zstd.stdout.close()
+    if zstd.wait() != 0:
+        raise ArtifactError('zstd failed to decompress: %s' % archive_path)
+
+
+def read_artifact_manifest(archive_path: str) -> ArtifactManifest:
+    tmp_dir = tempfile.mkdtemp(prefix='artifact_')
+    try:
+        _extract_archive(archive_path, tmp_dir)
+        with open(os.path.join(tmp_dir, ARTIFACT_MANIFEST_NAME), 'r') as f:
+            return ArtifactManifest.from_dict(json.load(f))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def export_artifact(installed_dir: str, prefix_path: str, target: str, version: str, platform_name: str,
+                    arch_name: str, output_dir: str, compression=None) -> str:
+    """
+    Pack files installed into prefix (staged in installed_dir) into relocatable archive with manifest
+    """
+    if not compression:
+        compression = default_compression()
+
+    abs_prefix_path = os.path.abspath(os.path.expanduser(prefix_path))
+    tmp_dir = tempfile.mkdtemp(prefix='artifact_')
+    try:
+        files_dir = os.path.join(tmp_dir, ARTIFACT_FILES_DIR_NAME)
+        shutil.copytree(installed_dir, files_dir, symlinks=True)
+        manifest = ArtifactManifest(target, version, platform_name, arch_name, abs_prefix_path)
+        for root, dirs, files in os.walk(files_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, files_dir)
+                if os.path.islink(path):
+                    manifest.files()[rel_path] = None
+                    continue
+
+                if _is_text_file(path) and _replace_in_file(path, abs_prefix_path.encode('utf-8'),
+                                                            ARTIFACT_PREFIX_PLACEHOLDER.encode('utf-8')):
+                    manifest.relocated().append(rel_path)
+                manifest.files()[rel_path] = _hash_file(path)
+
+        with open(os.path.join(tmp_dir, ARTIFACT_MANIFEST_NAME), 'w') as f:
+            json.dump(manifest.to_dict(), f, indent=2, sort_keys=True)
+
+        os.makedirs(output_dir, exist_ok=True)
+        archive_path = os.path.join(output_dir, make_artifact_name(target, version, platform_name, arch_name,
+                                                                   compression))
+        tmp_archive_path = archive_path + '.tmp'
+        _write_archive(tmp_dir, tmp_archive_path, compression)
+        os.replace(tmp_archive_path, archive_path)
+        return archive_path
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def install_artifact(archive_path: str, prefix_path: str, dest_path=None) -> ArtifactManifest:
+    # files are relocated to prefix_path, dest_path is where to put them (prefix itself by default)
+    abs_prefix_path = os.path.abspath(os.path.expanduser(prefix_path))
+    tmp_dir = tempfile.mkdtemp(prefix='artifact_')
+    try:
+        _extract_archive(archive_path, tmp_dir)
+        with open(os.path.join(tmp_dir, ARTIFACT_MANIFEST_NAME), 'r') as f:
+            manifest = ArtifactManifest.from_dict(json.load(f))
+
+        files_dir = os.path.join(tmp_dir, ARTIFACT_FILES_DIR_NAME)
+        for rel_path in manifest.relocated():
+            _replace_in_file(os.path.join(files_dir, rel_path), ARTIFACT_PREFIX_PLACEHOLDER.encode('utf-8'),
+                             abs_prefix_path.encode('utf-8'))
+
+        shutil.copytree(files_dir, dest_path if dest_path else abs_prefix_path, symlinks=True, dirs_exist_ok=True)
+        return manifest
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class BinaryRepository(object):
+    """
+    Local folder of artifacts: <platform>/<arch>/<target>/<version>/<artifact archive>
+    """
+
+    def __init__(self, path: str, compression=None):
+        self.path_ = os.path.abspath(os.path.expanduser(path))
+        self.compression_ = compression if compression else default_compression()
+
+    def path(self) -> str:
+        return self.path_
+
+    def compression(self) -> str:
+        return self.compression_
+
+    def _artifact_dir(self, target: str, version: str, platform_name: str, arch_name: str) -> str:
+        return os.path.join(self.path_, platform_name, arch_name, target, version)
+
+    def find(self, target: str, version: str, platform_name: str, arch: Architecture):
+        artifact_dir = self._artifact_dir(target, version, platform_name, arch.name())
+        for compression in (self.compression_, COMPRESSION_ZSTD, COMPRESSION_XZ):
+            if compression == COMPRESSION_ZSTD and not shutil.which('zstd'):
+                continue
+            path = os.path.join(artifact_dir, make_artifact_name(target, version, platform_name, arch.name(),
+                                                                 compression))
+            if os.path.exists(path):
+                return path
+        return None
+
+    def versions(self, target: str, platform_name: str, arch: Architecture) -> list:
+        target_dir = os.path.join(self.path_, platform_name, arch.name(), target)
+        if not os.path.isdir(target_dir):
+            return []
+        return sorted(os.listdir(target_dir))
+
+    def publish(self, installed_dir: str, prefix_path: str, target: str, version: str, platform_name: str,
+                arch: Architecture) -> str:
+        return export_artifact(installed_dir, prefix_path, target, version, platform_name, arch.name(),
+                               self._artifact_dir(target, version, platform_name, arch.name()), self.compression_)
+
+    def install(self, target: str, version: str, platform_name: str, arch: Architecture, prefix_path: str):
+        path = self.find(target, version, platform_name, arch)
+        if not path:
+            return None
+        return install_artifact(path, prefix_path)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+from pyfastogt.cache_store import CacheStore
+from pyfastogt.system_info import Platform
+
+DEFAULT_BUILD_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+BUILD_CACHE_FILES_DIR_NAME = 'files'
+# generated while building inside of source tree
+SOURCE_HASH_IGNORE_DIRS = ['.git', 'autom4te.cache', 'build_meson']
+SOURCE_HASH_IGNORE_PREFIXES = ['build_cmake_', 'stage_']
+
+
+def _is_ignored_source_dir(name: str) -> bool:
+    return name in SOURCE_HASH_IGNORE_DIRS or name.startswith(tuple(SOURCE_HASH_IGNORE_PREFIXES))
+
+
+def git_source_revision(source_dir: str):  # commit of clean git checkout or None
+    if not os.path.exists(os.path.join(source_dir, '.git')):
+        return None
+
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=source_dir,
+                                           stderr=subprocess.DEVNULL).decode('utf-8').strip()
+        status = subprocess.check_output(['git', 'status', '--porcelain', '--ignore-submodules=none'],
+                                         cwd=source_dir, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    if status.strip():
+        return None
+    return revision
+
+
+def hash_source_tree(source_dir: str) -> str:
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not _is_ignored_source_dir(d))
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            rel_path = os.path.relpath(file_path, source_dir)
+            h.update(rel_path.encode('utf-8'))
+            h.update(b'\0')
+            if os.path.islink(file_path):
+                h.update(os.readlink(file_path).encode('utf-8'))
+            else:
+                h.update(b'x' if os.access(file_path, os.X_OK) else b'-')
+                with open(file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        h.update(chunk)
+            h.update(b'\0')
+    return h.hexdigest()
+
+
+def source_id(source_dir: str) -> str:
+    revision = git_source_revision(source_dir)
+    if revision:
+        return 'git:' + revision
+    return 'tree:' + hash_source_tree(source_dir)
+
+
+class BuildCache(object):
+    """
+    Installed files of cmake/configure builds keyed by source, flags, platform and build type
+    """
+
+    def __init__(self, cache_dir: str, max_size=DEFAULT_BUILD_CACHE_SIZE):
+        self.store_ = CacheStore(cache_dir, max_size)
+
+    def store(self) -> CacheStore:
+        return self.store_
+
+    def stats(self):
+        return self.store_.stats()
+
+    def make_key(self, source_dir: str, build_kind: str, flags: list, platform: Platform, build_type: str,
+                 prefix_path: str) -> str:
+        arch = platform.architecture()
+        description = {
+            'source': source_id(source_dir),
+            'kind': build_kind,
+            'flags': flags,
+            'build_type': build_type,
+            'prefix': prefix_path,
+            'platform': platform.name(),
+            'arch': arch.name(),
+            'cmake_specific_flags': platform.cmake_specific_flags(),
+            'configure_specific_flags': platform.configure_specific_flags(),
+            'env': platform.env_variables()
+        }
+        data = json.dumps(description, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+
+    def restore(self, key: str, prefix_path: str) -> bool:
+        return self.store_.read(key, lambda entry_path: shutil.copytree(
+            os.path.join(entry_path, BUILD_CACHE_FILES_DIR_NAME), prefix_path, symlinks=True, dirs_exist_ok=True))
+
+    def put(self, key: str, installed_dir: str):
+        def fill(path: str):
+            shutil.copytree(installed_dir, os.path.join(path, BUILD_CACHE_FILES_DIR_NAME), symlinks=True)
+
+        self.store_.put(key, fill)
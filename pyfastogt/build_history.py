@@ -0,0 +1,121 @@
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+DEFAULT_BUILD_HISTORY_PATH = os.path.join('~', '.cache', 'pyfastogt', 'build_history.json')
+BUILD_HISTORY_RUNS = 5  # durations kept per key, expected duration is their mean
+
+
+def make_history_key(target: str, version=None, flags=None) -> str:
+    flags_hash = hashlib.sha256(json.dumps(flags if flags else []).encode('utf-8')).hexdigest()[:12]
+    return '{0}|{1}|{2}'.format(target, version if version else '', flags_hash)
+
+
+class BuildRecord(object):
+    def __init__(self, target: str, version=None, durations=None, phases=None, updated=None):
+        self.target_ = target
+        self.version_ = version
+        self.durations_ = durations if durations else []
+        self.phases_ = phases if phases else {}  # phase -> seconds of last build
+        self.updated_ = updated if updated else time.time()
+
+    def target(self) -> str:
+        return self.target_
+
+    def version(self):
+        return self.version_
+
+    def durations(self) -> list:
+        return self.durations_
+
+    def phases(self) -> dict:
+        return self.phases_
+
+    def updated(self) -> float:
+        return self.updated_
+
+    def expected_duration(self) -> float:
+        return sum(self.durations_) / len(self.durations_) if self.durations_ else 0.0
+
+    def to_dict(self) -> dict:
+        return {'target': self.target_, 'version': self.version_, 'durations': self.durations_,
+                'phases': self.phases_, 'updated': self.updated_}
+
+    @staticmethod
+    def from_dict(data: dict):
+        return BuildRecord(data['target'], data.get('version'), data.get('durations'), data.get('phases'),
+                           data.get('updated'))
+
+
+class BuildHistory(object):
+    """
+    Durations of finished builds keyed by target, version and flags, stored in json file
+    """
+
+    def __init__(self, path=DEFAULT_BUILD_HISTORY_PATH):
+        self.path_ = os.path.abspath(os.path.expanduser(path))
+        self.records_ = self._load()
+
+    def path(self) -> str:
+        return self.path_
+
+    def records(self) -> dict:
+        return dict(self.records_)
+
+    def get(self, target: str, version=None, flags=None):
+        return self.records_.get(make_history_key(target, version, flags))
+
+    def expected_duration(self, target: str, version=None, flags=None, default=None):
+        """
+        Exact key match, otherwise latest build of target with other version or flags, otherwise default
+        """
+        record = self.get(target, version, flags)
+        if not record:
+            same_target = [rec for rec in self.records_.values() if rec.target() == target]
+            if not same_target:
+                return default
+            record = max(same_target, key=lambda rec: rec.updated())
+        return record.expected_duration()
+
+    def record(self, target: str, duration: float, phases=None, version=None, flags=None):
+        key = make_history_key(target, version, flags)
+        with self._lock():
+            self.records_ = self._load()  # other build processes may have recorded meanwhile
+            record = self.records_.get(key)
+            if not record:
+                record = BuildRecord(target, version)
+                self.records_[key] = record
+            record.durations_ = (record.durations_ + [duration])[-BUILD_HISTORY_RUNS:]
+            record.phases_ = dict(phases) if phases else {}
+            record.updated_ = time.time()
+            self._save()
+
+    @contextlib.contextmanager
+    def _lock(self):
+        os.makedirs(os.path.dirname(self.path_), exist_ok=True)
+        with open(self.path_ + '.lock', 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path_, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {key: BuildRecord.from_dict(value) for key, value in data.items()}
+
+    def _save(self):
+        tmp_path = self.path_ + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({key: record.to_dict() for key, record in self.records_.items()}, f, indent=2,
+                      sort_keys=True)
+        os.replace(tmp_path, self.path_)
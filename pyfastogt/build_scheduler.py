@@ -0,0 +1,455 @@
+import contextvars
+import functools
+import multiprocessing
+import os
+import queue
+import statistics
+import threading
+import time
+from multiprocessing.connection import wait
+
+from pyfastogt import build_trace, system_info
+from pyfastogt.build_utils import BuildError, logger
+from pyfastogt.jobserver import JobServer
+
+DEFAULT_TARGET_DURATION = 60.0  # seconds, expected duration of target never built when history is empty
+
+# dependencies between BuildRequest.build_<name> targets
+BUILD_REQUEST_DEPENDENCIES = {
+    'snappy': [],
+    'jsonc': [],
+    'libev': [],
+    'cpuid': [],
+    'cmake': [],
+    'meson': [],
+    'openssl': [],
+    'common': ['jsonc', 'snappy', 'libev'],
+    'fastotv_protocol': ['common'],
+    'fastoplayer': ['fastotv_protocol']
+}
+# targets whose BuildRequest.build_<name>(version) needs version, given as name=version
+BUILD_REQUEST_VERSIONED_TARGETS = ['cmake', 'meson', 'openssl']
+
+
+class BuildTarget(object):
+    def __init__(self, name: str, build_func, depends=None, jobs=1, version=None, flags=None):
+        self.name_ = name
+        self.build_func_ = build_func
+        self.depends_ = list(depends) if depends else []
+        self.jobs_ = max(1, jobs)
+        self.version_ = version
+        self.flags_ = list(flags) if flags else []
+
+    def name(self) -> str:
+        return self.name_
+
+    def depends(self) -> list:
+        return self.depends_
+
+    def jobs(self) -> int:  # share of the global job budget
+        return self.jobs_
+
+    def version(self):  # build history key together with name and flags
+        return self.version_
+
+    def flags(self) -> list:
+        return self.flags_
+
+    def build(self):
+        self.build_func_()
+
+
+class BuildResultStatus:
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+
+class BuildResult(object):
+    def __init__(self, name: str, status: str, message=None):
+        self.name_ = name
+        self.status_ = status
+        self.message_ = message
+
+    def name(self) -> str:
+        return self.name_
+
+    def status(self) -> str:
+        return self.status_
+
+    def message(self):
+        return self.message_
+
+    def is_success(self) -> bool:
+        return self.status_ == BuildResultStatus.SUCCESS
+
+
+def _get_multiprocessing_context():
+    # fork keeps bound BuildRequest methods usable without pickling
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _get_child_events() -> list:
+    # events of in-memory tracer die with forked child, file tracer has them already
+    tracer = build_trace.get_tracer()
+    if not tracer or tracer.path():
+        return []
+    return [event.to_dict() for event in tracer.events() if event.pid() == os.getpid()]
+
+
+def _run_target_process(target: BuildTarget, conn):
+    code = 0
+    message = None
+    try:
+        with build_trace.target(target.name()):
+            target.build()
+    except BaseException as ex:
+        code = 1
+        message = str(ex) or ex.__class__.__name__
+
+    conn.send((message, _get_child_events()))
+    conn.close()
+    os._exit(code)
+
+
+class _ProcessRunner(object):
+    def __init__(self):
+        self.context_ = _get_multiprocessing_context()
+        self.running_ = {}  # conn -> (target, process)
+
+    def start(self, target: BuildTarget):
+        parent_conn, child_conn = self.context_.Pipe(duplex=False)
+        process = self.context_.Process(target=_run_target_process, args=(target, child_conn),
+                                        name='build_%s' % target.name())
+        process.start()
+        child_conn.close()
+        self.running_[parent_conn] = (target, process)
+
+    def wait(self) -> list:  # [(target, error message or None)]
+        finished = []
+        # result is read before join, child blocks on sending of events which do not fit into pipe
+        for conn in wait(list(self.running_.keys())):
+            target, process = self.running_.pop(conn)
+            try:
+                message, events = conn.recv()
+            except EOFError:  # child died without result
+                message, events = None, []
+            conn.close()
+            process.join()
+            tracer = build_trace.get_tracer()
+            if tracer:
+                for event in events:
+                    tracer.record(build_trace.TraceEvent.from_dict(event))
+            if process.exitcode != 0 and not message:
+                message = 'exit code %s' % process.exitcode
+            finished.append((target, message))
+        return finished
+
+
+class _ThreadRunner(object):
+    # BuildRequest(isolated=True) targets only, they do not touch process cwd and environment
+    def __init__(self):
+        self.finished_ = queue.Queue()
+
+    def _run(self, target: BuildTarget):
+        message = None
+        try:
+            with build_trace.target(target.name()):
+                target.build()
+        except BaseException as ex:
+            message = str(ex) or ex.__class__.__name__
+        self.finished_.put((target, message))
+
+    def start(self, target: BuildTarget):
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(self._run, target), name='build_%s' % target.name(),
+                                  daemon=True)
+        thread.start()
+
+    def wait(self) -> list:
+        finished = [self.finished_.get()]
+        while True:
+            try:
+                finished.append(self.finished_.get_nowait())
+            except queue.Empty:
+                break
+        return finished
+
+
+class BuildScheduler(object):
+    """
+    Runs targets in parallel as their dependencies finish, with history (build_history.BuildHistory)
+    targets on the longest critical path start first and build durations are recorded
+    """
+
+    def __init__(self, max_jobs=None, use_jobserver=True, use_threads=False, history=None):
+        if not max_jobs:
+            max_jobs = system_info.get_build_jobs()
+        self.max_jobs_ = max_jobs
+        self.use_jobserver_ = use_jobserver
+        self.use_threads_ = use_threads
+        self.history_ = history
+        self.targets_ = {}
+        self.results_ = {}
+        self.critical_paths_ = {}
+
+    def max_jobs(self) -> int:
+        return self.max_jobs_
+
+    def history(self):
+        return self.history_
+
+    def add_target(self, target: BuildTarget):
+        if target.name() in self.targets_:
+            raise BuildError('duplicate build target: %s' % target.name())
+        self.targets_[target.name()] = target
+
+    def targets(self) -> [BuildTarget]:
+        return list(self.targets_.values())
+
+    def results(self) -> dict:
+        return self.results_
+
+    def topological_order(self) -> [BuildTarget]:
+        order = []
+        state = {}  # name -> 1 visiting, 2 done
+
+        def visit(target: BuildTarget, path: list):
+            mark = state.get(target.name())
+            if mark == 2:
+                return
+            if mark == 1:
+                raise BuildError('dependency cycle: %s' % ' -> '.join(path + [target.name()]))
+
+            state[target.name()] = 1
+            for dep in target.depends():
+                dep_target = self.targets_.get(dep)
+                if not dep_target:
+                    raise BuildError('target {0} depends on unknown target {1}'.format(target.name(), dep))
+                visit(dep_target, path + [target.name()])
+            state[target.name()] = 2
+            order.append(target)
+
+        for target in self.targets_.values():
+            visit(target, [])
+        return order
+
+    def expected_durations(self) -> dict:  # name -> seconds
+        durations = {}
+        for target in self.targets_.values():
+            if self.history_:
+                durations[target.name()] = self.history_.expected_duration(target.name(), target.version(),
+                                                                           target.flags())
+            else:
+                durations[target.name()] = None
+
+        known = [duration for duration in durations.values() if duration is not None]
+        default = statistics.median(known) if known else DEFAULT_TARGET_DURATION
+        return {name: default if duration is None else duration for name, duration in durations.items()}
+
+    def critical_paths(self) -> dict:  # name -> expected seconds from target start till last dependent finished
+        durations = self.expected_durations()
+        dependents = {name: [] for name in self.targets_}
+        for target in self.targets_.values():
+            for dep in target.depends():
+                if dep in dependents:
+                    dependents[dep].append(target.name())
+
+        paths = {}
+        for target in reversed(self.topological_order()):
+            name = target.name()
+            paths[name] = durations[name] + max((paths[dep] for dep in dependents[name]), default=0.0)
+        return paths
+
+    def plan(self) -> list:
+        """
+        Dry run with expected durations: [(name, start, finish)], seconds from build start
+        """
+        durations = self.expected_durations()
+        paths = self.critical_paths()
+        pending = self.topological_order()
+        finished = set()
+        running = []  # [(finish, name, jobs)]
+        used_jobs = 0
+        now = 0.0
+        result = []
+        while pending or running:
+            ready = [target for target in pending if all(dep in finished for dep in target.depends())]
+            for target in sorted(ready, key=lambda t: -paths[t.name()]):
+                jobs = min(target.jobs(), self.max_jobs_)
+                if running and used_jobs + jobs > self.max_jobs_:
+                    continue
+
+                finish = now + durations[target.name()]
+                running.append((finish, target.name(), jobs))
+                used_jobs += jobs
+                pending.remove(target)
+                result.append((target.name(), now, finish))
+
+            finish, name, jobs = min(running)
+            running.remove((finish, name, jobs))
+            used_jobs -= jobs
+            now = finish
+            finished.add(name)
+        return result
+
+    def _ready_targets(self, pending: list) -> [BuildTarget]:
+        ready = [target for target in pending if
+                 all(self.results_.get(dep) and self.results_[dep].is_success() for dep in target.depends())]
+        # longest critical path first, insertion order for equal ones
+        return sorted(ready, key=lambda target: -self.critical_paths_.get(target.name(), 0.0))
+
+    def _record_history(self, target: BuildTarget, start: float, duration: float):
+        phases = {}
+        tracer = build_trace.get_tracer()
+        if tracer:
+            for event in tracer.events():
+                if event.target() == target.name() and event.start() >= start:
+                    phases[event.name()] = phases.get(event.name(), 0.0) + event.duration()
+        self.history_.record(target.name(), duration, phases, target.version(), target.flags())
+
+    def _skip_broken_targets(self, pending: list):
+        for target in list(pending):
+            failed = [dep for dep in target.depends() if
+                      self.results_.get(dep) and not self.results_[dep].is_success()]
+            if failed:
+                pending.remove(target)
+                self.results_[target.name()] = BuildResult(target.name(), BuildResultStatus.SKIPPED,
+                                                           'dependency failed: %s' % ', '.join(failed))
+                logger.warning('build target {0} skipped, dependency failed: {1}'.format(target.name(), failed))
+
+    def run(self) -> dict:
+        pending = self.topological_order()
+        self.results_ = {}
+        self.critical_paths_ = self.critical_paths()
+        # make/ninja of concurrent targets take job slots from one pool instead of -j each
+        job_server = JobServer(self.max_jobs_) if self.use_jobserver_ else None
+        if job_server:
+            job_server.activate()
+        try:
+            self._run_targets(pending)
+        finally:
+            if job_server:
+                job_server.close()
+
+        failed = [name for name, result in self.results_.items() if not result.is_success()]
+        if failed:
+            raise BuildError('build targets failed: %s' % ', '.join(failed))
+        return self.results_
+
+    def _run_targets(self, pending: list):
+        runner = _ThreadRunner() if self.use_threads_ else _ProcessRunner()
+        running = {}  # name -> jobs
+        started = {}  # name -> (epoch, perf counter)
+        used_jobs = 0
+
+        while pending or running:
+            self._skip_broken_targets(pending)
+            for target in self._ready_targets(pending):
+                jobs = min(target.jobs(), self.max_jobs_)
+                if running and used_jobs + jobs > self.max_jobs_:
+                    continue
+
+                started[target.name()] = (time.time(), time.perf_counter())
+                runner.start(target)
+                running[target.name()] = jobs
+                used_jobs += jobs
+                pending.remove(target)
+                logger.info('build target {0} started ({1}/{2} jobs)'.format(target.name(), used_jobs,
+                                                                           self.max_jobs_))
+
+            if not running:
+                continue
+
+            for target, message in runner.wait():
+                used_jobs -= running.pop(target.name())
+                start, start_counter = started.pop(target.name())
+                if not message:
+                    self.results_[target.name()] = BuildResult(target.name(), BuildResultStatus.SUCCESS)
+                    logger.info('build target {0} finished'.format(target.name()))
+                    if self.history_:
+                        self._record_history(target, start, time.perf_counter() - start_counter)
+                else:
+                    self.results_[target.name()] = BuildResult(target.name(), BuildResultStatus.FAILED, message)
+                    logger.error('build target {0} failed: {1}'.format(target.name(), message))
+
+
+def parse_target(spec: str):  # name=version -> (name, version)
+    name, sep, version = spec.partition('=')
+    name = name.strip()
+    version = version.strip()
+    if sep and not version:
+        raise BuildError('empty version of build request target: %s' % name)
+    return name, version if version else None
+
+
+def make_build_request_targets(request, names: list, jobs=1, flags=None) -> [BuildTarget]:
+    """
+    Make targets for BuildRequest.build_<name> methods with their dependencies,
+    names of versioned targets (BUILD_REQUEST_VERSIONED_TARGETS) are given as name=version,
+    without request targets can only be planned
+    """
+    versions = {}
+    for spec in names:
+        name, version = parse_target(spec)
+        if version:
+            if versions.get(name, version) != version:
+                raise BuildError('conflicting versions of build request target {0}: {1}, {2}'.format(
+                    name, versions[name], version))
+            versions[name] = version
+
+    targets = {}
+
+    def add(name: str):
+        if name in targets:
+            return
+        depends = BUILD_REQUEST_DEPENDENCIES.get(name)
+        if depends is None:
+            raise BuildError('unknown build request target: %s' % name)
+        version = versions.get(name)
+        if name in BUILD_REQUEST_VERSIONED_TARGETS:
+            if not version:
+                raise BuildError('build request target {0} needs version: {0}=<version>'.format(name))
+        elif version:
+            raise BuildError('build request target %s takes no version' % name)
+        for dep in depends:
+            add(dep)
+        build_func = None
+        if request:
+            build_func = getattr(request, 'build_' + name)
+            if version:
+                build_func = functools.partial(build_func, version)
+        targets[name] = BuildTarget(name, build_func, depends, jobs, version, flags)
+
+    for spec in names:
+        add(parse_target(spec)[0])
+    return list(targets.values())
+
+
+def get_history_flags(platform_name: str, arch_name: str) -> list:  # durations differ per platform
+    return [platform_name, arch_name]
+
+
+def build_request_targets(request, names: list, max_jobs=None, history=None) -> dict:
+    scheduler = BuildScheduler(max_jobs, use_threads=request.is_isolated(), history=history)
+    flags = get_history_flags(request.platform_name(), request.platform().architecture().name())
+    for target in make_build_request_targets(request, names, flags=flags):
+        scheduler.add_target(target)
+    return scheduler.run()
+
+
+def plan_build_request_targets(platform_name: str, arch_name: str, names: list, max_jobs=None,
+                               history=None) -> list:
+    scheduler = BuildScheduler(max_jobs, history=history)
+    for target in make_build_request_targets(None, names, flags=get_history_flags(platform_name, arch_name)):
+        scheduler.add_target(target)
+    return scheduler.plan()
+
+
+def print_plan(plan: list):
+    print('{0:<20} {1:>10} {2:>10}'.format('target', 'start, s', 'finish, s'))
+    for name, start, finish in plan:
+        print('{0:<20} {1:>10.1f} {2:>10.1f}'.format(name, start, finish))
+    print('expected total: {0:.1f}s'.format(max((finish for _, _, finish in plan), default=0.0)))
@@ -0,0 +1,143 @@
+import os
+import shutil
+import time
+
+from pyfastogt.build_utils import BuildError, logger, run_ldconfig
+
+GENERATIONS_DIR_SUFFIX = '.generations'
+SESSION_HOOKS_DIR_NAME = os.path.join('.pyfastogt', 'session_hooks')
+DEFAULT_KEEP_GENERATIONS = 2
+
+
+def link_file(src: str, dst: str):  # hardlink, copied on other filesystem
+    try:
+        os.link(src, dst)
+        return dst
+    except OSError:
+        return shutil.copy2(src, dst)
+
+
+def is_generation_name(name: str) -> bool:  # <time>.<pid>, 0.initial
+    return name.split('.', 1)[0].isdigit()
+
+
+class BuildSession(object):
+    """
+    Builds of a session install into staging copy of prefix, commit swaps it in place of prefix atomically
+    and runs deferred post-install hooks once.
+
+    Prefix becomes a symlink to current generation: <prefix>.generations/<generation>,
+    existing prefix folder is moved there on first commit.
+    Hooks are requested through marker files so builds in forked processes can request them too.
+    Staging files are hardlinks of current generation, installs replace files instead of writing into them.
+    """
+
+    def __init__(self, prefix_path: str, hooks=None, keep_generations=DEFAULT_KEEP_GENERATIONS):
+        self.prefix_path_ = os.path.abspath(os.path.expanduser(prefix_path))
+        self.generations_path_ = self.prefix_path_ + GENERATIONS_DIR_SUFFIX
+        self.hooks_ = {'ldconfig': run_ldconfig}
+        if hooks:
+            self.hooks_.update(hooks)
+        self.keep_generations_ = keep_generations
+        self.staging_path_ = None
+
+    def prefix_path(self) -> str:
+        return self.prefix_path_
+
+    def generations_path(self) -> str:
+        return self.generations_path_
+
+    def staging_path(self) -> str:
+        return self.staging_path_
+
+    def is_active(self) -> bool:
+        return self.staging_path_ is not None
+
+    def begin(self):
+        if self.staging_path_:
+            raise BuildError('build session already started')
+
+        os.makedirs(self.generations_path_, exist_ok=True)
+        staging_path = self._make_generation_dir()
+        if os.path.isdir(self.prefix_path_):
+            start = time.time()
+            shutil.copytree(self.prefix_path_, staging_path, symlinks=True, copy_function=link_file,
+                            dirs_exist_ok=True)
+            logger.info('build session staging prefix: {0} ({1:.1f}s)'.format(staging_path, time.time() - start))
+        self.staging_path_ = staging_path
+
+    def defer_hook(self, name: str):
+        if not self.staging_path_:
+            raise BuildError('build session not started')
+        if name not in self.hooks_:
+            raise BuildError('unknown post-install hook: %s' % name)
+
+        hooks_dir = os.path.join(self.staging_path_, SESSION_HOOKS_DIR_NAME)
+        os.makedirs(hooks_dir, exist_ok=True)
+        open(os.path.join(hooks_dir, name), 'w').close()
+
+    def deferred_hooks(self) -> list:
+        hooks_dir = os.path.join(self.staging_path_, SESSION_HOOKS_DIR_NAME)
+        if not os.path.isdir(hooks_dir):
+            return []
+        return sorted(os.listdir(hooks_dir))
+
+    def commit(self):
+        if not self.staging_path_:
+            raise BuildError('build session not started')
+
+        hooks = self.deferred_hooks()
+        shutil.rmtree(os.path.join(self.staging_path_, SESSION_HOOKS_DIR_NAME), ignore_errors=True)
+        if os.path.isdir(self.prefix_path_) and not os.path.islink(self.prefix_path_):
+            # one time move, prefix is missing until symlink below is created
+            logger.warning('moving prefix folder into generations: %s' % self.generations_path_)
+            os.rename(self.prefix_path_, os.path.join(self.generations_path_, '0.initial'))
+
+        link_path = os.path.join(self.generations_path_, 'current.tmp')
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(self.staging_path_, link_path)
+        os.replace(link_path, self.prefix_path_)
+        logger.info('build session committed: {0} -> {1}'.format(self.prefix_path_, self.staging_path_))
+        self.staging_path_ = None
+
+        for name in hooks:
+            self.hooks_[name]()
+        self._remove_old_generations()
+
+    def rollback(self):
+        if not self.staging_path_:
+            return
+
+        shutil.rmtree(self.staging_path_, ignore_errors=True)
+        logger.info('build session rolled back: %s' % self.staging_path_)
+        self.staging_path_ = None
+
+    def _make_generation_dir(self) -> str:  # sessions begun in the same millisecond get next one
+        generation = int(time.time() * 1000)
+        while True:
+            path = os.path.join(self.generations_path_, '%d.%d' % (generation, os.getpid()))
+            try:
+                os.mkdir(path)
+                return path
+            except FileExistsError:
+                generation += 1
+
+    def _remove_old_generations(self):
+        current = os.path.realpath(self.prefix_path_)
+        names = sorted((name for name in os.listdir(self.generations_path_) if is_generation_name(name)),
+                       key=lambda name: int(name.split('.', 1)[0]))
+        old = [path for path in (os.path.join(self.generations_path_, name) for name in names) if
+               os.path.realpath(path) != current]
+        for path in old[:max(len(old) - (self.keep_generations_ - 1), 0)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            self.rollback()
+        else:
+            self.commit()
@@ -0,0 +1,201 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+TRACE_EVENT_CATEGORY = 'build'
+PROC_SELF_IO_PATH = '/proc/self/io'
+
+_tracer = None
+_current_target = contextvars.ContextVar('build_trace_target', default=None)
+
+
+class TraceEvent(object):
+    def __init__(self, name: str, target: str, start: float, duration: float, pid=None, tid=None, args=None):
+        self.name_ = name
+        self.target_ = target
+        self.start_ = start
+        self.duration_ = duration
+        self.pid_ = pid if pid is not None else os.getpid()
+        self.tid_ = tid if tid is not None else threading.get_ident()
+        self.args_ = args if args else {}
+
+    def name(self) -> str:
+        return self.name_
+
+    def target(self) -> str:
+        return self.target_
+
+    def start(self) -> float:  # epoch seconds
+        return self.start_
+
+    def duration(self) -> float:  # seconds
+        return self.duration_
+
+    def pid(self) -> int:
+        return self.pid_
+
+    def tid(self) -> int:
+        return self.tid_
+
+    def args(self) -> dict:
+        return self.args_
+
+    def to_dict(self) -> dict:
+        return {'name': self.name_, 'target': self.target_, 'start': self.start_, 'duration': self.duration_,
+                'pid': self.pid_, 'tid': self.tid_, 'args': self.args_}
+
+    @staticmethod
+    def from_dict(data: dict):
+        return TraceEvent(data['name'], data.get('target'), data['start'], data['duration'], data.get('pid'),
+                          data.get('tid'), data.get('args'))
+
+
+def get_resource_usage() -> dict:
+    # process wide, includes waited for children (build tools)
+    usage = {}
+    if resource:
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        usage['cpu_time'] = (self_usage.ru_utime + self_usage.ru_stime + children_usage.ru_utime +
+                             children_usage.ru_stime)
+
+    try:
+        with open(PROC_SELF_IO_PATH, 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('read_bytes', 'write_bytes'):
+                    usage[key] = int(value)
+    except OSError:
+        pass
+    return usage
+
+
+def read_json_lines(path: str) -> [TraceEvent]:
+    events = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(TraceEvent.from_dict(json.loads(line)))
+    return events
+
+
+def make_chrome_trace(events: [TraceEvent]) -> dict:
+    # one trace thread per target so parallel builds show up as separate tracks in Perfetto/chrome://tracing
+    trace_events = []
+    tracks = {}
+    for event in sorted(events, key=lambda e: e.start()):
+        track = event.target() or 'pid %d' % event.pid()
+        tid = tracks.get(track)
+        if tid is None:
+            tid = len(tracks) + 1
+            tracks[track] = tid
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': track}})
+
+        args = dict(event.args())
+        args['target'] = event.target()
+        args['pid'] = event.pid()
+        trace_events.append({'name': event.name(), 'cat': TRACE_EVENT_CATEGORY, 'ph': 'X', 'pid': 1, 'tid': tid,
+                             'ts': int(event.start() * 1000000), 'dur': int(event.duration() * 1000000),
+                             'args': args})
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+
+class BuildTracer(object):
+    """
+    Collects build phase events, with path events are also appended to json lines file as they finish,
+    which keeps events of forked builds
+    """
+
+    def __init__(self, path=None, measure_resources=False):
+        self.path_ = os.path.abspath(path) if path else None
+        self.measure_resources_ = measure_resources
+        self.events_ = []
+        self.lock_ = threading.Lock()
+
+    def path(self):
+        return self.path_
+
+    def measure_resources(self) -> bool:
+        return self.measure_resources_
+
+    def record(self, event: TraceEvent):
+        with self.lock_:
+            self.events_.append(event)
+            if self.path_:
+                with open(self.path_, 'a') as f:
+                    f.write(json.dumps(event.to_dict()) + '\n')
+
+    def events(self) -> [TraceEvent]:
+        if self.path_:
+            if not os.path.exists(self.path_):
+                return []
+            return read_json_lines(self.path_)
+
+        with self.lock_:
+            return list(self.events_)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, target=None, **args):
+        start = time.time()
+        start_counter = time.perf_counter()
+        start_usage = get_resource_usage() if self.measure_resources_ else None
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_counter
+            if start_usage is not None:
+                usage = get_resource_usage()
+                for key, value in usage.items():
+                    args[key] = value - start_usage.get(key, 0)
+            self.record(TraceEvent(name, target, start, duration, args=args))
+
+    def write_json_lines(self, path: str):
+        with open(path, 'w') as f:
+            for event in self.events():
+                f.write(json.dumps(event.to_dict()) + '\n')
+
+    def write_chrome_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(make_chrome_trace(self.events()), f)
+
+
+def set_tracer(tracer: BuildTracer):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> BuildTracer:
+    return _tracer
+
+
+def get_target():
+    return _current_target.get()
+
+
+@contextlib.contextmanager
+def target(name: str):
+    token = _current_target.set(name)
+    try:
+        yield
+    finally:
+        _current_target.reset(token)
+
+
+@contextlib.contextmanager
+def phase(name: str, **args):
+    tracer = _tracer
+    if not tracer:
+        yield
+        return
+
+    with tracer.phase(name, _current_target.get(), **args):
+        yield
@@ -1,8 +1,14 @@
+import contextlib
+import functools
+import json
 import os
 import stat
 import shutil
 import subprocess
-from pyfastogt import system_info, utils
+from pyfastogt import build_trace, jobserver, system_info, utils
+from pyfastogt.artifacts import install_artifact, make_artifact_version
+from pyfastogt.compiler_cache import find_compiler_cache
+from pyfastogt.install_manifest import InstallManifest
 import logging
 
 logging.basicConfig(format='%(asctime)s.%(msecs)03d [%(levelname)s] [%(filename)s:%(lineno)d] %(message)s',
@@ -13,10 +19,11 @@ logging.getLogger().setLevel(logging.DEBUG)
 logger = logging.getLogger()
 
 class BuildSystem:
-    def __init__(self, name: str, cmd_line: list, cmake_generator_arg: str):
+    def __init__(self, name: str, cmd_line: list, cmake_generator_arg: str, parallel=True):
         self.name_ = name
         self.cmd_line_ = cmd_line
         self.cmake_generator_arg_ = cmake_generator_arg
+        self.parallel_ = parallel
 
     def cmake_generator_arg(self) -> str:
         return self.cmake_generator_arg_
@@ -24,14 +31,57 @@ class BuildSystem:
     def name(self) -> str:
         return self.name_
 
-    def cmd_line(self) -> list:  # cmd + args
-        return self.cmd_line_
+    def is_parallel(self) -> bool:
+        return self.parallel_
 
+    def supports_jobserver(self) -> bool:
+        return True
 
-SUPPORTED_BUILD_SYSTEMS = [BuildSystem('ninja', ['ninja'], 'Ninja'),
-                           BuildSystem('single_make', ['make'], 'Unix Makefiles'),
-                           BuildSystem('make', ['make', '-j2'], 'Unix Makefiles'),
-                           BuildSystem('gmake', ['gmake', '-j2'], 'Unix Makefiles')]
+    def cmd_line(self, jobs=None, env=None) -> list:  # cmd + args
+        line = list(self.cmd_line_)
+        if not self.parallel_:  # overrides -j inherited via MAKEFLAGS
+            line.append('-j1')
+            return line
+
+        if not jobs and self.supports_jobserver() and jobserver.has_jobserver(env):
+            return line  # job slots shared with other builds via jobserver
+
+        line.append('-j%d' % (jobs if jobs else system_info.get_build_jobs()))
+        return line
+
+    def run(self, args=None, env=None, jobs=None, cwd=None) -> int:
+        line = self.cmd_line(jobs, env)
+        if args:
+            line.extend(args)
+        if not self.parallel_:  # serial build must not take job slots of jobserver shared by other builds
+            return subprocess.call(line, cwd=cwd, env=jobserver.without_jobserver(env))
+        return subprocess.call(line, cwd=cwd, env=env, pass_fds=jobserver.get_jobserver_fds(env))
+
+
+class NinjaBuildSystem(BuildSystem):
+    JOBSERVER_MIN_VERSION = (1, 13)
+
+    def __init__(self):
+        BuildSystem.__init__(self, 'ninja', ['ninja'], 'Ninja')
+        self.version_ = None
+
+    def version(self) -> tuple:
+        if self.version_ is None:
+            try:
+                output = subprocess.check_output(['ninja', '--version']).decode('utf-8').strip()
+                self.version_ = tuple(int(x) for x in output.split('.')[:2])
+            except (OSError, ValueError, subprocess.CalledProcessError):
+                self.version_ = ()
+        return self.version_
+
+    def supports_jobserver(self) -> bool:
+        return self.version() >= self.JOBSERVER_MIN_VERSION
+
+
+SUPPORTED_BUILD_SYSTEMS = [NinjaBuildSystem(),
+                           BuildSystem('single_make', ['make'], 'Unix Makefiles', False),
+                           BuildSystem('make', ['make'], 'Unix Makefiles'),
+                           BuildSystem('gmake', ['gmake'], 'Unix Makefiles')]
 
 
 def get_supported_build_system_by_name(name) -> BuildSystem:
@@ -46,10 +96,100 @@ class BuildError(Exception):
         return self.value_
 
 
-# must be in cmake folder
+class BuildContext(object):
+    """
+    Working folder and environment of a build, passed to every command instead of changing process globals
+    """
+
+    def __init__(self, cwd: str, env=None):
+        self.cwd_ = os.path.abspath(cwd)
+        self.env_ = dict(os.environ if env is None else env)
+
+    def cwd(self) -> str:
+        return self.cwd_
+
+    def env(self) -> dict:
+        env = dict(self.env_)
+        # jobserver exported by BuildScheduler is shared by all builds of the process
+        if jobserver.has_jobserver(os.environ):
+            env[jobserver.MAKEFLAGS_ENV_NAME] = os.environ[jobserver.MAKEFLAGS_ENV_NAME]
+        return env
+
+    def set_env(self, key: str, value: str):
+        self.env_[key] = value
+
+    def append_env_path(self, key: str, path: str):
+        value = self.env_.get(key)
+        self.env_[key] = '{0}:{1}'.format(value, path) if value else path
+
+    def prepend_env_path(self, key: str, path: str):
+        value = self.env_.get(key)
+        self.env_[key] = '{0}:{1}'.format(path, value) if value else path
+
+    def path(self, *paths) -> str:
+        return os.path.join(self.cwd_, *paths)
+
+    def make_child(self, cwd: str):  # same environment, other folder
+        return BuildContext(self.path(cwd), self.env_)
+
+    def call(self, cmd: list, env=None) -> int:
+        return subprocess.call(cmd, cwd=self.cwd_, env=self.env() if env is None else env)
+
+
+def run_ldconfig():
+    if hasattr(shutil, 'which') and shutil.which('ldconfig'):
+        with build_trace.phase('ldconfig'):
+            subprocess.call(['ldconfig'])
+
+
+def check_build_step(code: int, step: str, cwd: str):  # failed step must not be installed, cached or published
+    if code != 0:
+        raise BuildError('{0} failed with exit code {1} in {2}'.format(step, code, cwd))
+
+
+def install_env(destdir=None, env=None) -> dict:
+    if not destdir:
+        return env
+
+    env = dict(os.environ if env is None else env)
+    env['DESTDIR'] = destdir
+    return env
+
+
+def copy_file_replace(src: str, dst: str):  # files of staged prefix may be hardlinks of previous generation
+    if os.path.islink(dst) or os.path.isfile(dst):
+        os.remove(dst)
+    return shutil.copy2(src, dst, follow_symlinks=False)
+
+
+def get_destdir_prefix_path(destdir: str, prefix_path: str) -> str:  # where DESTDIR install puts prefix files
+    abs_prefix_path = os.path.abspath(os.path.expanduser(prefix_path))
+    return os.path.join(destdir, os.path.splitdrive(abs_prefix_path)[1].lstrip('/\\'))
+
+
+CMAKE_FINGERPRINT_FILE_NAME = '.pyfastogt_fingerprint'
+
+
+def read_cmake_fingerprint(build_dir: str):
+    try:
+        with open(os.path.join(build_dir, CMAKE_FINGERPRINT_FILE_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cmake_fingerprint(build_dir: str, fingerprint: dict):
+    with open(os.path.join(build_dir, CMAKE_FINGERPRINT_FILE_NAME), 'w') as f:
+        json.dump(fingerprint, f)
+
+
+# cwd: cmake folder, current folder by default
 def build_command_cmake(prefix_path: str, cmake_flags: list, build_type='RELEASE', cmake_project_root_abs_path='..',
-                        build_system=get_supported_build_system_by_name('ninja')):
-    if not os.path.exists(cmake_project_root_abs_path):
+                        build_system=get_supported_build_system_by_name('ninja'), destdir=None, incremental=False,
+                        cwd=None, env=None):
+    source_dir = os.path.abspath(cwd) if cwd else os.getcwd()
+    build_dir = os.path.join(source_dir, 'build_cmake_%s' % build_type.lower())
+    if not os.path.exists(os.path.normpath(os.path.join(build_dir, cmake_project_root_abs_path))):
         raise BuildError('invalid cmake_project_root_path: %s' % cmake_project_root_abs_path)
 
     abs_prefix_path = os.path.expanduser(prefix_path)
@@ -57,42 +197,58 @@ def build_command_cmake(prefix_path: str, cmake_flags: list, build_type='RELEASE
                   '-DCMAKE_BUILD_TYPE=%s' % build_type]
     cmake_line.extend(cmake_flags)
     cmake_line.extend(['-DCMAKE_INSTALL_PREFIX=%s' % abs_prefix_path])
+    # generator, flags and install prefix, build tool reruns cmake itself when CMakeLists.txt changed
+    fingerprint = {'cmake_line': cmake_line, 'build_system': build_system.name()}
     try:
-        build_dir_name = 'build_cmake_%s' % build_type.lower()
-        if os.path.exists(build_dir_name):
-            shutil.rmtree(build_dir_name)
-
-        os.mkdir(build_dir_name)
-        os.chdir(build_dir_name)
-        subprocess.call(cmake_line)
-        make_line = build_system.cmd_line()
-        subprocess.call(make_line)
-        make_line.append('install')
-        subprocess.call(make_line)
-        if hasattr(shutil, 'which') and shutil.which('ldconfig'):
-            subprocess.call(['ldconfig'])
+        configure = True
+        if incremental and os.path.isdir(build_dir):
+            configure = read_cmake_fingerprint(build_dir) != fingerprint
+            if configure:
+                logger.info('cmake configuration changed, full rebuild of: %s' % build_dir)
+                shutil.rmtree(build_dir)
+        elif os.path.exists(build_dir):
+            shutil.rmtree(build_dir)
+
+        if configure:
+            os.mkdir(build_dir)
+            with build_trace.phase('cmake_configure'):
+                check_build_step(subprocess.call(cmake_line, cwd=build_dir, env=env), 'cmake', build_dir)
+            if incremental:
+                write_cmake_fingerprint(build_dir, fingerprint)
+        with build_trace.phase('compile'):
+            check_build_step(build_system.run(env=env, cwd=build_dir), build_system.name(), build_dir)
+        with build_trace.phase('install'):
+            check_build_step(build_system.run(['install'], env=install_env(destdir, env), cwd=build_dir),
+                             '%s install' % build_system.name(), build_dir)
+        if not destdir:
+            run_ldconfig()
     except Exception as ex:
         ex_str = str(ex)
         raise BuildError(ex_str)
 
 
-# must be in configure folder
+# cwd: configure folder, current folder by default
 def build_command_configure(compiler_flags: list, prefix_path, executable='./configure',
-                            build_system=get_supported_build_system_by_name('make')):
+                            build_system=get_supported_build_system_by_name('make'), destdir=None, env=None,
+                            cwd=None):
+    source_dir = os.path.abspath(cwd) if cwd else os.getcwd()
     # +x for exec file
-    st = os.stat(executable)
-    os.chmod(executable, st.st_mode | stat.S_IEXEC)
+    executable_path = os.path.join(source_dir, executable)
+    st = os.stat(executable_path)
+    os.chmod(executable_path, st.st_mode | stat.S_IEXEC)
 
     abs_prefix_path = os.path.expanduser(prefix_path)
     compile_cmd = [executable, '--prefix={0}'.format(abs_prefix_path)]
     compile_cmd.extend(compiler_flags)
-    subprocess.call(compile_cmd)
-    make_line = build_system.cmd_line()
-    subprocess.call(make_line)
-    make_line.append('install')
-    subprocess.call(make_line)
-    if hasattr(shutil, 'which') and shutil.which('ldconfig'):
-        subprocess.call(['ldconfig'])
+    with build_trace.phase('configure'):
+        check_build_step(subprocess.call(compile_cmd, cwd=source_dir, env=env), executable, source_dir)
+    with build_trace.phase('compile'):
+        check_build_step(build_system.run(env=env, cwd=source_dir), build_system.name(), source_dir)
+    with build_trace.phase('install'):
+        check_build_step(build_system.run(['install'], env=install_env(destdir, env), cwd=source_dir),
+                         '%s install' % build_system.name(), source_dir)
+    if not destdir:
+        run_ldconfig()
 
 
 def generate_fastogt_git_path(repo_name) -> str:
@@ -103,6 +259,32 @@ def generate_fastogt_git_path(repo_name) -> str:
 def generate_fastogt_github_path(repo_name) -> str:
     return generate_fastogt_git_path(repo_name)
 
+ARCHIVE_EXTENSIONS = ['.tar.gz', '.tar.xz', '.tar.bz2', '.tar.zst', '.tgz', '.zip', '.git']
+
+
+def get_target_name_by_url(url: str) -> str:
+    name = url.rstrip('/').rsplit('/', 1)[-1]
+    for ext in ARCHIVE_EXTENSIONS:
+        if name.endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def trace_target(name: str):  # keeps target set by caller, e.g. scheduler
+    if build_trace.get_target():
+        return contextlib.nullcontext()
+    return build_trace.target(name)
+
+
+def _traced_by_url(func):
+    @functools.wraps(func)
+    def wrapper(self, url: str, *args, **kwargs):
+        with trace_target(get_target_name_by_url(url)):
+            return func(self, url, *args, **kwargs)
+
+    return wrapper
+
+
 class BuildRequest(object):
     OPENSSL_SRC_ROOT = "https://www.openssl.org/source/"
     ARCH_OPENSSL_COMP = "gz"
@@ -116,7 +298,10 @@ class BuildRequest(object):
     MESON_ARCH_COMP = "gz"
     MESON_ARCH_EXT = "tar." + MESON_ARCH_COMP
 
-    def __init__(self, platform: str, arch_name: str, dir_path: str, prefix_path: str):
+    def __init__(self, platform: str, arch_name: str, dir_path: str, prefix_path: str, build_cache=None,
+                 compiler_cache=None, isolated=False, binary_repository=None,
+                 differential_install=False, sources=None, session=None, download_cache=None,
+                 git_mirror=None, incremental=False):
         platform_or_none = system_info.get_supported_platform_by_name(platform)
         if not platform_or_none:
             raise BuildError('invalid platform')
@@ -132,31 +317,60 @@ class BuildRequest(object):
         packages_types = platform_or_none.package_types()
         build_platform = platform_or_none.make_platform_by_arch(arch_or_none, packages_types)
 
-        env_pkg_path = os.environ.get('PKG_CONFIG_PATH')
-        add_env_pkg_path = '%s/lib/pkgconfig/' % abs_prefix_path
-        os.environ['PKG_CONFIG_PATH'] = '{0}:{1}'.format(env_pkg_path,
-                                                         add_env_pkg_path) if env_pkg_path else add_env_pkg_path
-        env_ld_library_path = os.environ.get('LD_LIBRARY_PATH')
-        add_env_ld_library_path = '%s/lib' % abs_prefix_path
-        os.environ['LD_LIBRARY_PATH'] = '{0}:{1}'.format(env_ld_library_path,
-                                                         add_env_ld_library_path) if env_ld_library_path else add_env_ld_library_path
-        env_path = os.environ.get('PATH')
-        add_env_path = '%s/bin' % abs_prefix_path
-        os.environ['PATH'] = '{0}:{1}'.format(env_path, add_env_path) if env_path else add_env_path
+        build_dir_path = os.path.abspath(dir_path)
+        context = BuildContext(build_dir_path)
+        context.append_env_path('PKG_CONFIG_PATH', '%s/lib/pkgconfig/' % abs_prefix_path)
+        context.append_env_path('LD_LIBRARY_PATH', '%s/lib' % abs_prefix_path)
+        context.append_env_path('PATH', '%s/bin' % abs_prefix_path)
         env = build_platform.env_variables()
         for key, value in env.items():
-            os.environ[key] = value
+            context.set_env(key, value)
+        if session:
+            # files are configured for prefix but installed into staging prefix till session commit,
+            # so later builds of the session look there first
+            if not session.is_active():
+                raise BuildError('build session not started')
+            if os.path.abspath(abs_prefix_path) != session.prefix_path():
+                raise BuildError('build session prefix mismatch: %s' % session.prefix_path())
+            staging_path = session.staging_path()
+            context.prepend_env_path('PKG_CONFIG_PATH', '%s/lib/pkgconfig/' % staging_path)
+            context.prepend_env_path('LD_LIBRARY_PATH', '%s/lib' % staging_path)
+            context.prepend_env_path('PATH', '%s/bin' % staging_path)
+            context.prepend_env_path('CPATH', '%s/include' % staging_path)
+            context.prepend_env_path('LIBRARY_PATH', '%s/lib' % staging_path)
+            context.prepend_env_path('CMAKE_PREFIX_PATH', staging_path)
 
         self.platform_ = build_platform
-        build_dir_path = os.path.abspath(dir_path)
         if os.path.exists(build_dir_path):
             shutil.rmtree(build_dir_path)
 
         os.mkdir(build_dir_path)
-        os.chdir(build_dir_path)
+        if not isolated:
+            # scripts built on top of BuildRequest rely on process environment and current folder
+            os.environ.update(context.env())
+            os.chdir(build_dir_path)
 
+        self.context_ = context
+        self.isolated_ = isolated
         self.build_dir_path_ = build_dir_path
         self.prefix_path_ = abs_prefix_path
+        self.build_cache_ = build_cache
+        self.binary_repository_ = binary_repository
+        self.sources_ = sources  # shared fetched sources, e.g. multi_arch.SharedSources
+        self.session_ = session  # build_session.BuildSession
+        self.download_cache_ = download_cache  # download_cache.DownloadCache
+        self.git_mirror_ = git_mirror  # git_mirror.GitMirrorCache
+        self.incremental_ = incremental  # default of cmake builds, see build_command_cmake
+        # installs go through staging folder and only changed files are written into prefix
+        install_path = session.staging_path() if session else abs_prefix_path
+        self.install_manifest_ = InstallManifest(install_path) if differential_install else None
+        # 'auto' picks first found of ccache/sccache
+        if compiler_cache:
+            compiler_cache = find_compiler_cache(None if compiler_cache == 'auto' else compiler_cache)
+            if not compiler_cache:
+                logger.warning('compiler cache not found, building without it')
+        self.compiler_cache_ = compiler_cache
+        self.compiler_cache_stats_ = []
         print("Build request for platform: {0}({1}) created".format(build_platform.name(), arch_or_none.name()))
 
     def platform(self):
@@ -171,6 +385,39 @@ class BuildRequest(object):
     def prefix_path(self):
         return self.prefix_path_
 
+    def context(self) -> BuildContext:
+        return self.context_
+
+    def is_isolated(self) -> bool:
+        return self.isolated_
+
+    def build_cache(self):
+        return self.build_cache_
+
+    def compiler_cache(self):
+        return self.compiler_cache_
+
+    def binary_repository(self):
+        return self.binary_repository_
+
+    def install_manifest(self):
+        return self.install_manifest_
+
+    def session(self):
+        return self.session_
+
+    def download_cache(self):
+        return self.download_cache_
+
+    def git_mirror(self):
+        return self.git_mirror_
+
+    def is_incremental(self) -> bool:
+        return self.incremental_
+
+    def compiler_cache_stats(self) -> list:  # [(step, CompilerCacheStats)]
+        return self.compiler_cache_stats_
+
     def build_snappy(self):
         self._clone_and_build_via_cmake(generate_fastogt_git_path('snappy'),
                                         ['-DBUILD_SHARED_LIBS=OFF', '-DSNAPPY_BUILD_TESTS=OFF'])
@@ -183,25 +430,25 @@ class BuildRequest(object):
         self._clone_and_build_via_autogen(generate_fastogt_git_path('libev'), libev_compiler_flags)
 
     def build_cpuid(self):
+        with trace_target('libcpuid'):
+            self._build_cpuid()
+
+    def _build_cpuid(self):
         cpuid_compiler_flags = ['--disable-shared', '--enable-static']
 
-        pwd = os.getcwd()
-        cloned_dir = utils.git_clone(generate_fastogt_git_path('libcpuid'))
-        os.chdir(cloned_dir)
+        cloned_dir = self._git_clone(generate_fastogt_git_path('libcpuid'))
 
         platform_name = self.platform_name()
         if platform_name == 'macosx':
             libtoolize_cpuid = ['glibtoolize']
         else:
             libtoolize_cpuid = ['libtoolize']
-        subprocess.call(libtoolize_cpuid)
+        self._call(libtoolize_cpuid, cloned_dir)
 
         autoreconf_cpuid = ['autoreconf', '--install']
-        subprocess.call(autoreconf_cpuid)
-
-        self._build_via_configure(cpuid_compiler_flags)
+        self._call(autoreconf_cpuid, cloned_dir)
 
-        os.chdir(pwd)
+        self._build_via_configure(cpuid_compiler_flags, source_dir=cloned_dir)
 
     def update_pyfastogt(self):
         self._clone_and_build_via_python3(generate_fastogt_git_path('pyfastogt'))
@@ -231,6 +478,10 @@ class BuildRequest(object):
         self._download_and_build_via_python3(url)
 
     def build_openssl(self, version, have_shared=False):
+        with trace_target('openssl-%s' % version):
+            self._build_openssl(version, have_shared)
+
+    def _build_openssl(self, version, have_shared=False):
         compiler_flags = ['no-tests']
         if not have_shared:
             compiler_flags.append('no-shared')
@@ -244,13 +495,42 @@ class BuildRequest(object):
 
         url = '{0}openssl-{1}.{2}'.format(self.OPENSSL_SRC_ROOT, version, self.ARCH_OPENSSL_EXT)
         # download
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
-        build_command_configure(compiler_flags, self.prefix_path_, './config',
-                                get_supported_build_system_by_name('single_make'))
-        os.chdir(pwd)
+        extracted_folder = self._download_and_extract(url)
+        env = self._compiler_cache_configure_env()
+        self._build_cached('configure:./config', compiler_flags, 'RELEASE', extracted_folder,
+                           lambda destdir: self._build_with_compiler_cache(
+                               'configure', extracted_folder, lambda: build_command_configure(
+                                   compiler_flags, self.prefix_path_, './config',
+                                   get_supported_build_system_by_name('single_make'), destdir=destdir, env=env,
+                                   cwd=extracted_folder)))
+
+    # context
+    def _work_dir(self) -> str:  # where sources are cloned/downloaded
+        return self.context_.cwd() if self.isolated_ else os.getcwd()
+
+    def _env(self):  # None inherits process environment
+        return self.context_.env() if self.isolated_ else None
+
+    def _call(self, cmd: list, cwd: str) -> int:
+        return subprocess.call(cmd, cwd=cwd, env=self._env())
+
+    # sources
+    def _git_clone(self, url: str, branch=None, remove_dot_git=True, paths=None) -> str:
+        if self.sources_:
+            cloned_dir = self.sources_.git_clone(url, branch, remove_dot_git, env=self._env(),
+                                                 mirror=self.git_mirror_, paths=paths)
+            return self.sources_.copy_to(cloned_dir, self._work_dir())
+        return utils.git_clone(url, branch, remove_dot_git, cwd=self._work_dir(), env=self._env(),
+                               mirror=self.git_mirror_, paths=paths)
+
+    def _download_and_extract(self, url: str) -> str:
+        work_dir = self._work_dir()
+        if self.sources_:
+            return self.sources_.copy_to(self.sources_.download_and_extract(url, self.download_cache_), work_dir)
+        if not self.download_cache_:
+            return utils.download_and_extract_file(url, cwd=work_dir)
+        file_path = utils.download_file(url, cwd=work_dir, cache=self.download_cache_)
+        return utils.extract_file(file_path, cwd=work_dir)
 
     # install packages
     def _install_package(self, name: str):
@@ -258,143 +538,249 @@ class BuildRequest(object):
 
     def _install_via_python3(self, name: str):
         python3_line = ['pip3', 'install', name]
-        subprocess.call(python3_line)
+        self._call(python3_line, self._work_dir())
 
     # clone
-    def _clone_and_build_via_cmake(self, url: str, cmake_flags: list, branch=None, remove_dot_git=True):
-        pwd = os.getcwd()
-        logger.debug(f'${pwd} url=${url} flags:${cmake_flags}')
-        cloned_dir = utils.git_clone(url, branch, remove_dot_git)
-        os.chdir(cloned_dir)
-        self._build_via_cmake(cmake_flags)
-        os.chdir(pwd)
-
-    def _clone_and_build_via_meson(self, url: str, meson_flags: list, branch=None, remove_dot_git=True):
-        pwd = os.getcwd()
-        cloned_dir = utils.git_clone(url, branch, remove_dot_git)
-        os.chdir(cloned_dir)
-        self._build_via_meson(meson_flags)
-        os.chdir(pwd)
-
+    @_traced_by_url
+    def _clone_and_build_via_cmake(self, url: str, cmake_flags: list, branch=None, remove_dot_git=True, paths=None,
+                                   incremental=None):
+        logger.debug(f'${self._work_dir()} url=${url} flags:${cmake_flags}')
+        cloned_dir = self._git_clone(url, branch, remove_dot_git, paths)
+        self._build_via_cmake(cmake_flags, incremental=incremental, source_dir=cloned_dir)
+
+    @_traced_by_url
+    def _clone_and_build_via_meson(self, url: str, meson_flags: list, branch=None, remove_dot_git=True, paths=None):
+        cloned_dir = self._git_clone(url, branch, remove_dot_git, paths)
+        self._build_via_meson(meson_flags, source_dir=cloned_dir)
+
+    @_traced_by_url
     def _clone_and_build_via_configure(self, url: str, compiler_flags: list, executable='./configure',
-                                       use_platform_flags=True, branch=None, remove_dot_git=True):
-        pwd = os.getcwd()
-        cloned_dir = utils.git_clone(url, branch, remove_dot_git)
-        os.chdir(cloned_dir)
-        self._build_via_configure(compiler_flags, executable, use_platform_flags)
-        os.chdir(pwd)
+                                       use_platform_flags=True, branch=None, remove_dot_git=True, paths=None):
+        cloned_dir = self._git_clone(url, branch, remove_dot_git, paths)
+        self._build_via_configure(compiler_flags, executable, use_platform_flags, source_dir=cloned_dir)
 
+    @_traced_by_url
     def _clone_and_build_via_autogen(self, url: str, compiler_flags: list, executable='./configure',
                                      use_platform_flags=True, branch=None,
-                                     remove_dot_git=True):
-        pwd = os.getcwd()
-        cloned_dir = utils.git_clone(url, branch, remove_dot_git)
-        os.chdir(cloned_dir)
-        self._build_via_autogen(compiler_flags, executable, use_platform_flags)
-        os.chdir(pwd)
+                                     remove_dot_git=True, paths=None):
+        cloned_dir = self._git_clone(url, branch, remove_dot_git, paths)
+        self._build_via_autogen(compiler_flags, executable, use_platform_flags, source_dir=cloned_dir)
 
+    @_traced_by_url
     def _clone_and_build_via_python3(self, url: str, branch=None,
-                                     remove_dot_git=True):
-        pwd = os.getcwd()
-        cloned_dir = utils.git_clone(url, branch, remove_dot_git)
-        os.chdir(cloned_dir)
+                                     remove_dot_git=True, paths=None):
+        cloned_dir = self._git_clone(url, branch, remove_dot_git, paths)
         python3_line = ['python3', 'setup.py', 'install']
-        subprocess.call(python3_line)
-        os.chdir(pwd)
+        self._call(python3_line, cloned_dir)
 
     # download
-    def _download_and_build_via_cmake(self, url: str, cmake_flags: list):
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
-        self._build_via_cmake(cmake_flags)
-        os.chdir(pwd)
+    @_traced_by_url
+    def _download_and_build_via_cmake(self, url: str, cmake_flags: list, incremental=None):
+        extracted_folder = self._download_and_extract(url)
+        self._build_via_cmake(cmake_flags, incremental=incremental, source_dir=extracted_folder)
 
+    @_traced_by_url
     def _download_and_build_via_bootstrap(self, url: str, compiler_flags: list, executable='./configure',
                                           use_platform_flags=True):
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
-        self._build_via_bootstrap(compiler_flags, executable, use_platform_flags)
-        os.chdir(pwd)
+        extracted_folder = self._download_and_extract(url)
+        self._build_via_bootstrap(compiler_flags, executable, use_platform_flags, source_dir=extracted_folder)
 
+    @_traced_by_url
     def _download_and_build_via_autogen(self, url: str, compiler_flags: list, executable='./configure',
                                         use_platform_flags=True):
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
-        self._build_via_autogen(compiler_flags, executable, use_platform_flags)
-        os.chdir(pwd)
+        extracted_folder = self._download_and_extract(url)
+        self._build_via_autogen(compiler_flags, executable, use_platform_flags, source_dir=extracted_folder)
 
+    @_traced_by_url
     def _download_and_build_via_python3(self, url: str):
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
+        extracted_folder = self._download_and_extract(url)
         python3_line = ['python3', 'setup.py', 'install']
-        subprocess.call(python3_line)
-        os.chdir(pwd)
+        self._call(python3_line, extracted_folder)
 
+    @_traced_by_url
     def _download_and_build_via_meson(self, url: str, compiler_flags: list,
                                       build_system=get_supported_build_system_by_name('ninja')):
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
-        self._build_via_meson(compiler_flags, build_system)
-        os.chdir(pwd)
+        extracted_folder = self._download_and_extract(url)
+        self._build_via_meson(compiler_flags, build_system, source_dir=extracted_folder)
 
+    @_traced_by_url
     def _download_and_build_via_configure(self, url: str, compiler_flags: list, executable='./configure',
                                           use_platform_flags=True):
-        pwd = os.getcwd()
-        file_path = utils.download_file(url)
-        extracted_folder = utils.extract_file(file_path)
-        os.chdir(extracted_folder)
-        self._build_via_configure(compiler_flags, executable, use_platform_flags)
-        os.chdir(pwd)
-
-    # build
-    def _build_via_autogen(self, compiler_flags: list, executable='./configure', use_platform_flags=True):
+        extracted_folder = self._download_and_extract(url)
+        self._build_via_configure(compiler_flags, executable, use_platform_flags, source_dir=extracted_folder)
+
+    # build, source_dir is current folder by default
+    def _build_via_autogen(self, compiler_flags: list, executable='./configure', use_platform_flags=True,
+                           source_dir=None):
+        source_dir = source_dir if source_dir else os.getcwd()
         autogen_line = ['sh', 'autogen.sh']
-        subprocess.call(autogen_line)
-        self._build_via_configure(compiler_flags, executable, use_platform_flags)
+        self._call(autogen_line, source_dir)
+        self._build_via_configure(compiler_flags, executable, use_platform_flags, source_dir=source_dir)
 
-    def _build_via_bootstrap(self, compiler_flags: list, executable='./configure', use_platform_flags=True):
+    def _build_via_bootstrap(self, compiler_flags: list, executable='./configure', use_platform_flags=True,
+                             source_dir=None):
+        source_dir = source_dir if source_dir else os.getcwd()
         autogen_line = ['sh', 'bootstrap']
-        subprocess.call(autogen_line)
-        self._build_via_configure(compiler_flags, executable, use_platform_flags)
-
-    def _build_via_meson(self, compiler_flags: list, build_system=get_supported_build_system_by_name('ninja')):
-        build_dir_name = 'build_meson'
-        os.mkdir(build_dir_name)
-        os.chdir(build_dir_name)
+        self._call(autogen_line, source_dir)
+        self._build_via_configure(compiler_flags, executable, use_platform_flags, source_dir=source_dir)
+
+    def _build_via_meson(self, compiler_flags: list, build_system=get_supported_build_system_by_name('ninja'),
+                         source_dir=None):
+        source_dir = source_dir if source_dir else os.getcwd()
+        build_dir = os.path.join(source_dir, 'build_meson')
+        os.mkdir(build_dir)
         abs_prefix_path = os.path.expanduser(self.prefix_path_)
         meson_line = ['meson', '--prefix', abs_prefix_path, '--libdir', abs_prefix_path + '/lib']
         meson_line.extend(compiler_flags)
-        subprocess.call(meson_line)
-        make_line = build_system.cmd_line()
-        subprocess.call(make_line)
-        make_line.append('install')
-        subprocess.call(make_line)
-
-    # raw build
-    def _build_via_cmake(self, cmake_flags: list, build_type='RELEASE', use_platform_flags=True):
+        env = self.compiler_cache_.meson_env(self._env()) if self.compiler_cache_ else self._env()
+
+        def build(destdir):
+            with build_trace.phase('meson_configure'):
+                check_build_step(subprocess.call(meson_line, cwd=build_dir, env=env), 'meson', build_dir)
+            with build_trace.phase('compile'):
+                check_build_step(build_system.run(env=env, cwd=build_dir), build_system.name(), build_dir)
+            with build_trace.phase('install'):
+                check_build_step(build_system.run(['install'], env=install_env(destdir, env), cwd=build_dir),
+                                 '%s install' % build_system.name(), build_dir)
+
+        self._build_cached('meson', compiler_flags, 'RELEASE', source_dir,
+                           lambda destdir: self._build_with_compiler_cache('meson', source_dir,
+                                                                           lambda: build(destdir)))
+
+    # compiler cache
+    def _build_with_compiler_cache(self, build_kind: str, source_dir: str, build_func):
+        if not self.compiler_cache_:
+            build_func()
+            return
+
+        step = '{0} {1}'.format(build_kind, source_dir)
+        stats_before = self.compiler_cache_.stats()
+        build_func()
+        stats = self.compiler_cache_.stats() - stats_before
+        self.compiler_cache_stats_.append((step, stats))
+        logger.info('{0} stats for {1}: {2}'.format(self.compiler_cache_.name(), step, stats))
+
+    def _compiler_cache_cmake_flags(self) -> list:
+        return self.compiler_cache_.cmake_flags() if self.compiler_cache_ else []
+
+    def _compiler_cache_configure_env(self):
+        return self.compiler_cache_.configure_env(self._env()) if self.compiler_cache_ else self._env()
+
+    # cache
+    def _run_ldconfig(self):  # once on commit in session
+        if self.session_:
+            self.session_.defer_hook('ldconfig')
+        else:
+            run_ldconfig()
+
+    def _install_staged(self, installed_dir: str, owner: str):
+        if not self.install_manifest_:
+            install_path = self.session_.staging_path() if self.session_ else self.prefix_path_
+            shutil.copytree(installed_dir, install_path, symlinks=True, copy_function=copy_file_replace,
+                            dirs_exist_ok=True)
+            self._run_ldconfig()
+            return
+
+        with build_trace.phase('install_manifest'):
+            result = self.install_manifest_.install(installed_dir, owner, hardlink=True)
+        logger.info('installed {0}: {1}'.format(owner, result))
+        if result.shared_libraries_changed():
+            self._run_ldconfig()
+
+    def _build_cached(self, build_kind: str, flags: list, build_type: str, source_dir: str, build_func):
+        # build_func(destdir) builds source_dir and installs into destdir
+        if not (self.build_cache_ or self.binary_repository_ or self.install_manifest_ or self.session_):
+            build_func(None)
+            return
+
+        # source folder names the target, trace target may be a group of builds (e.g. multi-arch run)
+        target = os.path.basename(os.path.normpath(source_dir))
+        destdir = os.path.join(source_dir, 'stage_%s' % build_type.lower())
+        if os.path.exists(destdir):
+            shutil.rmtree(destdir)
+        os.mkdir(destdir)
+        installed_dir = get_destdir_prefix_path(destdir, self.prefix_path_)
+        try:
+            key = None
+            if self.build_cache_:
+                key = self.build_cache_.make_key(source_dir, build_kind, flags, self.platform_, build_type,
+                                                 self.prefix_path_)
+                if self.build_cache_.restore(key, installed_dir):
+                    logger.info('build cache hit: {0} ({1})'.format(source_dir, self.build_cache_.stats()))
+                    self._install_staged(installed_dir, target)
+                    return
+
+                logger.info('build cache miss: {0}'.format(source_dir))
+
+            artifact_version = None
+            if self.binary_repository_:
+                artifact_version = make_artifact_version(source_dir, build_kind, flags, build_type)
+                artifact_path = self.binary_repository_.find(target, artifact_version, self.platform_.name(),
+                                                             self.platform_.architecture())
+                if artifact_path:
+                    logger.info('binary artifact found: {0}'.format(artifact_path))
+                    with build_trace.phase('install_artifact', path=artifact_path):
+                        install_artifact(artifact_path, self.prefix_path_, installed_dir)
+                    self._install_staged(installed_dir, target)
+                    return
+
+            build_func(destdir)
+            if not os.path.isdir(installed_dir):
+                raise BuildError('nothing installed by: %s' % source_dir)
+
+            self._install_staged(installed_dir, target)
+            if self.build_cache_:
+                self.build_cache_.put(key, installed_dir)
+            if self.binary_repository_:
+                with build_trace.phase('export_artifact'):
+                    artifact_path = self.binary_repository_.publish(installed_dir, self.prefix_path_, target,
+                                                                    artifact_version, self.platform_.name(),
+                                                                    self.platform_.architecture())
+                logger.info('binary artifact published: {0}'.format(artifact_path))
+        finally:
+            shutil.rmtree(destdir, ignore_errors=True)
+
+    # raw build, source_dir is current folder by default
+    def _build_via_cmake(self, cmake_flags: list, build_type='RELEASE', use_platform_flags=True, incremental=None,
+                         source_dir=None):
+        # None takes incremental of request
+        source_dir = source_dir if source_dir else os.getcwd()
+        incremental = self.incremental_ if incremental is None else incremental
         cmake_flags_extended = cmake_flags
         if use_platform_flags:
             cmake_flags_extended.extend(self.platform_.cmake_specific_flags())
-        build_command_cmake(self.prefix_path_, cmake_flags, build_type)
-
-    def _build_via_cmake_double(self, cmake_flags: list, build_type='RELEASE', use_platform_flags=True):
+        # launcher flags are kept out of the build cache key
+        cmake_build_flags = cmake_flags + self._compiler_cache_cmake_flags()
+        env = self._env()
+        self._build_cached('cmake', cmake_flags, build_type, source_dir,
+                           lambda destdir: self._build_with_compiler_cache(
+                               'cmake', source_dir, lambda: build_command_cmake(
+                                   self.prefix_path_, cmake_build_flags, build_type, destdir=destdir,
+                                   incremental=incremental, cwd=source_dir, env=env)))
+
+    def _build_via_cmake_double(self, cmake_flags: list, build_type='RELEASE', use_platform_flags=True,
+                                source_dir=None):
+        source_dir = source_dir if source_dir else os.getcwd()
         cmake_flags_extended = cmake_flags
         if use_platform_flags:
             cmake_flags_extended.extend(self.platform_.cmake_specific_flags())
-        build_command_cmake(self.prefix_path_, cmake_flags, build_type, '../../..')
-
-    def _build_via_configure(self, compiler_flags: list, executable='./configure', use_platform_flags=True):
+        cmake_build_flags = cmake_flags + self._compiler_cache_cmake_flags()
+        env = self._env()
+        self._build_cached('cmake:../../..', cmake_flags, build_type, source_dir,
+                           lambda destdir: self._build_with_compiler_cache(
+                               'cmake', source_dir, lambda: build_command_cmake(
+                                   self.prefix_path_, cmake_build_flags, build_type, '../../..', destdir=destdir,
+                                   cwd=source_dir, env=env)))
+
+    def _build_via_configure(self, compiler_flags: list, executable='./configure', use_platform_flags=True,
+                             source_dir=None):
+        source_dir = source_dir if source_dir else os.getcwd()
         compiler_flags_extended = compiler_flags
         if use_platform_flags:
             compiler_flags_extended.extend(self.platform_.configure_specific_flags())
-        build_command_configure(compiler_flags_extended, self.prefix_path_, executable)
+        env = self._compiler_cache_configure_env()
+        self._build_cached('configure:%s' % executable, compiler_flags_extended, 'RELEASE', source_dir,
+                           lambda destdir: self._build_with_compiler_cache(
+                               'configure', source_dir, lambda: build_command_configure(
+                                   compiler_flags_extended, self.prefix_path_, executable, destdir=destdir, env=env,
+                                   cwd=source_dir)))
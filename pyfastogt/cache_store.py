@@ -0,0 +1,207 @@
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+
+class CacheStoreError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+class CacheStats(object):
+    def __init__(self, hits=0, misses=0, stores=0, evictions=0):
+        self.hits_ = hits
+        self.misses_ = misses
+        self.stores_ = stores
+        self.evictions_ = evictions
+
+    def hits(self) -> int:
+        return self.hits_
+
+    def misses(self) -> int:
+        return self.misses_
+
+    def stores(self) -> int:
+        return self.stores_
+
+    def evictions(self) -> int:
+        return self.evictions_
+
+    def hit_ratio(self) -> float:
+        total = self.hits_ + self.misses_
+        return self.hits_ / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {'hits': self.hits_, 'misses': self.misses_, 'stores': self.stores_, 'evictions': self.evictions_}
+
+    def __str__(self):
+        return 'hits: {0}, misses: {1}, stores: {2}, evictions: {3}'.format(self.hits_, self.misses_, self.stores_,
+                                                                             self.evictions_)
+
+
+def get_dir_size(path: str) -> int:
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+class CacheStore(object):
+    """
+    Directory of cache entries addressed by key with size cap and LRU eviction,
+    index changes and entry reads are serialized by file lock so build processes can share the store
+    """
+    INDEX_FILE_NAME = 'index.json'
+    LOCK_FILE_NAME = 'lock'
+    ENTRIES_DIR_NAME = 'entries'
+    TMP_DIR_NAME = 'tmp'
+
+    def __init__(self, root_path: str, max_size: int):
+        self.root_path_ = os.path.abspath(os.path.expanduser(root_path))
+        self.max_size_ = max_size
+        os.makedirs(os.path.join(self.root_path_, self.ENTRIES_DIR_NAME), exist_ok=True)
+        os.makedirs(os.path.join(self.root_path_, self.TMP_DIR_NAME), exist_ok=True)
+
+    def root_path(self) -> str:
+        return self.root_path_
+
+    def max_size(self) -> int:
+        return self.max_size_
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.root_path_, self.ENTRIES_DIR_NAME, key)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root_path_, self.INDEX_FILE_NAME)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        with open(os.path.join(self.root_path_, self.LOCK_FILE_NAME), 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path(), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('entries', {})
+        index.setdefault('stats', CacheStats().to_dict())
+        return index
+
+    def _save_index(self, index: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_path_, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path())
+
+    def stats(self) -> CacheStats:
+        with self._lock():
+            stats = self._load_index()['stats']
+        return CacheStats(stats['hits'], stats['misses'], stats['stores'], stats['evictions'])
+
+    def size(self) -> int:
+        with self._lock():
+            return sum(entry['size'] for entry in self._load_index()['entries'].values())
+
+    def get(self, key: str):  # returns entry directory or None, entry may be evicted by other process meanwhile
+        with self._lock():
+            return self._get(key)
+
+    def read(self, key: str, read_func) -> bool:
+        """
+        read_func(path) reads entry directory while no other process can evict it, False if there is no entry
+        """
+        with self._lock():
+            path = self._get(key)
+            if not path:
+                return False
+            read_func(path)
+            return True
+
+    def _get(self, key: str):
+        index = self._load_index()
+        entry = index['entries'].get(key)
+        path = self.entry_path(key)
+        if entry and os.path.isdir(path):
+            entry['last_access'] = time.time()
+            index['stats']['hits'] += 1
+            result = path
+        else:
+            index['entries'].pop(key, None)
+            index['stats']['misses'] += 1
+            result = None
+        self._save_index(index)
+        return result
+
+    def put(self, key: str, fill_func) -> str:
+        """
+        fill_func(path) populates new entry directory, entry replaces previous one with the same key
+        """
+        tmp_path = tempfile.mkdtemp(dir=os.path.join(self.root_path_, self.TMP_DIR_NAME))
+        try:
+            fill_func(tmp_path)
+            size = get_dir_size(tmp_path)
+            if size > self.max_size_:
+                raise CacheStoreError('entry {0} size {1} exceeds cache size {2}'.format(key, size, self.max_size_))
+
+            path = self.entry_path(key)
+            with self._lock():
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                os.rename(tmp_path, path)
+
+                index = self._load_index()
+                now = time.time()
+                index['entries'][key] = {'size': size, 'created': now, 'last_access': now}
+                index['stats']['stores'] += 1
+                self._evict(index, key)
+                self._save_index(index)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+        return path
+
+    def _evict(self, index: dict, keep_key=None):
+        entries = index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_access']):
+            if total <= self.max_size_:
+                break
+            if key == keep_key:
+                continue
+
+            total -= entries.pop(key)['size']
+            index['stats']['evictions'] += 1
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+
+    def remove(self, key: str):
+        with self._lock():
+            index = self._load_index()
+            index['entries'].pop(key, None)
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            self._save_index(index)
+
+    def clear(self):
+        with self._lock():
+            index = self._load_index()
+            for key in list(index['entries']):
+                shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            index['entries'] = {}
+            self._save_index(index)
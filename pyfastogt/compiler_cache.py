@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import subprocess
+
+SUPPORTED_COMPILER_CACHES = ['ccache', 'sccache']
+
+
+class CompilerCacheStats(object):
+    def __init__(self, hits=0, misses=0):
+        self.hits_ = hits
+        self.misses_ = misses
+
+    def hits(self) -> int:
+        return self.hits_
+
+    def misses(self) -> int:
+        return self.misses_
+
+    def hit_ratio(self) -> float:
+        total = self.hits_ + self.misses_
+        return self.hits_ / total if total else 0.0
+
+    def __sub__(self, other):
+        return CompilerCacheStats(self.hits_ - other.hits_, self.misses_ - other.misses_)
+
+    def __str__(self):
+        return 'hits: {0}, misses: {1}, hit ratio: {2:.1f}%'.format(self.hits_, self.misses_,
+                                                                    self.hit_ratio() * 100.0)
+
+
+class CompilerCache(object):
+    def __init__(self, name: str, executable: str):
+        self.name_ = name
+        self.executable_ = executable
+
+    def name(self) -> str:
+        return self.name_
+
+    def executable(self) -> str:
+        return self.executable_
+
+    def cmake_flags(self) -> list:
+        return ['-DCMAKE_C_COMPILER_LAUNCHER=%s' % self.executable_,
+                '-DCMAKE_CXX_COMPILER_LAUNCHER=%s' % self.executable_]
+
+    def configure_env(self, env=None) -> dict:  # CC/CXX wrappers for autotools
+        result = dict(os.environ if env is None else env)
+        for key, default in (('CC', 'cc'), ('CXX', 'c++')):
+            compiler = result.get(key, default)
+            if compiler.split(' ', 1)[0] in (self.executable_, self.name_):
+                continue
+            result[key] = '{0} {1}'.format(self.executable_, compiler)
+        return result
+
+    def meson_env(self, env=None) -> dict:  # meson finds ccache/sccache in PATH on its own
+        result = dict(os.environ if env is None else env)
+        cache_dir = os.path.dirname(self.executable_)
+        path = result.get('PATH')
+        if cache_dir and (not path or cache_dir not in path.split(os.pathsep)):
+            result['PATH'] = '{0}{1}{2}'.format(cache_dir, os.pathsep, path) if path else cache_dir
+        return result
+
+    def stats(self) -> CompilerCacheStats:
+        return CompilerCacheStats()
+
+    def _check_output(self, args: list) -> str:
+        try:
+            return subprocess.check_output([self.executable_] + args, stderr=subprocess.DEVNULL).decode('utf-8')
+        except (OSError, subprocess.CalledProcessError):
+            return ''
+
+
+class Ccache(CompilerCache):
+    def __init__(self, executable: str):
+        CompilerCache.__init__(self, 'ccache', executable)
+
+    def stats(self) -> CompilerCacheStats:
+        # ccache >= 4: key<TAB>value lines
+        values = {}
+        for line in self._check_output(['--print-stats']).splitlines():
+            key, _, value = line.partition('\t')
+            if value.strip().isdigit():
+                values[key] = int(value)
+
+        hits = values.get('direct_cache_hit', 0) + values.get('preprocessed_cache_hit', 0)
+        return CompilerCacheStats(hits, values.get('cache_miss', 0))
+
+
+class Sccache(CompilerCache):
+    def __init__(self, executable: str):
+        CompilerCache.__init__(self, 'sccache', executable)
+
+    def stats(self) -> CompilerCacheStats:
+        output = self._check_output(['--show-stats', '--stats-format=json'])
+        try:
+            stats = json.loads(output)['stats']
+        except (ValueError, KeyError, TypeError):
+            return CompilerCacheStats()
+
+        hits = sum(stats.get('cache_hits', {}).get('counts', {}).values())
+        misses = sum(stats.get('cache_misses', {}).get('counts', {}).values())
+        return CompilerCacheStats(hits, misses)
+
+
+def make_compiler_cache(name: str, executable: str) -> CompilerCache:
+    if name == 'ccache':
+        return Ccache(executable)
+    elif name == 'sccache':
+        return Sccache(executable)
+    return None
+
+
+def find_compiler_cache(name=None) -> CompilerCache:
+    names = [name] if name else SUPPORTED_COMPILER_CACHES
+    for cache_name in names:
+        executable = shutil.which(cache_name)
+        if executable:
+            return make_compiler_cache(cache_name, executable)
+    return None
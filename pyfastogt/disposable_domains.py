@@ -0,0 +1,145 @@
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from pyfastogt import line_reader
+
+INDEX_MAGIC = b'PFDD'
+INDEX_VERSION = 1
+# magic, version, count; followed by sorted hashes (count x u64), string offsets ((count + 1) x u64), domains
+INDEX_HEADER = struct.Struct('<4sIQ')
+
+
+class DisposableDomainsError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+def hash_domain(domain: str) -> int:  # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(domain.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def normalize_domain(domain: str) -> str:
+    return domain.strip().rstrip('.').lower()
+
+
+def get_parent_domains(domain: str) -> list:  # mail.example.com -> [mail.example.com, example.com]
+    labels = domain.split('.')
+    return ['.'.join(labels[i:]) for i in range(max(1, len(labels) - 1))]
+
+
+def _to_little_endian(values: array) -> array:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def build_index(text_path: str, index_path: str) -> int:
+    """
+    Builds index file from text file of domains (one per line, # comments), returns number of domains
+    """
+    domains = set()
+    for line in line_reader.iter_lines(text_path):
+        domain = normalize_domain(line)
+        if domain and not domain.startswith('#'):
+            domains.add(domain)
+
+    entries = sorted((hash_domain(domain), domain.encode('utf-8')) for domain in domains)
+    hashes = array('Q', (entry[0] for entry in entries))
+    offsets = array('Q', [0])
+    for _, data in entries:
+        offsets.append(offsets[-1] + len(data))
+
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(entries)))
+            f.write(_to_little_endian(hashes).tobytes())
+            f.write(_to_little_endian(offsets).tobytes())
+            for _, data in entries:
+                f.write(data)
+        os.replace(tmp_path, index_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(entries)
+
+
+class DisposableDomains(object):
+    """
+    Memory mapped disposable domains index made by build_index, opened without reading it,
+    lookup is binary search of domain hash confirmed by exact domain comparison
+    """
+
+    def __init__(self, index_path: str):
+        self.file_ = open(index_path, 'rb')
+        try:
+            self.mmap_ = mmap.mmap(self.file_.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.file_.close()
+            raise DisposableDomainsError('invalid disposable domains index: %s' % index_path)
+
+        magic, version, count = INDEX_HEADER.unpack_from(self.mmap_, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self.close()
+            raise DisposableDomainsError('invalid disposable domains index: %s' % index_path)
+
+        self.count_ = count
+        hashes_offset = INDEX_HEADER.size
+        offsets_offset = hashes_offset + count * 8
+        self.strings_offset_ = offsets_offset + (count + 1) * 8
+        view = memoryview(self.mmap_)
+        self.hashes_ = view[hashes_offset:offsets_offset].cast('Q')
+        self.offsets_ = view[offsets_offset:self.strings_offset_].cast('Q')
+        view.release()
+        if sys.byteorder == 'big':  # index is little endian, copied once on big endian hosts
+            self.hashes_ = _to_little_endian(array('Q', self.hashes_))
+            self.offsets_ = _to_little_endian(array('Q', self.offsets_))
+
+    def __len__(self):
+        return self.count_
+
+    def __contains__(self, domain: str) -> bool:
+        domain = normalize_domain(domain)
+        value = hash_domain(domain)
+        data = domain.encode('utf-8')
+        pos = bisect.bisect_left(self.hashes_, value)
+        while pos < self.count_ and self.hashes_[pos] == value:  # exact confirmation of hash match
+            if self._domain(pos) == data:
+                return True
+            pos += 1
+        return False
+
+    def is_disposable_domain(self, domain: str) -> bool:  # subdomains of listed domains are disposable too
+        return any(parent in self for parent in get_parent_domains(normalize_domain(domain)))
+
+    def is_disposable_email(self, email: str) -> bool:
+        _, _, domain = email.rpartition('@')
+        return self.is_disposable_domain(domain)
+
+    def close(self):
+        for view in (getattr(self, 'hashes_', None), getattr(self, 'offsets_', None)):
+            if isinstance(view, memoryview):
+                view.release()
+        self.mmap_.close()
+        self.file_.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _domain(self, pos: int) -> bytes:
+        start = self.strings_offset_ + self.offsets_[pos]
+        return self.mmap_[start:self.strings_offset_ + self.offsets_[pos + 1]]
@@ -0,0 +1,466 @@
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from urllib.request import urlopen
+
+import certifi
+
+DEFAULT_SEGMENTS = 4
+MIN_SEGMENT_SIZE = 1024 * 1024
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 10
+READ_BLOCK_SIZE = 64 * 1024
+STATE_SAVE_INTERVAL = 1024 * 1024  # bytes downloaded by segment between state saves
+PART_FILE_SUFFIX = '.part'
+STATE_FILE_SUFFIX = '.part.json'
+
+
+class DownloadError(Exception):
+    def __init__(self, value, retry=True):
+        self.value_ = value
+        self.retry_ = retry
+
+    def retry(self) -> bool:  # temporary failure, e.g. 5xx status
+        return self.retry_
+
+    def __str__(self):
+        return self.value_
+
+
+class _RangesNotSupported(Exception):
+    pass
+
+
+def get_if_range(etag, last_modified):  # weak etag never matches If-Range (RFC 9110), date is used then
+    if etag and not etag.startswith('W/'):
+        return etag
+    return last_modified
+
+
+class RemoteFile(object):
+    def __init__(self, url: str, size=None, accept_ranges=False, etag=None, last_modified=None):
+        self.url_ = url
+        self.size_ = size
+        self.accept_ranges_ = accept_ranges
+        self.etag_ = etag
+        self.last_modified_ = last_modified
+
+    def url(self) -> str:  # after redirects
+        return self.url_
+
+    def size(self):
+        return self.size_
+
+    def accept_ranges(self) -> bool:
+        return self.accept_ranges_
+
+    def validator(self) -> dict:  # partial file is resumed only if remote file did not change
+        return {'size': self.size_, 'etag': self.etag_, 'last_modified': self.last_modified_}
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive connection per (thread, scheme, host), reused by requests of a thread,
+    close() closes connections of all threads
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout_ = timeout
+        self.local_ = threading.local()
+        self.lock_ = threading.Lock()
+        self.conns_ = set()  # open connections of all threads
+        self.ssl_context_ = ssl.create_default_context(cafile=certifi.where())
+
+    def request(self, method: str, url: str, headers=None) -> http.client.HTTPResponse:
+        parts = urlsplit(url)
+        path = parts.path if parts.path else '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = {'Accept-Encoding': 'identity'}
+        if headers:
+            request_headers.update(headers)
+
+        conn = self._connection(parts.scheme, parts.netloc)
+        try:
+            conn.request(method, path, headers=request_headers)
+            return conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            self.reset(parts.scheme, parts.netloc)
+            raise
+
+    def read(self, response: http.client.HTTPResponse, url: str, size=None) -> bytes:
+        """
+        Read of response body, connection is dropped when read fails in the middle of body
+        """
+        try:
+            return response.read(size)
+        except (OSError, http.client.HTTPException):
+            self.discard(response, url)
+            raise
+
+    def discard(self, response: http.client.HTTPResponse, url: str):
+        """
+        Close response not read till end (e.g. read failed), its connection can not be reused
+        """
+        response.close()
+        parts = urlsplit(url)
+        self.reset(parts.scheme, parts.netloc)
+
+    def reset(self, scheme: str, netloc: str):
+        conns = getattr(self.local_, 'conns', {})
+        conn = conns.pop((scheme, netloc), None)
+        if conn:
+            with self.lock_:
+                self.conns_.discard(conn)
+            conn.close()
+
+    def close(self):
+        with self.lock_:
+            conns = list(self.conns_)
+            self.conns_.clear()
+        for conn in conns:
+            conn.close()
+
+    def _connection(self, scheme: str, netloc: str):
+        conns = getattr(self.local_, 'conns', None)
+        if conns is None:
+            conns = self.local_.conns = {}
+        conn = conns.get((scheme, netloc))
+        with self.lock_:
+            if conn and conn in self.conns_:
+                return conn
+
+            # closed by close() of other thread
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(netloc, timeout=self.timeout_, context=self.ssl_context_)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=self.timeout_)
+            self.conns_.add(conn)
+        conns[(scheme, netloc)] = conn
+        return conn
+
+
+class Downloader(object):
+    """
+    Downloads url into file in parallel Range segments when server supports them,
+    interrupted downloads are resumed from <file>.part with segments state in <file>.part.json,
+    failed requests are retried with exponential backoff
+    """
+
+    def __init__(self, segments=DEFAULT_SEGMENTS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 timeout=DEFAULT_TIMEOUT, min_segment_size=MIN_SEGMENT_SIZE, progress=True):
+        self.segments_ = max(1, segments)
+        self.retries_ = retries
+        self.backoff_ = backoff
+        self.min_segment_size_ = min_segment_size
+        self.progress_ = progress
+        self.pool_ = ConnectionPool(timeout)
+        self.lock_ = threading.Lock()
+        self.downloaded_ = 0
+
+    def download(self, url: str, file_path: str) -> str:
+        scheme = urlsplit(url).scheme
+        if scheme not in ('http', 'https'):
+            return self._download_other(url, file_path)
+
+        remote = self._retry(lambda: self._resolve(url))
+        print("Downloading: {0} Bytes: {1}".format(os.path.basename(file_path), remote.size() or 0))
+        part_path = file_path + PART_FILE_SUFFIX
+        state_path = file_path + STATE_FILE_SUFFIX
+        try:
+            if remote.accept_ranges() and remote.size():
+                try:
+                    self._download_segments(remote, part_path, state_path)
+                except _RangesNotSupported:
+                    self._download_stream(remote, part_path)
+            else:
+                self._download_stream(remote, part_path)
+        finally:
+            self.pool_.close()
+
+        os.replace(part_path, file_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return file_path
+
+    def open_stream(self, url: str):
+        """
+        Body of url as file-like object with sha256 computed on the fly, for http(s) broken connection is
+        continued with Range request from the current offset
+        """
+        if urlsplit(url).scheme not in ('http', 'https'):
+            return DownloadStream(self, urlopen(url), url)
+
+        response, final_url = self._retry(lambda: self._request(url))
+        return DownloadStream(self, response, final_url)
+
+    # requests
+    def _retry(self, func):
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except (OSError, http.client.HTTPException, DownloadError) as ex:
+                if isinstance(ex, DownloadError) and not ex.retry():
+                    raise
+                if attempt >= self.retries_:
+                    raise DownloadError('download failed after {0} attempts: {1}'.format(attempt + 1, ex))
+                delay = self.backoff_ * (2 ** attempt)
+                attempt += 1
+                print('\nDownload error: {0}, retry {1}/{2} in {3:.1f}s'.format(ex, attempt, self.retries_, delay))
+                time.sleep(delay)
+
+    def _request(self, url: str, method='GET', headers=None) -> (http.client.HTTPResponse, str):
+        for _ in range(MAX_REDIRECTS):
+            response = self.pool_.request(method, url, headers)
+            if response.status in (301, 302, 303, 307, 308):
+                self.pool_.read(response, url)
+                url = urljoin(url, response.getheader('Location'))
+                continue
+
+            if response.status >= 400:
+                self.pool_.read(response, url)
+                raise DownloadError("Can't fetch url: {0}, status: {1}, response: {2}".format(
+                    url, response.status, response.reason), response.status >= 500 or response.status == 429)
+            return response, url
+        raise DownloadError('too many redirects: %s' % url)
+
+    def _resolve(self, url: str) -> RemoteFile:
+        # one byte range GET instead of HEAD, presigned release urls accept only GET
+        response, final_url = self._request(url, headers={'Range': 'bytes=0-0'})
+        etag = response.getheader('ETag')
+        last_modified = response.getheader('Last-Modified')
+        if response.status == 206:
+            self.pool_.read(response, final_url)
+            total = response.getheader('Content-Range', '').rpartition('/')[2]
+            return RemoteFile(final_url, int(total) if total.isdigit() else None, total.isdigit(), etag,
+                              last_modified)
+
+        # whole body is coming, drop the connection instead of reading it
+        self.pool_.discard(response, final_url)
+        length = response.getheader('Content-Length')
+        return RemoteFile(final_url, int(length) if length else None, False, etag, last_modified)
+
+    # single stream, no resume
+    def _download_stream(self, remote: RemoteFile, part_path: str):
+        def fetch():
+            self.downloaded_ = 0
+            response, url = self._request(remote.url())
+            with open(part_path, 'wb') as f:
+                while True:
+                    buffer = self.pool_.read(response, url, READ_BLOCK_SIZE)
+                    if not buffer:
+                        break
+                    f.write(buffer)
+                    self._add_progress(len(buffer), remote.size())
+            if remote.size() and self.downloaded_ != remote.size():
+                raise DownloadError('connection closed at {0} of {1} bytes'.format(self.downloaded_,
+                                                                                 remote.size()))
+
+        self._retry(fetch)
+
+    # ranges
+    def _load_state(self, remote: RemoteFile, part_path: str, state_path: str):
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if state.get('validator') != remote.validator() or not os.path.exists(part_path):
+            return None
+        return state
+
+    def _make_state(self, remote: RemoteFile) -> dict:
+        count = max(1, min(self.segments_, remote.size() // self.min_segment_size_))
+        segment_size = remote.size() // count
+        segments = []
+        for i in range(count):
+            start = i * segment_size
+            end = remote.size() - 1 if i == count - 1 else start + segment_size - 1
+            segments.append({'start': start, 'end': end, 'done': 0})
+        return {'validator': remote.validator(), 'segments': segments}
+
+    def _save_state(self, state: dict, state_path: str):
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def _download_segments(self, remote: RemoteFile, part_path: str, state_path: str):
+        state = self._load_state(remote, part_path, state_path)
+        if state:
+            done = sum(segment['done'] for segment in state['segments'])
+            print('Resuming: {0} from {1} Bytes'.format(os.path.basename(part_path), done))
+        else:
+            state = self._make_state(remote)
+            with open(part_path, 'wb') as f:
+                f.truncate(remote.size())
+            self._save_state(state, state_path)
+
+        self.downloaded_ = sum(segment['done'] for segment in state['segments'])
+        fd = os.open(part_path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            pending = [segment for segment in state['segments'] if
+                       segment['start'] + segment['done'] <= segment['end']]
+            with ThreadPoolExecutor(max_workers=max(1, len(pending))) as executor:
+                futures = [executor.submit(self._retry, lambda s=segment: self._fetch_segment(
+                    remote, fd, s, state, state_path)) for segment in pending]
+                for future in futures:
+                    future.result()
+        finally:
+            os.close(fd)
+            with self.lock_:
+                self._save_state(state, state_path)
+
+    def _fetch_segment(self, remote: RemoteFile, fd: int, segment: dict, state: dict, state_path: str):
+        offset = segment['start'] + segment['done']
+        if offset > segment['end']:
+            return
+
+        headers = {'Range': 'bytes={0}-{1}'.format(offset, segment['end'])}
+        if_range = get_if_range(remote.validator()['etag'], remote.validator()['last_modified'])
+        if if_range:
+            headers['If-Range'] = if_range
+        response, url = self._request(remote.url(), headers=headers)
+        if response.status != 206:
+            self.pool_.discard(response, url)
+            raise _RangesNotSupported()
+
+        unsaved = 0
+        while offset <= segment['end']:
+            buffer = self.pool_.read(response, url, min(READ_BLOCK_SIZE, segment['end'] - offset + 1))
+            if not buffer:
+                self.pool_.discard(response, url)
+                raise DownloadError('connection closed at {0} of segment {1}-{2}'.format(offset, segment['start'],
+                                                                                       segment['end']))
+            self._write_at(fd, buffer, offset)
+            offset += len(buffer)
+            unsaved += len(buffer)
+            with self.lock_:
+                segment['done'] = offset - segment['start']
+                if unsaved >= STATE_SAVE_INTERVAL:
+                    self._save_state(state, state_path)
+                    unsaved = 0
+            self._add_progress(len(buffer), remote.size())
+
+    def _write_at(self, fd: int, buffer: bytes, offset: int):
+        if hasattr(os, 'pwrite'):
+            os.pwrite(fd, buffer, offset)
+            return
+
+        with self.lock_:  # windows
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, buffer)
+
+    # other schemes (file:// etc.)
+    def _download_other(self, url: str, file_path: str) -> str:
+        with urlopen(url) as response, open(file_path, 'wb') as f:
+            shutil.copyfileobj(response, f)
+        return file_path
+
+    def _add_progress(self, size: int, total):
+        with self.lock_:
+            self.downloaded_ += size
+            downloaded = self.downloaded_
+        if not self.progress_:
+            return
+
+        percent = 0 if not total else downloaded * 100. / total
+        status = r"%10d  [%3.2f%%]" % (downloaded, percent)
+        status += chr(8) * (len(status) + 1)
+        print(status, end='\r')
+
+
+class DownloadStream(object):
+    def __init__(self, downloader: Downloader, response, url: str):
+        self.downloader_ = downloader
+        self.response_ = response
+        self.url_ = url
+        self.offset_ = 0
+        self.hash_ = hashlib.sha256()
+        length = response.headers.get('Content-Length')
+        self.size_ = int(length) if length else None
+        self.etag_ = response.headers.get('ETag')
+        self.last_modified_ = response.headers.get('Last-Modified')
+        self.accept_ranges_ = (response.headers.get('Accept-Ranges', '').lower() == 'bytes' and
+                               urlsplit(url).scheme in ('http', 'https'))
+        self.downloader_.downloaded_ = 0
+        print("Downloading: {0} Bytes: {1}".format(url.rsplit('/', 1)[-1], self.size_ or 0))
+
+    def url(self) -> str:
+        return self.url_
+
+    def size(self):
+        return self.size_
+
+    def offset(self) -> int:
+        return self.offset_
+
+    def sha256(self) -> str:  # of data read so far
+        return self.hash_.hexdigest()
+
+    def read(self, size=-1) -> bytes:
+        attempt = 0
+        reopen = False
+        while True:
+            try:
+                if reopen:
+                    self._reopen()
+                data = self.response_.read(size if size is not None and size >= 0 else None)
+                if not data and size != 0 and self.size_ is not None and self.offset_ < self.size_:
+                    raise DownloadError('connection closed at {0} of {1} bytes'.format(self.offset_, self.size_))
+                break
+            except (OSError, http.client.HTTPException, DownloadError) as ex:
+                retry = not isinstance(ex, DownloadError) or ex.retry()
+                if not retry or not self.accept_ranges_ or attempt >= self.downloader_.retries_:
+                    raise DownloadError('download of {0} failed: {1}'.format(self.url_, ex), False)
+                delay = self.downloader_.backoff_ * (2 ** attempt)
+                attempt += 1
+                print('\nDownload error: {0}, continue from {1} in {2:.1f}s'.format(ex, self.offset_, delay))
+                time.sleep(delay)
+                reopen = True
+
+        self.offset_ += len(data)
+        self.hash_.update(data)
+        self.downloader_._add_progress(len(data), self.size_)
+        return data
+
+    def _reopen(self):
+        self.downloader_.pool_.discard(self.response_, self.url_)
+        headers = {'Range': 'bytes=%d-' % self.offset_}
+        if_range = get_if_range(self.etag_, self.last_modified_)
+        if if_range:
+            headers['If-Range'] = if_range
+        response, _ = self.downloader_._request(self.url_, headers=headers)
+        if response.status != 206:  # file changed or ranges ignored
+            self.downloader_.pool_.discard(response, self.url_)
+            raise DownloadError('can not continue download of {0} from {1}'.format(self.url_, self.offset_), False)
+        self.response_ = response
+
+    def close(self):
+        self.response_.close()
+        self.downloader_.pool_.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def download(url: str, file_path: str, segments=DEFAULT_SEGMENTS, retries=DEFAULT_RETRIES) -> str:
+    return Downloader(segments, retries).download(url, file_path)
+
+
+def open_stream(url: str, retries=DEFAULT_RETRIES) -> DownloadStream:
+    return Downloader(retries=retries).open_stream(url)
@@ -0,0 +1,111 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+
+from pyfastogt import download
+from pyfastogt.cache_store import CacheStore
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+DEFAULT_DOWNLOAD_CACHE_PATH = os.path.join('~', '.cache', 'pyfastogt', 'downloads')
+DEFAULT_DOWNLOAD_CACHE_SIZE = 5 * 1024 * 1024 * 1024
+DOWNLOAD_CACHE_FILES_DIR_NAME = 'files'
+DOWNLOAD_CACHE_SHA256_FILE_NAME = 'sha256'
+DOWNLOAD_CACHE_LOCKS_DIR_NAME = 'locks'
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def verify_file_hash(path: str, sha256: str):
+    file_hash = hash_file(path)
+    if file_hash != sha256.lower():
+        raise download.DownloadError('checksum mismatch of {0}: expected {1}, got {2}'.format(path, sha256,
+                                                                                             file_hash), False)
+
+
+def link_or_copy(path: str, dest_path: str):  # hardlink shares cached file without copying it
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(path, dest_path)
+    except OSError:
+        shutil.copy2(path, dest_path)
+
+
+class DownloadCache(object):
+    """
+    Downloaded files keyed by url and expected sha256, hits do not touch network.
+    Processes fetching the same url wait for the first one instead of downloading it again.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_DOWNLOAD_CACHE_PATH, max_size=DEFAULT_DOWNLOAD_CACHE_SIZE):
+        self.store_ = CacheStore(cache_dir, max_size)
+        os.makedirs(os.path.join(self.store_.root_path(), DOWNLOAD_CACHE_LOCKS_DIR_NAME), exist_ok=True)
+
+    def store(self) -> CacheStore:
+        return self.store_
+
+    def stats(self):
+        return self.store_.stats()
+
+    @staticmethod
+    def make_key(url: str, sha256=None) -> str:
+        data = json.dumps({'url': url, 'sha256': sha256.lower() if sha256 else None}, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def fetch(self, url: str, file_path: str, sha256=None) -> str:
+        key = self.make_key(url, sha256)
+        if self._read(key, file_path):
+            return file_path
+
+        with self._key_lock(key):
+            # fetched by other process meanwhile
+            if os.path.isdir(self.store_.entry_path(key)) and self._read(key, file_path):
+                return file_path
+
+            def fill(path: str):
+                files_dir = os.path.join(path, DOWNLOAD_CACHE_FILES_DIR_NAME)
+                os.mkdir(files_dir)
+                cached_path = download.download(url, os.path.join(files_dir, os.path.basename(file_path)))
+                if sha256:
+                    verify_file_hash(cached_path, sha256)
+                with open(os.path.join(path, DOWNLOAD_CACHE_SHA256_FILE_NAME), 'w') as f:
+                    f.write(sha256.lower() if sha256 else hash_file(cached_path))
+
+            files_dir = os.path.join(self.store_.put(key, fill), DOWNLOAD_CACHE_FILES_DIR_NAME)
+            link_or_copy(os.path.join(files_dir, os.path.basename(file_path)), file_path)
+        return file_path
+
+    def sha256(self, url: str, sha256=None):  # hash of cached file or None
+        result = []
+
+        def read(path: str):
+            with open(os.path.join(path, DOWNLOAD_CACHE_SHA256_FILE_NAME), 'r') as f:
+                result.append(f.read().strip())
+
+        return result[0] if self.store_.read(self.make_key(url, sha256), read) else None
+
+    def _read(self, key: str, file_path: str) -> bool:
+        def read(path: str):
+            files_dir = os.path.join(path, DOWNLOAD_CACHE_FILES_DIR_NAME)
+            link_or_copy(os.path.join(files_dir, os.listdir(files_dir)[0]), file_path)
+
+        return self.store_.read(key, read)
+
+    @contextlib.contextmanager
+    def _key_lock(self, key: str):
+        with open(os.path.join(self.store_.root_path(), DOWNLOAD_CACHE_LOCKS_DIR_NAME, key), 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
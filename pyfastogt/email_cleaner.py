@@ -0,0 +1,212 @@
+import csv
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from validate_email import validate_email
+
+from pyfastogt import email_validation, line_reader, utils
+from pyfastogt.disposable_domains import DisposableDomains
+
+DEFAULT_PARTITION_SIZE = 64 * 1024 * 1024  # bytes of input per partition, bounds memory of a worker
+PARTITION_BUFFER_SIZE = 64 * 1024 * 1024  # bytes of addresses buffered before they are appended to partitions
+OUTPUT_FILE_TEMPLATE = 'part-{0:05d}.csv'
+OUTPUT_STATUS_FILE_TEMPLATE = 'part-{0:05d}-{1}.csv'  # split_statuses: addresses of one status per file
+
+STATUS_VALID = 'valid'
+STATUS_INVALID = 'invalid'
+STATUS_ROLE = 'role'
+STATUS_NO_MX = 'no_mx'
+STATUS_DISPOSABLE = 'disposable'
+STATUSES = [STATUS_VALID, STATUS_INVALID, STATUS_ROLE, STATUS_NO_MX, STATUS_DISPOSABLE]
+
+logger = logging.getLogger()
+
+
+class EmailCleanerError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+class CleanStats(object):
+    def __init__(self, total=0, counts=None, elapsed=0.0, output_files=None):
+        self.total_ = total
+        self.counts_ = counts if counts else {status: 0 for status in STATUSES}
+        self.elapsed_ = elapsed
+        self.output_files_ = output_files if output_files else []
+
+    def total(self) -> int:  # addresses read, with duplicates
+        return self.total_
+
+    def unique(self) -> int:
+        return sum(self.counts_.values())
+
+    def counts(self) -> dict:  # status -> unique addresses
+        return self.counts_
+
+    def elapsed(self) -> float:
+        return self.elapsed_
+
+    def rate(self) -> float:  # addresses/sec
+        return self.total_ / self.elapsed_ if self.elapsed_ else 0.0
+
+    def output_files(self) -> list:
+        return self.output_files_
+
+    def __str__(self):
+        counts = ', '.join('{0}: {1}'.format(status, self.counts_[status]) for status in STATUSES)
+        return 'addresses: {0}, unique: {1} ({2}), {3:.1f}s, {4:.0f} addresses/sec'.format(
+            self.total_, self.unique(), counts, self.elapsed_, self.rate())
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().strip('<>').strip().lower()
+
+
+# worker process state, set by _init_worker
+_check_mx = False
+_disposable_domains = None
+_mx_cache = {}
+
+
+def _init_worker(check_mx: bool, disposable_index):
+    global _check_mx, _disposable_domains
+    _check_mx = check_mx
+    # index is memory mapped, so every worker shares the same pages
+    _disposable_domains = DisposableDomains(disposable_index) if disposable_index else None
+
+
+def _has_mx(domain: str) -> bool:
+    has_mx = _mx_cache.get(domain)
+    if has_mx is None:
+        try:
+            has_mx = bool(email_validation.check_mx(domain))
+        except Exception:
+            has_mx = False
+        _mx_cache[domain] = has_mx
+    return has_mx
+
+
+def classify_email(email: str) -> str:
+    if not validate_email(email, check_mx=False):
+        return STATUS_INVALID
+    if utils.is_role_based_email(email):
+        return STATUS_ROLE
+    if _disposable_domains is not None and _disposable_domains.is_disposable_email(email):
+        return STATUS_DISPOSABLE
+    if _check_mx and not _has_mx(email_validation.get_email_domain(email)):
+        return STATUS_NO_MX
+    return STATUS_VALID
+
+
+def _clean_partition(partition_path: str, output_dir: str, index: int, split_statuses: bool) -> tuple:
+    # all copies of address are in the same partition, so it is deduplicated here alone
+    emails = set()
+    if os.path.exists(partition_path):  # no addresses were hashed into partition otherwise
+        emails.update(line_reader.iter_lines(partition_path))
+        os.remove(partition_path)
+    counts = {status: 0 for status in STATUSES}
+    if not split_statuses:
+        output_path = os.path.join(output_dir, OUTPUT_FILE_TEMPLATE.format(index))
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            for email in sorted(emails):
+                status = classify_email(email)
+                counts[status] += 1
+                writer.writerow([email, status])
+        return counts, [output_path]
+
+    files = {}  # status -> file, opened on first address of status
+    try:
+        for email in sorted(emails):
+            status = classify_email(email)
+            counts[status] += 1
+            f = files.get(status)
+            if not f:
+                f = files[status] = open(os.path.join(output_dir, OUTPUT_STATUS_FILE_TEMPLATE.format(index, status)),
+                                         'w', newline='')
+            f.write(email + '\n')
+    finally:
+        for f in files.values():
+            f.close()
+    return counts, [f.name for f in files.values()]
+
+
+def _flush_partitions(partitions_dir: str, buffers: list):
+    # one file is open at a time, so number of partitions is not limited by open files limit
+    for i, buffer in enumerate(buffers):
+        if buffer:
+            with open(os.path.join(partitions_dir, '%d.txt' % i), 'a') as f:
+                f.write(''.join(buffer))
+            buffer.clear()
+
+
+def _partition(input_path: str, partitions_dir: str, partitions: int, progress,
+               buffer_size=PARTITION_BUFFER_SIZE) -> int:
+    buffers = [[] for _ in range(partitions)]
+    buffered = 0
+    total = 0
+    for lines in line_reader.iter_line_blocks(input_path, progress=progress):
+        for line in lines:
+            email = normalize_email(line)
+            if not email:
+                continue
+            buffers[zlib.crc32(email.encode('utf-8')) % partitions].append(email + '\n')
+            buffered += len(email) + 1
+            total += 1
+        if buffered >= buffer_size:
+            _flush_partitions(partitions_dir, buffers)
+            buffered = 0
+    _flush_partitions(partitions_dir, buffers)
+    return total
+
+
+def clean_email_list(input_path: str, output_dir: str, jobs=None, check_mx=False, disposable_index=None,
+                     partition_size=DEFAULT_PARTITION_SIZE, progress=False, split_statuses=False) -> CleanStats:
+    """
+    Streams addresses of input file, normalizes, deduplicates and classifies them (see STATUSES)
+    into output_dir/part-NNNNN.csv chunks of "email,status" rows by pool of processes.
+    Input is split into hash partitions of about partition_size bytes first, so memory stays bounded.
+    disposable_index: disposable_domains index file, disposable addresses are not detected without it
+    split_statuses: addresses go to output_dir/part-NNNNN-<status>.csv chunks, one address per line
+    """
+    if not os.path.exists(input_path):
+        raise EmailCleanerError('file path: {0} not exists'.format(input_path))
+    if disposable_index and not os.path.exists(disposable_index):
+        raise EmailCleanerError('disposable index: {0} not exists'.format(disposable_index))
+    if not disposable_index:  # online check of every domain does not scale to this pipeline
+        logger.warning('no disposable domains index, disposable addresses are classified by other checks only')
+
+    start = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = max(1, os.path.getsize(input_path) // partition_size + 1)
+    partitions_dir = tempfile.mkdtemp(prefix='.partitions_', dir=output_dir)
+    stats = CleanStats()
+    try:
+        stats.total_ = _partition(input_path, partitions_dir, partitions, progress)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(check_mx, disposable_index)) as executor:
+            futures = [executor.submit(_clean_partition, os.path.join(partitions_dir, '%d.txt' % i), output_dir, i,
+                                       split_statuses) for i in range(partitions)]
+            for done, future in enumerate(as_completed(futures), 1):
+                counts, output_files = future.result()
+                for status, count in counts.items():
+                    stats.counts_[status] += count
+                stats.output_files_.extend(output_files)
+                if progress:
+                    elapsed = time.time() - start
+                    print('partitions: {0}/{1}, unique: {2}, {3:.0f} addresses/sec'.format(
+                        done, partitions, stats.unique(), stats.total_ / elapsed if elapsed else 0.0))
+    finally:
+        shutil.rmtree(partitions_dir, ignore_errors=True)
+
+    stats.output_files_.sort()
+    stats.elapsed_ = time.time() - start
+    return stats
@@ -0,0 +1,165 @@
+import asyncio
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from validate_email import validate_email
+
+from pyfastogt import download
+
+DISPOSABLE_CHECK_URL = 'https://open.kickbox.com/v1/disposable/'
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+DEFAULT_ERROR_TTL = 60  # seconds, failed lookups are retried after it
+DEFAULT_TIMEOUT = 10  # seconds
+
+
+class EmailValidationError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+def get_email_domain(email: str):
+    _, sep, domain = email.rpartition('@')
+    return domain.lower() if sep and domain else None
+
+
+def check_mx(domain: str) -> bool:  # default resolver, same check as sync utils.is_valid_email
+    return validate_email('postmaster@' + domain, check_mx=True)
+
+
+class TTLCache(object):
+    def __init__(self, ttl: float, clock=time.monotonic):
+        self.ttl_ = ttl
+        self.clock_ = clock
+        self.values_ = {}  # key -> (value, expires)
+
+    def get(self, key):  # (found, value)
+        item = self.values_.get(key)
+        if not item:
+            return False, None
+        value, expires = item
+        if expires <= self.clock_():
+            del self.values_[key]
+            return False, None
+        return True, value
+
+    def set(self, key, value, ttl=None):
+        self.values_[key] = (value, self.clock_() + (self.ttl_ if ttl is None else ttl))
+
+    def __len__(self):
+        return len(self.values_)
+
+
+class EmailValidator(object):
+    """
+    Validates emails concurrently, MX and disposable verdicts are looked up once per domain and cached for ttl,
+    disposable checks reuse keep-alive connections.
+    resolver(domain) -> bool replaces MX lookup and disposable_url the disposable check service (e.g. in tests),
+    disposable_domains (disposable_domains.DisposableDomains) checks domains offline instead of the service,
+    failed lookups make email invalid and are cached for error_ttl only
+    """
+
+    def __init__(self, check_mx_records=True, resolver=None, disposable_url=DISPOSABLE_CHECK_URL,
+                 concurrency=DEFAULT_CONCURRENCY, ttl=DEFAULT_TTL, error_ttl=DEFAULT_ERROR_TTL,
+                 timeout=DEFAULT_TIMEOUT, disposable_domains=None):
+        self.check_mx_ = check_mx_records
+        self.resolver_ = resolver if resolver else check_mx
+        self.disposable_url_ = disposable_url
+        self.disposable_domains_ = disposable_domains
+        self.concurrency_ = concurrency
+        self.error_ttl_ = error_ttl
+        self.pool_ = download.ConnectionPool(timeout)
+        self.executor_ = ThreadPoolExecutor(max_workers=concurrency)
+        self.mx_cache_ = TTLCache(ttl)
+        self.disposable_cache_ = TTLCache(ttl)
+        self.pending_ = {}  # (cache name, domain) -> future of lookup in progress
+
+    def mx_cache(self) -> TTLCache:
+        return self.mx_cache_
+
+    def disposable_cache(self) -> TTLCache:
+        return self.disposable_cache_
+
+    async def validate(self, email: str) -> bool:
+        if not validate_email(email, check_mx=False):  # syntax only, no network
+            return False
+        domain = get_email_domain(email)
+        if self.check_mx_:
+            has_mx = await self._cached(self.mx_cache_, 'mx', domain, self.resolver_)
+            if not has_mx:
+                return False
+        if self.disposable_domains_ is not None:  # empty index is falsy
+            return not self.disposable_domains_.is_disposable_email(email)
+        disposable = await self._cached(self.disposable_cache_, 'disposable', domain, self._is_disposable)
+        return disposable is False
+
+    async def validate_batch(self, emails: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency_)
+
+        async def validate(email: str) -> bool:
+            async with semaphore:
+                return await self.validate(email)
+
+        return list(await asyncio.gather(*(validate(email) for email in emails)))
+
+    def close(self):
+        self.executor_.shutdown(wait=True)
+        self.pool_.close()
+
+    async def _cached(self, cache: TTLCache, name: str, domain: str, lookup_func):
+        found, value = cache.get(domain)
+        if found:
+            return value
+
+        key = (name, domain)
+        pending = self.pending_.get(key)
+        if pending:  # other email of domain is looking it up
+            return await pending
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending_[key] = future
+        try:
+            value = await loop.run_in_executor(self.executor_, lookup_func, domain)
+            cache.set(domain, value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception:
+            value = None
+            cache.set(domain, value, self.error_ttl_)
+        finally:
+            del self.pending_[key]
+        future.set_result(value)
+        return value
+
+    def _is_disposable(self, domain: str) -> bool:
+        url = self.disposable_url_ + domain
+        for attempt in range(2):  # server may have closed idle keep-alive connection
+            try:
+                response = self.pool_.request('GET', url)
+                data = self.pool_.read(response, url)
+                break
+            except (OSError, http.client.HTTPException):
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise EmailValidationError('disposable check of {0} failed with status {1}'.format(domain,
+                                                                                              response.status))
+        return bool(json.loads(data.decode('utf-8'))['disposable'])
+
+
+def validate_emails(emails: list, **kwargs) -> list:
+    """
+    Validity of every email, kwargs are passed to EmailValidator
+    """
+    validator = EmailValidator(**kwargs)
+    try:
+        return asyncio.run(validator.validate_batch(emails))
+    finally:
+        validator.close()
@@ -0,0 +1,274 @@
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from pyfastogt import archive, build_trace
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+DEFAULT_GIT_MIRROR_PATH = os.path.join('~', '.cache', 'pyfastogt', 'git')
+DEFAULT_SUBMODULE_JOBS = 8
+# local clones of file:// submodules are refused by default since git 2.38.1
+GIT_FILE_PROTOCOL_CONFIG = ['-c', 'protocol.file.allow=always']
+# overrides attributes of archived trees, exported snapshot has the same files as checkout
+MIRROR_ATTRIBUTES = '* -export-ignore -export-subst\n'
+
+
+class GitMirrorError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+def get_repo_name(url: str) -> str:
+    return os.path.splitext(url.rstrip('/').rsplit('/', 1)[-1])[0]
+
+
+def resolve_submodule_url(url: str, parent_url: str) -> str:  # relative urls are relative to parent repo
+    if not url.startswith(('./', '../')):
+        return url
+    return urljoin(parent_url.rstrip('/') + '/', url)
+
+
+def make_sparse_patterns(paths: list) -> list:  # anchored to repository root, not matched at any depth
+    return ['/' + path.strip('/') for path in paths]
+
+
+def is_path_needed(path: str, paths: list) -> bool:  # path is under one of paths or contains one of them
+    path = path.strip('/')
+    for needed in paths:
+        needed = needed.strip('/')
+        if path == needed or path.startswith(needed + '/') or needed.startswith(path + '/'):
+            return True
+    return False
+
+
+def get_submodule_paths(repo_dir: str, env=None) -> list:
+    if not os.path.exists(os.path.join(repo_dir, '.gitmodules')):
+        return []
+    try:
+        output = subprocess.check_output(['git', 'config', '-f', '.gitmodules', '--get-regexp',
+                                          r'^submodule\..*\.path$'], cwd=repo_dir, env=env).decode('utf-8')
+    except subprocess.CalledProcessError:
+        return []
+    return [line.partition(' ')[2].strip() for line in output.splitlines()]
+
+
+def set_sparse_checkout(repo_dir: str, paths: list, env=None):
+    # .gitmodules is kept, submodules of paths are found by it
+    patterns = make_sparse_patterns(paths) + ['/.gitmodules']
+    if subprocess.call(['git', 'sparse-checkout', 'set', '--no-cone'] + patterns, cwd=repo_dir, env=env) != 0:
+        raise GitMirrorError('sparse checkout of {0} failed in {1}'.format(paths, repo_dir))
+
+
+class GitMirrorCache(object):
+    """
+    Bare mirrors of cloned repositories (submodules too), clones check out from them locally,
+    every clone fetches only new objects into mirror
+    """
+
+    def __init__(self, path=DEFAULT_GIT_MIRROR_PATH, submodule_jobs=DEFAULT_SUBMODULE_JOBS):
+        self.path_ = os.path.abspath(os.path.expanduser(path))
+        self.submodule_jobs_ = submodule_jobs
+        os.makedirs(self.path_, exist_ok=True)
+
+    def path(self) -> str:
+        return self.path_
+
+    def mirror_path(self, url: str) -> str:
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', get_repo_name(url))
+        return os.path.join(self.path_, '{0}-{1}.git'.format(name, hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]))
+
+    def update(self, url: str, env=None) -> str:
+        mirror_path = self.mirror_path(url)
+        with self._lock(mirror_path), build_trace.phase('git_mirror_update', url=url):
+            if os.path.isdir(mirror_path):
+                self._git(['remote', 'update', '--prune'], mirror_path, env)
+            else:
+                tmp_path = mirror_path + '.tmp'
+                if os.path.exists(tmp_path):  # left by interrupted clone
+                    shutil.rmtree(tmp_path)
+                self._git(['clone', '--mirror', url, tmp_path], self.path_, env)
+                os.rename(tmp_path, mirror_path)
+            self._write_attributes(mirror_path)
+        return mirror_path
+
+    def clone(self, url: str, dest_dir: str, branch=None, env=None, paths=None) -> str:
+        """
+        Clone url into dest_dir with submodules, objects are hardlinked from local mirror,
+        paths limits checkout to them
+        """
+        mirror_path = self.update(url, env)
+        clone_line = ['clone', '--no-checkout']
+        if branch:
+            clone_line.extend(['--branch', branch, '--single-branch'])
+        clone_line.extend([mirror_path, dest_dir])
+        with build_trace.phase('git_clone', url=url):
+            self._git(clone_line, os.path.dirname(dest_dir), env)
+            self._git(['remote', 'set-url', 'origin', url], dest_dir, env)
+            if paths:
+                set_sparse_checkout(dest_dir, paths, env)
+            self._git(['checkout'], dest_dir, env)
+        with build_trace.phase('submodule_update', url=url):
+            self._update_submodules(dest_dir, url, env, paths)
+        return dest_dir
+
+    def export(self, url: str, dest_dir: str, branch=None, env=None, paths=None) -> str:
+        """
+        Writes snapshot of branch (default one if None) with submodules into dest_dir without .git,
+        files are streamed by git archive from mirror, paths limits snapshot to them,
+        export-ignore and export-subst attributes are not applied (see MIRROR_ATTRIBUTES)
+        """
+        mirror_path = self.update(url, env)
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        with build_trace.phase('git_export', url=url):
+            self._export_commit(mirror_path, url, self._resolve_commit(mirror_path, branch or 'HEAD', env), dest_dir,
+                                paths, env)
+        return dest_dir
+
+    def _export_submodule(self, url: str, commit: str, dest_dir: str, env):
+        self._export_commit(self.update(url, env), url, commit, dest_dir, None, env)
+
+    def _export_commit(self, mirror_path: str, url: str, commit: str, dest_dir: str, paths, env):
+        os.makedirs(dest_dir, exist_ok=True)
+        pathspec = ['--'] + list(paths) if paths else []
+        proc = subprocess.Popen(['git', 'archive', '--format=tar', commit] + pathspec, cwd=mirror_path, env=env,
+                                stdout=subprocess.PIPE)
+        try:
+            archive.extract_tar_stream(proc.stdout, 'tar', dest_dir)
+        finally:
+            proc.stdout.close()
+            code = proc.wait()
+        if code != 0:
+            raise GitMirrorError('git archive of {0} {1} failed'.format(url, commit))
+
+        submodules = self._list_submodules(mirror_path, url, commit, pathspec, env)
+        if not submodules:
+            return
+        with ThreadPoolExecutor(max_workers=self.submodule_jobs_) as executor:
+            futures = [executor.submit(self._export_submodule, submodule_url, submodule_commit,
+                                       os.path.join(dest_dir, path), env)
+                       for path, submodule_url, submodule_commit in submodules]
+            for future in futures:
+                future.result()
+
+    def _list_submodules(self, mirror_path: str, url: str, commit: str, pathspec: list, env) -> list:
+        """
+        [(path, url, commit)] of submodules pinned by commit
+        """
+        gitlinks = {}
+        output = self._git_output(['ls-tree', '-r', '-z', commit] + pathspec, mirror_path, env)
+        for entry in output.split('\0'):
+            info, _, path = entry.partition('\t')
+            fields = info.split()
+            if len(fields) == 3 and fields[1] == 'commit':
+                gitlinks[path] = fields[2]
+        if not gitlinks:
+            return []
+
+        names = {}  # path -> name
+        urls = {}  # name -> url
+        output = self._git_output(['config', '--blob', '%s:.gitmodules' % commit, '--get-regexp',
+                                   r'^submodule\..*\.(path|url)$'], mirror_path, env)
+        for line in output.splitlines():
+            key, _, value = line.partition(' ')
+            name, _, field = key[len('submodule.'):].rpartition('.')
+            if field == 'path':
+                names[value.strip()] = name
+            else:
+                urls[name] = resolve_submodule_url(value.strip(), url)
+
+        submodules = []
+        for path, submodule_commit in gitlinks.items():
+            submodule_url = urls.get(names.get(path))
+            if not submodule_url:
+                raise GitMirrorError('no url of submodule {0} in {1}'.format(path, url))
+            submodules.append((path, submodule_url, submodule_commit))
+        return submodules
+
+    def _resolve_commit(self, mirror_path: str, ref: str, env) -> str:
+        commit = self._git_output(['rev-parse', '--verify', '--quiet', ref + '^{commit}'], mirror_path, env).strip()
+        if not commit:
+            raise GitMirrorError('{0} not found in {1}'.format(ref, mirror_path))
+        return commit
+
+    def _update_submodules(self, repo_dir: str, repo_url: str, env, paths=None):
+        # paths limits submodules to those of checked out paths
+        if not os.path.exists(os.path.join(repo_dir, '.gitmodules')):
+            return
+
+        submodule_paths = get_submodule_paths(repo_dir, env)
+        if paths:
+            submodule_paths = [path for path in submodule_paths if is_path_needed(path, paths)]
+            if not submodule_paths:
+                return
+        self._git(['submodule', 'init', '--'] + submodule_paths, repo_dir, env)
+        urls = {}  # name -> upstream url
+        names_paths = {}  # name -> path
+        output = self._git_output(['config', '-f', '.gitmodules', '--get-regexp', r'^submodule\..*\.url$'],
+                                  repo_dir, env)
+        for line in output.splitlines():
+            key, _, url = line.partition(' ')
+            name = key[len('submodule.'):-len('.url')]
+            path = self._git_output(['config', '-f', '.gitmodules', 'submodule.%s.path' % name], repo_dir,
+                                    env).strip()
+            if path in submodule_paths:
+                urls[name] = resolve_submodule_url(url.strip(), repo_url)
+                names_paths[name] = path
+        if not urls:
+            return
+
+        # mirrors are updated in parallel, then submodules are checked out from them
+        with ThreadPoolExecutor(max_workers=self.submodule_jobs_) as executor:
+            mirrors = dict(zip(urls.keys(), executor.map(lambda u: self.update(u, env), urls.values())))
+        for name, mirror_path in mirrors.items():
+            self._git(['config', 'submodule.%s.url' % name, mirror_path], repo_dir, env)
+        self._git(GIT_FILE_PROTOCOL_CONFIG + ['submodule', 'update', '--jobs', str(self.submodule_jobs_), '--'] +
+                  submodule_paths, repo_dir, env)
+
+        for name, url in urls.items():
+            submodule_dir = os.path.join(repo_dir, names_paths[name])
+            self._git(['config', 'submodule.%s.url' % name, url], repo_dir, env)
+            self._git(['remote', 'set-url', 'origin', url], submodule_dir, env)
+            self._update_submodules(submodule_dir, url, env)
+
+    @staticmethod
+    def _write_attributes(mirror_path: str):
+        info_dir = os.path.join(mirror_path, 'info')
+        attributes_path = os.path.join(info_dir, 'attributes')
+        with contextlib.suppress(FileNotFoundError), open(attributes_path) as f:
+            if f.read() == MIRROR_ATTRIBUTES:
+                return
+        os.makedirs(info_dir, exist_ok=True)
+        with open(attributes_path, 'w') as f:
+            f.write(MIRROR_ATTRIBUTES)
+
+    @contextlib.contextmanager
+    def _lock(self, mirror_path: str):
+        with open(mirror_path + '.lock', 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _git(args: list, cwd: str, env=None):
+        if subprocess.call(['git'] + args, cwd=cwd, env=env) != 0:
+            raise GitMirrorError('git {0} failed in {1}'.format(' '.join(args), cwd))
+
+    @staticmethod
+    def _git_output(args: list, cwd: str, env=None) -> str:
+        try:
+            return subprocess.check_output(['git'] + args, cwd=cwd, env=env).decode('utf-8')
+        except subprocess.CalledProcessError:
+            return ''
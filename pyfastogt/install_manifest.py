@@ -0,0 +1,168 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+INSTALL_MANIFEST_DIR_NAME = '.pyfastogt'
+INSTALL_MANIFEST_FILE_NAME = 'install_manifest.json'
+INSTALL_MANIFEST_LOCK_FILE_NAME = 'install_manifest.lock'
+SYMLINK_HASH_PREFIX = 'link:'
+SHARED_LIBRARY_PATTERN = re.compile(r'.*\.(so(\.\d+)*|dylib)$')
+
+
+def is_shared_library(path: str) -> bool:
+    return bool(SHARED_LIBRARY_PATTERN.match(path))
+
+
+def hash_installed_file(path: str) -> str:
+    if os.path.islink(path):
+        return SYMLINK_HASH_PREFIX + os.readlink(path)
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class InstallResult(object):
+    def __init__(self):
+        self.copied_ = []
+        self.unchanged_ = []
+        self.removed_ = []
+
+    def copied(self) -> list:
+        return self.copied_
+
+    def unchanged(self) -> list:
+        return self.unchanged_
+
+    def removed(self) -> list:
+        return self.removed_
+
+    def shared_libraries_changed(self) -> bool:
+        return any(is_shared_library(path) for path in self.copied_ + self.removed_)
+
+    def __str__(self):
+        return 'copied: {0}, unchanged: {1}, removed: {2}'.format(len(self.copied_), len(self.unchanged_),
+                                                                 len(self.removed_))
+
+
+class InstallManifest(object):
+    """
+    Files installed into prefix per owner (build target): relative path -> content hash
+    """
+
+    def __init__(self, prefix_path: str):
+        self.prefix_path_ = os.path.abspath(os.path.expanduser(prefix_path))
+        self.path_ = os.path.join(self.prefix_path_, INSTALL_MANIFEST_DIR_NAME, INSTALL_MANIFEST_FILE_NAME)
+        self.owners_ = self._load()
+
+    def prefix_path(self) -> str:
+        return self.prefix_path_
+
+    def path(self) -> str:
+        return self.path_
+
+    def owners(self) -> list:
+        return sorted(self.owners_.keys())
+
+    def files(self, owner: str) -> dict:
+        return dict(self.owners_.get(owner, {}))
+
+    def owner_of(self, rel_path: str):
+        for owner, files in self.owners_.items():
+            if rel_path in files:
+                return owner
+        return None
+
+    def install(self, installed_dir: str, owner: str, hardlink=False) -> InstallResult:
+        """
+        Sync files staged in installed_dir into prefix, files with unchanged content are not touched,
+        files installed by owner previously but missing now are removed unless other owner lists them
+        """
+        with self._lock():
+            self.owners_ = self._load()  # parallel builds install into same prefix
+            return self._install(installed_dir, owner, hardlink)
+
+    def _install(self, installed_dir: str, owner: str, hardlink: bool) -> InstallResult:
+        result = InstallResult()
+        old_files = self.owners_.get(owner, {})
+        new_files = {}
+        for root, dirs, files in os.walk(installed_dir):
+            for name in dirs:  # symlinks to folders
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    files.append(name)
+            for name in files:
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, installed_dir)
+                file_hash = hash_installed_file(path)
+                new_files[rel_path] = file_hash
+                dest_path = os.path.join(self.prefix_path_, rel_path)
+                if old_files.get(rel_path) == file_hash and os.path.lexists(dest_path):
+                    result.unchanged().append(rel_path)
+                    continue
+
+                self._copy_file(path, dest_path, hardlink)
+                result.copied().append(rel_path)
+
+        for rel_path in old_files.keys() - new_files.keys():
+            if self._is_owned_by_other(rel_path, owner):  # installed by other target since, it is theirs now
+                continue
+            dest_path = os.path.join(self.prefix_path_, rel_path)
+            if os.path.islink(dest_path) or os.path.isfile(dest_path):
+                os.remove(dest_path)
+            result.removed().append(rel_path)
+
+        self.owners_[owner] = new_files
+        self._save()
+        return result
+
+    def _is_owned_by_other(self, rel_path: str, owner: str) -> bool:
+        return any(rel_path in files for other, files in self.owners_.items() if other != owner)
+
+    def _copy_file(self, path: str, dest_path: str, hardlink: bool):
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if os.path.islink(dest_path) or os.path.isfile(dest_path):
+            os.remove(dest_path)  # never write through old hardlinks/symlinks
+
+        if os.path.islink(path):
+            os.symlink(os.readlink(path), dest_path)
+            return
+
+        if hardlink:
+            try:
+                os.link(path, dest_path)
+                return
+            except OSError:  # other filesystem
+                pass
+        shutil.copy2(path, dest_path)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        os.makedirs(os.path.dirname(self.path_), exist_ok=True)
+        with open(os.path.join(os.path.dirname(self.path_), INSTALL_MANIFEST_LOCK_FILE_NAME), 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path_, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = self.path_ + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.owners_, f, sort_keys=True)
+        os.replace(tmp_path, self.path_)
@@ -0,0 +1,111 @@
+import os
+import re
+
+MAKEFLAGS_ENV_NAME = 'MAKEFLAGS'
+JOBSERVER_TOKEN = b'+'
+
+
+def get_jobserver_fds(env=None) -> tuple:
+    """
+    Pipe fds of GNU make jobserver announced in MAKEFLAGS which are open in this process
+    """
+    if env is None:
+        env = os.environ
+
+    makeflags = env.get(MAKEFLAGS_ENV_NAME)
+    if not makeflags:
+        return ()
+
+    res = re.search(r'--jobserver-(?:auth|fds)=(\d+),(\d+)', makeflags)
+    if not res:
+        return ()
+
+    fds = (int(res.group(1)), int(res.group(2)))
+    for fd in fds:
+        try:
+            os.fstat(fd)
+        except OSError:
+            return ()
+    return fds
+
+
+def has_jobserver(env=None) -> bool:
+    return bool(get_jobserver_fds(env))
+
+
+def without_jobserver(env=None) -> dict:
+    """
+    Copy of env whose MAKEFLAGS neither announce jobserver nor parallel jobs, for builds which must run serially
+    """
+    result = dict(os.environ if env is None else env)
+    makeflags = result.get(MAKEFLAGS_ENV_NAME)
+    if makeflags is None:
+        return result
+
+    flags = [flag for flag in makeflags.split() if not re.match(r'(-j\d*|--jobserver-(?:auth|fds)=\S*)$', flag)]
+    if flags:
+        result[MAKEFLAGS_ENV_NAME] = ' ' + ' '.join(flags)
+    else:
+        del result[MAKEFLAGS_ENV_NAME]
+    return result
+
+
+class JobServer(object):
+    """
+    GNU make compatible jobserver: every client owns one implicit job and takes tokens from the pipe for others
+    """
+
+    def __init__(self, jobs: int):
+        self.jobs_ = max(1, jobs)
+        self.read_fd_, self.write_fd_ = os.pipe()
+        os.set_inheritable(self.read_fd_, True)
+        os.set_inheritable(self.write_fd_, True)
+        os.write(self.write_fd_, JOBSERVER_TOKEN * (self.jobs_ - 1))
+        self.saved_makeflags_ = None
+        self.active_ = False
+
+    def jobs(self) -> int:
+        return self.jobs_
+
+    def fds(self) -> tuple:
+        return self.read_fd_, self.write_fd_
+
+    def makeflags(self) -> str:
+        # make >= 4.2 and ninja >= 1.13 read --jobserver-auth
+        return ' -j{0} --jobserver-auth={1},{2}'.format(self.jobs_, self.read_fd_, self.write_fd_)
+
+    def env(self, env=None) -> dict:
+        result = dict(os.environ if env is None else env)
+        result[MAKEFLAGS_ENV_NAME] = self.makeflags()
+        return result
+
+    def activate(self):  # export to environment inherited by builds started after this call
+        if self.active_:
+            return
+        self.saved_makeflags_ = os.environ.get(MAKEFLAGS_ENV_NAME)
+        os.environ[MAKEFLAGS_ENV_NAME] = self.makeflags()
+        self.active_ = True
+
+    def deactivate(self):
+        if not self.active_:
+            return
+        if self.saved_makeflags_ is None:
+            os.environ.pop(MAKEFLAGS_ENV_NAME, None)
+        else:
+            os.environ[MAKEFLAGS_ENV_NAME] = self.saved_makeflags_
+        self.active_ = False
+
+    def close(self):
+        self.deactivate()
+        for fd in (self.read_fd_, self.write_fd_):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,130 @@
+import heapq
+import mmap
+import os
+from array import array
+
+from pyfastogt import membership
+
+READ_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 100000
+HASH_SET_CHUNK_SIZE = 1000000
+
+
+class LineReaderError(Exception):
+    def __init__(self, value):
+        self.value_ = value
+
+    def __str__(self):
+        return self.value_
+
+
+def print_progress(read: int, total: int):
+    percent = 0 if not total else read * 100. / total
+    status = r"%10d  [%3.2f%%]" % (read, percent)
+    status += chr(8) * (len(status) + 1)
+    print(status, end='\r')
+
+
+def _iter_blocks(path: str, block_size: int, use_mmap: bool):
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, size, block_size):
+                    yield mm[offset:offset + block_size], size
+            return
+
+        for block in iter(lambda: f.read(block_size), b''):
+            yield block, size
+
+
+def iter_line_blocks(path: str, encoding='utf-8', use_mmap=True, block_size=READ_BLOCK_SIZE, progress=False):
+    """
+    Yields lists of stripped lines of file read in large (mmap-backed) blocks, whole file is never kept in memory.
+    progress: True prints read bytes, callable(read, total) gets them after every block
+    """
+    if not os.path.exists(path):
+        raise LineReaderError('file path: {0} not exists'.format(path))
+
+    report = print_progress if progress is True else progress
+    tail = b''
+    read = 0
+    for block, size in _iter_blocks(path, block_size, use_mmap):
+        buffer = tail + block if tail else block
+        end = buffer.rfind(b'\n')
+        if end < 0:
+            tail = buffer
+        else:
+            tail = buffer[end + 1:]
+            yield [line.strip() for line in buffer[:end].decode(encoding).split('\n')]
+        read += len(block)
+        if report:
+            report(read, size)
+    if tail:  # last line without new line
+        yield [tail.decode(encoding).strip()]
+
+
+def iter_lines(path: str, **kwargs):
+    """
+    Yields stripped lines of file, kwargs are passed to iter_line_blocks
+    """
+    for lines in iter_line_blocks(path, **kwargs):
+        yield from lines
+
+
+def iter_batches(path: str, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+    """
+    Yields lists of up to batch_size lines for vectorized processing, kwargs are passed to iter_line_blocks
+    """
+    batch = []
+    for lines in iter_line_blocks(path, **kwargs):
+        batch.extend(lines)
+        if len(batch) >= batch_size:
+            full = len(batch) - len(batch) % batch_size
+            for start in range(0, full, batch_size):
+                yield batch[start:start + batch_size]
+            batch = batch[full:]
+    if batch:
+        yield batch
+
+
+def hash_line(line: str) -> int:  # salted per process, hashes are only valid in memory
+    return hash(line) & 0xFFFFFFFFFFFFFFFF
+
+
+class HashSet(object):
+    """
+    Deduplicated set of lines kept as sorted array of their 64-bit hashes (8 bytes per line),
+    membership may give false positive only on hash collision (~n^2 / 2^65)
+    """
+
+    def __init__(self, lines=(), chunk_size=HASH_SET_CHUNK_SIZE):
+        # chunks are sorted separately and merged, so peak memory stays close to two arrays of hashes
+        chunks = []
+        chunk = []
+        for line in lines:
+            chunk.append(hash_line(line))
+            if len(chunk) == chunk_size:
+                chunks.append(array('Q', sorted(chunk)))
+                chunk = []
+        if chunk:
+            chunks.append(array('Q', sorted(chunk)))
+
+        self.hashes_ = array('Q')
+        last = None
+        for value in heapq.merge(*chunks):
+            if value != last:
+                self.hashes_.append(value)
+                last = value
+
+    def hashes(self) -> array:
+        return self.hashes_
+
+    def __len__(self):
+        return len(self.hashes_)
+
+    def __contains__(self, line: str) -> bool:
+        return membership.contains(self.hashes_, hash_line(line))
+
+    def contains_batch(self, lines: list):  # mask of lines in set, see membership.contains_batch
+        return membership.contains_batch(self.hashes_, array('Q', [hash_line(line) for line in lines]))
@@ -0,0 +1,57 @@
+import bisect
+from array import array
+
+try:
+    import numpy
+except ImportError:  # optional, bisect is used without it
+    numpy = None
+
+
+def contains(sorted_values, value) -> bool:
+    """
+    Iterative binary search of value in sorted sequence (list, array.array, numpy array)
+    """
+    pos = bisect.bisect_left(sorted_values, value)
+    return pos < len(sorted_values) and sorted_values[pos] == value
+
+
+def _as_numpy_array(values):
+    if isinstance(values, array):  # shares buffer without copying
+        return numpy.frombuffer(values, dtype=values.typecode)
+    return numpy.asarray(values)
+
+
+def _contains_batch_numpy(sorted_values, values):
+    haystack = _as_numpy_array(sorted_values)
+    needles = _as_numpy_array(values)
+    if not len(haystack):
+        return numpy.zeros(len(needles), dtype=bool)
+
+    # sorted needles walk haystack in order, far fewer cache misses on large arrays
+    order = numpy.argsort(needles, kind='stable')
+    sorted_needles = needles[order]
+    pos = numpy.searchsorted(haystack, sorted_needles)
+    found = pos < len(haystack)
+    found[found] = haystack[pos[found]] == sorted_needles[found]
+    mask = numpy.empty(len(needles), dtype=bool)
+    mask[order] = found
+    return mask
+
+
+def _contains_batch_bisect(sorted_values, values) -> list:
+    size = len(sorted_values)
+    mask = []
+    for value in values:
+        pos = bisect.bisect_left(sorted_values, value)
+        mask.append(pos < size and sorted_values[pos] == value)
+    return mask
+
+
+def contains_batch(sorted_values, values, use_numpy=True):
+    """
+    Boolean mask of values found in sorted_values (list, array.array or numpy array),
+    numpy array from vectorized searchsorted when numpy is available, list otherwise
+    """
+    if numpy and use_numpy:
+        return _contains_batch_numpy(sorted_values, values)
+    return _contains_batch_bisect(sorted_values, values)
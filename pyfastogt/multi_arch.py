@@ -0,0 +1,154 @@
+import hashlib
+import os
+import shutil
+import threading
+
+from pyfastogt import system_info, utils
+from pyfastogt.build_scheduler import BuildScheduler, BuildTarget, parse_target
+from pyfastogt.build_utils import BuildError, BuildRequest, logger
+
+
+class SharedSources(object):
+    """
+    Fetches every source once, builds of each arch work on their own copy of it
+    """
+
+    def __init__(self, path: str):
+        self.path_ = os.path.abspath(path)
+        self.lock_ = threading.Lock()
+        self.fetch_locks_ = {}
+        self.sources_ = {}  # key -> fetched folder
+        os.makedirs(self.path_, exist_ok=True)
+
+    def path(self) -> str:
+        return self.path_
+
+    def _fetch(self, key: str, fetch_func) -> str:
+        with self.lock_:
+            fetch_lock = self.fetch_locks_.setdefault(key, threading.Lock())
+        # other archs wait for the first one instead of fetching again
+        with fetch_lock:
+            source_dir = self.sources_.get(key)
+            if not source_dir:
+                fetch_dir = os.path.join(self.path_, hashlib.sha1(key.encode('utf-8')).hexdigest()[:12])
+                if os.path.exists(fetch_dir):
+                    shutil.rmtree(fetch_dir)
+                os.mkdir(fetch_dir)
+                source_dir = fetch_func(fetch_dir)
+                self.sources_[key] = source_dir
+            return source_dir
+
+    def git_clone(self, url: str, branch=None, remove_dot_git=True, env=None, mirror=None, paths=None) -> str:
+        key = 'git:{0}:{1}:{2}:{3}'.format(url, branch, remove_dot_git, ','.join(sorted(paths)) if paths else '')
+        return self._fetch(key, lambda fetch_dir: utils.git_clone(url, branch, remove_dot_git, cwd=fetch_dir,
+                                                                  env=env, mirror=mirror, paths=paths))
+
+    def download_and_extract(self, url: str, cache=None) -> str:
+        def fetch(fetch_dir: str) -> str:
+            if not cache:
+                return utils.download_and_extract_file(url, cwd=fetch_dir)
+            file_path = utils.download_file(url, cwd=fetch_dir, cache=cache)
+            return utils.extract_file(file_path, cwd=fetch_dir)
+
+        return self._fetch('url:%s' % url, fetch)
+
+    def copy_to(self, source_dir: str, work_dir: str) -> str:
+        dest_dir = os.path.join(work_dir, os.path.basename(os.path.normpath(source_dir)))
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        shutil.copytree(source_dir, dest_dir, symlinks=True)
+        return dest_dir
+
+
+class MultiArchBuildRequest(object):
+    """
+    Isolated BuildRequest per arch with shared sources, archs are built in parallel threads.
+    prefix_path may contain {arch}, otherwise arch name is appended to it,
+    without prefix_path default arch prefixes are used (with arch name appended if they clash)
+    """
+
+    def __init__(self, platform: str, arch_names: list, dir_path: str, prefix_path=None, **request_kwargs):
+        platform_or_none = system_info.get_supported_platform_by_name(platform)
+        if not platform_or_none:
+            raise BuildError('invalid platform')
+        if not arch_names:
+            arch_names = [arch.name() for arch in platform_or_none.architectures()]
+
+        build_dir_path = os.path.abspath(dir_path)
+        if os.path.exists(build_dir_path):
+            shutil.rmtree(build_dir_path)
+        os.makedirs(build_dir_path)
+
+        self.sources_ = SharedSources(os.path.join(build_dir_path, 'sources'))
+        self.requests_ = {}
+        prefix_paths = self._make_prefix_paths(platform_or_none, arch_names, prefix_path)
+        for arch_name in arch_names:
+            self.requests_[arch_name] = BuildRequest(platform, arch_name, os.path.join(build_dir_path, arch_name),
+                                                     prefix_paths[arch_name], isolated=True, sources=self.sources_,
+                                                     **request_kwargs)
+        self.build_dir_path_ = build_dir_path
+
+    @staticmethod
+    def _make_prefix_paths(platform, arch_names: list, prefix_path) -> dict:
+        prefix_paths = {}
+        for arch_name in arch_names:
+            arch = platform.get_architecture_by_arch_name(arch_name)
+            if not arch:
+                raise BuildError('invalid arch: %s' % arch_name)
+
+            if not prefix_path:
+                prefix_paths[arch_name] = arch.default_install_prefix_path()
+            elif '{arch}' in prefix_path:
+                prefix_paths[arch_name] = prefix_path.format(arch=arch_name)
+            else:
+                prefix_paths[arch_name] = os.path.join(prefix_path, arch_name)
+
+        if not prefix_path and len(set(prefix_paths.values())) != len(prefix_paths):
+            for arch_name in arch_names:
+                prefix_paths[arch_name] = os.path.join(prefix_paths[arch_name], arch_name)
+        return prefix_paths
+
+    def build_dir_path(self) -> str:
+        return self.build_dir_path_
+
+    def sources(self) -> SharedSources:
+        return self.sources_
+
+    def requests(self) -> dict:  # arch name -> BuildRequest
+        return self.requests_
+
+    def run(self, build_func, max_jobs=None) -> dict:
+        """
+        Call build_func(request) for every arch in parallel, returns arch name -> BuildResult
+        """
+        scheduler = BuildScheduler(max_jobs, use_threads=True)
+        for arch_name, request in self.requests_.items():
+            scheduler.add_target(BuildTarget(arch_name, lambda r=request: build_func(r)))
+
+        try:
+            scheduler.run()
+        except BuildError as ex:
+            logger.error(str(ex))
+
+        results = scheduler.results()
+        for arch_name, result in results.items():
+            logger.info('{0}: {1}{2}'.format(arch_name, result.status(),
+                                             ', %s' % result.message() if result.message() else ''))
+        return results
+
+    def build(self, names: list, max_jobs=None) -> dict:
+        """
+        Call BuildRequest.build_<name> methods in given order for every arch,
+        versioned targets are given as name=version (see build_scheduler.parse_target)
+        """
+        targets = [parse_target(name) for name in names]
+
+        def build_all(request: BuildRequest):
+            for name, version in targets:
+                build_func = getattr(request, 'build_' + name)
+                if version:
+                    build_func(version)
+                else:
+                    build_func()
+
+        return self.run(build_all, max_jobs)
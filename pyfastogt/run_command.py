@@ -1,6 +1,11 @@
+import asyncio
+import os
 import re
 import subprocess
 
+STREAM_LINE_LIMIT = 1024 * 1024  # bytes, longer output lines are passed to policy in chunks of it
+TERMINATE_TIMEOUT = 5  # seconds between terminate and kill of timed out/cancelled command
+
 
 class MessageType:
     STATUS = 1
@@ -118,10 +123,168 @@ def run_command_cb(cmd: list, policy=Policy()):
         for output in process.stdout:
             line = output.strip()
             policy.process(Message(line.decode("utf-8"), MessageType.MESSAGE))
-        rc = process.poll()
-        policy.update_progress_message(100.0, 'Command {0} finished successfully'.format(cmd))
+        process.stdout.close()
+        rc = process.wait()
+        if rc == 0:
+            policy.update_progress_message(100.0, 'Command {0} finished successfully'.format(cmd))
+        else:
+            policy.update_progress_message(100.0, 'Command {0} finished with exit code {1}'.format(cmd, rc))
     except subprocess.CalledProcessError as ex:
         policy.update_progress_message(100.0, 'Command {0} finished with exception {1}'.format(cmd, str(ex)))
         raise ex
 
     return rc
+
+
+class Command(object):
+    """
+    Command for CommandRunner, every output stream goes to its own policy (stderr is not captured without one)
+    """
+
+    def __init__(self, cmd: list, stdout_policy=None, stderr_policy=None, timeout=None, cwd=None, env=None):
+        self.cmd_ = cmd
+        self.stdout_policy_ = stdout_policy if stdout_policy else Policy()
+        self.stderr_policy_ = stderr_policy
+        self.timeout_ = timeout
+        self.cwd_ = cwd
+        self.env_ = env
+
+    def cmd(self) -> list:
+        return self.cmd_
+
+    def stdout_policy(self) -> Policy:
+        return self.stdout_policy_
+
+    def stderr_policy(self):
+        return self.stderr_policy_
+
+    def timeout(self):  # seconds or None
+        return self.timeout_
+
+
+class RunResult(object):
+    def __init__(self, cmd: list, returncode=None, timed_out=False, cancelled=False):
+        self.cmd_ = cmd
+        self.returncode_ = returncode
+        self.timed_out_ = timed_out
+        self.cancelled_ = cancelled
+
+    def cmd(self) -> list:
+        return self.cmd_
+
+    def returncode(self):  # None if command was cancelled before start
+        return self.returncode_
+
+    def timed_out(self) -> bool:
+        return self.timed_out_
+
+    def cancelled(self) -> bool:
+        return self.cancelled_
+
+    def succeeded(self) -> bool:
+        return self.returncode_ == 0 and not self.timed_out_ and not self.cancelled_
+
+
+async def _read_stream(stream: asyncio.StreamReader, policy: Policy):
+    while True:
+        try:
+            line = await stream.readuntil(b'\n')
+        except asyncio.IncompleteReadError as ex:  # last line without new line
+            line = ex.partial
+        except asyncio.LimitOverrunError:  # line longer than limit is passed in chunks
+            line = await stream.read(STREAM_LINE_LIMIT)
+        if not line:
+            break
+        policy.process(Message(line.decode('utf-8', errors='replace').strip(), MessageType.MESSAGE))
+
+
+async def _terminate(process):
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), TERMINATE_TIMEOUT)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+class CommandRunner(object):
+    """
+    Runs commands on asyncio loop, at most max_concurrency at once (cpu count by default).
+    Task returned by start() can be cancelled, command process is terminated then
+    """
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency_ = max_concurrency if max_concurrency else os.cpu_count() or 1
+        self.semaphore_ = None  # created on running loop, runner may be used by several loops one after another
+        self.loop_ = None
+
+    def max_concurrency(self) -> int:
+        return self.max_concurrency_
+
+    def start(self, command: Command) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        if self.loop_ is not loop:
+            self.semaphore_ = asyncio.Semaphore(self.max_concurrency_)
+            self.loop_ = loop
+        return loop.create_task(self._run(command, self.semaphore_))
+
+    async def run(self, commands: list) -> list:
+        """
+        Results of commands in their order, cancelled ones have cancelled() set
+        """
+        tasks = [self.start(command) for command in commands]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for i, result in enumerate(results):
+            if isinstance(result, asyncio.CancelledError):
+                results[i] = RunResult(commands[i].cmd(), cancelled=True)
+            elif isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def _run(self, command: Command, semaphore: asyncio.Semaphore) -> RunResult:
+        async with semaphore:
+            return await self._execute(command)
+
+    async def _execute(self, command: Command) -> RunResult:
+        cmd = command.cmd()
+        policy = command.stdout_policy()
+        stderr_policy = command.stderr_policy()
+        policy.update_progress_message(0.0, 'Command {0} started'.format(cmd))
+        process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE if stderr_policy else None,
+                                                       cwd=command.cwd_, env=command.env_, limit=STREAM_LINE_LIMIT)
+        readers = [_read_stream(process.stdout, policy)]
+        if stderr_policy:
+            readers.append(_read_stream(process.stderr, stderr_policy))
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*readers, process.wait()), command.timeout())
+        except asyncio.TimeoutError:
+            await _terminate(process)
+            policy.update_progress_message(100.0, 'Command {0} timed out after {1}s'.format(cmd, command.timeout()))
+            return RunResult(cmd, process.returncode, timed_out=True)
+        except asyncio.CancelledError:
+            await _terminate(process)
+            policy.update_progress_message(100.0, 'Command {0} cancelled'.format(cmd))
+            raise
+        except BaseException:  # e.g. failed policy, process must not outlive its command
+            await _terminate(process)
+            raise
+
+        rc = process.returncode
+        if rc == 0:
+            policy.update_progress_message(100.0, 'Command {0} finished successfully'.format(cmd))
+        else:
+            policy.update_progress_message(100.0, 'Command {0} finished with exit code {1}'.format(cmd, rc))
+        return RunResult(cmd, rc)
+
+
+def run_commands(commands: list, max_concurrency=None) -> list:
+    """
+    Runs Commands concurrently and waits for all of them, returns RunResults in order of commands
+    """
+    return asyncio.run(CommandRunner(max_concurrency).run(commands))
@@ -1,3 +1,4 @@
+import math
 import platform
 import distro
 import subprocess
@@ -301,3 +302,126 @@ def stable_path(path: str) -> str:
         return path.replace("\\", "/")
 
     return path.replace("\\", "/")
+
+
+# build jobs
+CGROUP_ROOT_PATH = '/sys/fs/cgroup'
+PROC_SELF_CGROUP_PATH = '/proc/self/cgroup'
+PROC_MEMINFO_PATH = '/proc/meminfo'
+DEFAULT_MEMORY_PER_BUILD_JOB = 1024 * 1024 * 1024
+
+
+def _read_text_file(path: str):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _get_cgroup_paths() -> dict:  # controller -> path relative to cgroup root, '' for cgroup v2
+    cgroup_paths = {}
+    content = _read_text_file(PROC_SELF_CGROUP_PATH)
+    if not content:
+        return cgroup_paths
+
+    for line in content.splitlines():
+        parts = line.split(':', 2)
+        if len(parts) != 3:
+            continue
+        controllers = parts[1].split(',') if parts[1] else ['']
+        for controller in controllers:
+            cgroup_paths[controller] = parts[2].lstrip('/')
+    return cgroup_paths
+
+
+def _cgroup_dirs(controller_dir: str, rel_path: str) -> list:  # cgroup of process and its parents
+    dirs = []
+    path = rel_path
+    while True:
+        dirs.append(os.path.join(controller_dir, path))
+        if not path:
+            break
+        path = os.path.dirname(path)
+    return dirs
+
+
+def get_cgroup_cpu_limit():  # cpus allowed by cgroup quota or None
+    cgroup_paths = _get_cgroup_paths()
+    limits = []
+    if '' in cgroup_paths:  # v2: cpu.max "quota period" or "max period"
+        for path in _cgroup_dirs(CGROUP_ROOT_PATH, cgroup_paths['']):
+            content = _read_text_file(os.path.join(path, 'cpu.max'))
+            if not content:
+                continue
+            quota, _, period = content.partition(' ')
+            if quota != 'max' and period:
+                limits.append(int(quota) / int(period))
+
+    if 'cpu' in cgroup_paths:  # v1: cpu.cfs_quota_us, -1 is unlimited
+        for path in _cgroup_dirs(os.path.join(CGROUP_ROOT_PATH, 'cpu'), cgroup_paths['cpu']):
+            quota = _read_text_file(os.path.join(path, 'cpu.cfs_quota_us'))
+            period = _read_text_file(os.path.join(path, 'cpu.cfs_period_us'))
+            if quota and period and int(quota) > 0:
+                limits.append(int(quota) / int(period))
+
+    return min(limits) if limits else None
+
+
+def get_cgroup_memory_available():  # bytes left under cgroup memory limit or None
+    cgroup_paths = _get_cgroup_paths()
+    available = []
+    checks = []
+    if '' in cgroup_paths:
+        checks.append((_cgroup_dirs(CGROUP_ROOT_PATH, cgroup_paths['']), 'memory.max', 'memory.current'))
+    if 'memory' in cgroup_paths:
+        checks.append((_cgroup_dirs(os.path.join(CGROUP_ROOT_PATH, 'memory'), cgroup_paths['memory']),
+                       'memory.limit_in_bytes', 'memory.usage_in_bytes'))
+
+    for dirs, limit_file, usage_file in checks:
+        for path in dirs:
+            limit = _read_text_file(os.path.join(path, limit_file))
+            usage = _read_text_file(os.path.join(path, usage_file))
+            if not limit or not limit.isdigit() or not usage:
+                continue
+            limit = int(limit)
+            if limit >= 1 << 60:  # v1 reports unlimited as huge number
+                continue
+            available.append(max(0, limit - int(usage)))
+
+    return min(available) if available else None
+
+
+def get_available_memory():  # bytes or None
+    available = []
+    content = _read_text_file(PROC_MEMINFO_PATH)
+    if content:
+        for line in content.splitlines():
+            if line.startswith('MemAvailable:'):
+                available.append(int(line.split()[1]) * 1024)
+                break
+
+    cgroup_available = get_cgroup_memory_available()
+    if cgroup_available is not None:
+        available.append(cgroup_available)
+    return min(available) if available else None
+
+
+def get_usable_cpu_count() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    cgroup_limit = get_cgroup_cpu_limit()
+    if cgroup_limit:
+        cpus = min(cpus, int(math.ceil(cgroup_limit)))
+    return max(1, cpus)
+
+
+def get_build_jobs(memory_per_job=DEFAULT_MEMORY_PER_BUILD_JOB) -> int:
+    jobs = get_usable_cpu_count()
+    memory = get_available_memory()
+    if memory is not None and memory_per_job:
+        jobs = min(jobs, memory // memory_per_job)
+    return max(1, jobs)
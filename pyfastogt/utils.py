@@ -4,12 +4,18 @@ import re
 import shutil
 import subprocess
 import tarfile
+import tempfile
 import json
 import ssl
-import certifi
 import contextlib
 from validate_email import validate_email
 from urllib.request import urlopen
+from pyfastogt import archive, build_trace, download, download_cache, email_validation, git_mirror, line_reader, \
+    membership
+
+
+ROLE_BASED_EMAIL_REGEX = re.compile(r'([^@]+)@[a-z0-9-]+(\.[a-z0-9-]+)*(\.[a-z]{2,12})$')
+ROLE_BASED_EMAIL_NAMES = frozenset(['noreply', 'support', 'admin', 'postmaster'])
 
 
 class CommonError(Exception):
@@ -20,14 +26,22 @@ class CommonError(Exception):
         return self.value_
 
 
-def is_valid_email(email: str, check_mx: bool) -> bool:
+def is_valid_email(email: str, check_mx: bool, timeout=email_validation.DEFAULT_TIMEOUT,
+                   disposable_domains=None) -> bool:
+    """
+    Checks single email, email_validation.EmailValidator checks many of them concurrently with caching.
+    disposable_domains: disposable_domains.DisposableDomains checks domain offline instead of kickbox request
+    """
     dns_valid = validate_email(email, check_mx=check_mx)
     if not dns_valid:
         return False
 
+    if disposable_domains is not None:  # empty index is falsy
+        return not disposable_domains.is_disposable_email(email)
+
     validate_url = 'https://open.kickbox.com/v1/disposable/' + email
     context = ssl._create_unverified_context()
-    response = urlopen(validate_url, context=context)
+    response = urlopen(validate_url, context=context, timeout=timeout)
     if response.status != 200:
         return False
 
@@ -38,115 +52,173 @@ def is_valid_email(email: str, check_mx: bool) -> bool:
 
 
 def is_role_based_email(email: str) -> bool:
-    r = re.compile('([^@]+)@[a-z0-9-]+(\.[a-z0-9-]+)*(\.[a-z]{2,12})$')
-    match = r.match(email)
+    match = ROLE_BASED_EMAIL_REGEX.match(email)
     if not match:
         return False
 
-    start = match.group(1)
-    for x in ['noreply', 'support', 'admin', 'postmaster']:
-        if start == x:
-            return True
+    return match.group(1) in ROLE_BASED_EMAIL_NAMES
 
-    return False
 
+def read_file_line_by_line(file, batch_size=None, progress=False):
+    """
+    Streams stripped lines (or lists of batch_size lines) of file without loading it
+    """
+    try:
+        if batch_size:
+            yield from line_reader.iter_batches(file, batch_size, progress=progress)
+        else:
+            yield from line_reader.iter_lines(file, progress=progress)
+    except line_reader.LineReaderError as ex:
+        raise CommonError(str(ex))
 
-def read_file_line_by_line_to_list(file) -> list:
-    if not os.path.exists(file):
-        raise CommonError('file path: {0} not exists'.format(file))
 
+def read_file_line_by_line_to_list(file, progress=False) -> list:
     file_array = []
-    with open(file, "r") as ins:
-        for line in ins:
-            file_array.append(line.strip())
-
+    try:
+        for lines in line_reader.iter_line_blocks(file, progress=progress):
+            file_array.extend(lines)
+    except line_reader.LineReaderError as ex:
+        raise CommonError(str(ex))
     return file_array
 
 
-def read_file_line_by_line_to_set(file) -> set:
-    if not os.path.exists(file):
-        raise CommonError('file path: {0} not exists'.format(file))
-
+def read_file_line_by_line_to_set(file, compact=False, progress=False):
+    """
+    compact=True returns line_reader.HashSet of line hashes, for files which do not fit in memory as set of str
+    """
+    if compact:
+        return line_reader.HashSet(read_file_line_by_line(file, progress=progress))
     file_set = set()
-    with open(file, "r") as ins:
-        for line in ins:
-            file_set.add(line.strip())
-
+    for lines in read_file_line_by_line(file, batch_size=line_reader.DEFAULT_BATCH_SIZE, progress=progress):
+        file_set.update(lines)
     return file_set
 
 
-def download_file(url):
-    current_dir = os.getcwd()
+def download_file(url, cwd=None, cache=None, sha256=None):
+    """
+    cache: download_cache.DownloadCache, sha256: expected hash of file
+    """
+    with build_trace.phase('download_file', url=url):
+        return _download_file(url, cwd, cache, sha256)
+
+
+def _download_file(url, cwd=None, cache=None, sha256=None):
+    current_dir = os.path.abspath(cwd) if cwd else os.getcwd()
     file_name = url.split('/')[-1]
-    response = urlopen(url, cafile=certifi.where())
-    if response.status != 200:
-        raise CommonError(
-            "Can't fetch url: {0}, status: {1}, response: {2}".format(url, response.status, response.reason))
+    file_path = os.path.join(current_dir, file_name)
+    try:
+        if cache:
+            return cache.fetch(url, file_path, sha256)
 
-    f = open(file_name, 'wb')
-    file_size = 0
-    header = response.getheader("Content-Length")
-    if header:
-        file_size = int(header)
+        download.download(url, file_path)
+        if sha256:
+            download_cache.verify_file_hash(file_path, sha256)
+        return file_path
+    except download.DownloadError as ex:
+        raise CommonError(str(ex))
 
-    print("Downloading: {0} Bytes: {1}".format(file_name, file_size))
 
-    file_size_dl = 0
-    block_sz = 8192
-    while True:
-        buffer = response.read(block_sz)
-        if not buffer:
-            break
+def extract_file(path, remove_after_extract=True, cwd=None):
+    current_dir = os.path.abspath(cwd) if cwd else os.getcwd()
+    print("Extracting: {0}".format(path))
+    try:
+        with build_trace.phase('extract_file', path=path):
+            return archive.extract_archive(path, current_dir)
+    except (archive.ArchiveError, tarfile.TarError) as ex:
+        raise CommonError("Can't extract file: {0}, error: {1}".format(path, ex))
+    finally:
+        if remove_after_extract:
+            os.remove(path)
 
-        file_size_dl += len(buffer)
-        f.write(buffer)
-        percent = 0 if not file_size else file_size_dl * 100. / file_size
-        status = r"%10d  [%3.2f%%]" % (file_size_dl, percent)
-        status += chr(8) * (len(status) + 1)
-        print(status, end='\r')
 
-    f.close()
-    return os.path.join(current_dir, file_name)
+STREAM_ARCHIVE_EXTENSIONS = ('.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar.zst', '.tar')
 
 
-def extract_file(path, remove_after_extract=True):
-    current_dir = os.getcwd()
-    print("Extracting: {0}".format(path))
-    try:
-        tar_file = tarfile.open(path)
-    except Exception as ex:
-        raise ex
+def download_and_extract_file(url, cwd=None, sha256=None):
+    """
+    Extracts tar archive while it is downloaded, archive is never written to disk,
+    sha256 (expected hash of archive) is checked after extraction
+    """
+    if not url.endswith(STREAM_ARCHIVE_EXTENSIONS):
+        return extract_file(download_file(url, cwd, sha256=sha256), cwd=cwd)
 
-    target_path = os.path.commonprefix(tar_file.getnames())
+    current_dir = os.path.abspath(cwd) if cwd else os.getcwd()
+    print("Extracting: {0}".format(url))
+    # members go to temporary folder till archive is complete and verified
+    tmp_dir = tempfile.mkdtemp(dir=current_dir, prefix='.extract_')
     try:
-        tar_file.extractall()
-    except Exception as ex:
-        raise ex
+        with build_trace.phase('download_extract_file', url=url), download.open_stream(url) as stream:
+            top_level = archive.extract_tar_stream(stream, archive.get_archive_format(url), tmp_dir)
+            file_hash = stream.sha256()
+
+        if sha256 and file_hash != sha256.lower():
+            raise CommonError('checksum mismatch of {0}: expected {1}, got {2}'.format(url, sha256, file_hash))
+
+        names = [os.path.basename(top_level)] if top_level != tmp_dir else os.listdir(tmp_dir)
+        for name in names:
+            dest_path = os.path.join(current_dir, name)
+            if os.path.isdir(dest_path) and not os.path.islink(dest_path):
+                shutil.rmtree(dest_path)
+            os.replace(os.path.join(tmp_dir, name), dest_path)
+        return os.path.join(current_dir, names[0]) if top_level != tmp_dir else current_dir
+    except (download.DownloadError, archive.ArchiveError, tarfile.TarError) as ex:
+        raise CommonError("Can't extract url: {0}, error: {1}".format(url, ex))
     finally:
-        tar_file.close()
-        if remove_after_extract:
-            os.remove(path)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    return os.path.join(current_dir, target_path)
 
+def git_clone(url: str, branch=None, remove_dot_git=True, cwd=None, env=None, mirror=None, paths=None):
+    """
+    remove_dot_git=True only needs snapshot of tree: it is exported from mirror (git_mirror.GitMirrorCache)
+    or shallow cloned, paths limits checkout to them (sparse checkout, blobs of other paths are not fetched)
+    """
+    current_dir = os.path.abspath(cwd) if cwd else os.getcwd()
+    cloned_dir_name = git_mirror.get_repo_name(url)
+    directory = os.path.join(current_dir, cloned_dir_name)
+    if mirror:
+        try:
+            if remove_dot_git:
+                return mirror.export(url, directory, branch, env, paths)
+            return mirror.clone(url, directory, branch, env, paths)
+        except git_mirror.GitMirrorError as ex:
+            raise CommonError(str(ex))
 
-def git_clone(url: str, branch=None, remove_dot_git=True):
-    current_dir = os.getcwd()
-    if branch:
-        common_git_clone_line = ['git', 'clone', '--branch', branch, '--single-branch', url]
+    if remove_dot_git:
+        common_git_clone_line = ['git', 'clone', '--depth=1']
+        if branch:
+            common_git_clone_line.extend(['--branch', branch])
+    elif branch:
+        common_git_clone_line = ['git', 'clone', '--branch', branch, '--single-branch']
     else:
-        common_git_clone_line = ['git', 'clone', '--depth=1', url]
-    cloned_dir_name = os.path.splitext(url.rsplit('/', 1)[-1])[0]
-    common_git_clone_line.append(cloned_dir_name)
-    subprocess.call(common_git_clone_line)
-    os.chdir(cloned_dir_name)
-
-    common_git_clone_init_line = ['git', 'submodule', 'update', '--init', '--recursive']
-    subprocess.call(common_git_clone_init_line)
-    directory = os.path.join(current_dir, cloned_dir_name)
+        common_git_clone_line = ['git', 'clone', '--depth=1']
+    if paths:  # blobs outside of paths are never fetched
+        common_git_clone_line.extend(['--filter=blob:none', '--no-checkout'])
+    common_git_clone_line.extend([url, cloned_dir_name])
+    with build_trace.phase('git_clone', url=url):
+        subprocess.call(common_git_clone_line, cwd=current_dir, env=env)
+        if paths:
+            try:
+                git_mirror.set_sparse_checkout(directory, paths, env)
+            except git_mirror.GitMirrorError as ex:
+                raise CommonError(str(ex))
+            subprocess.call(['git', 'checkout'], cwd=directory, env=env)
+
+    common_git_clone_init_line = ['git', 'submodule', 'update', '--init', '--recursive', '--jobs',
+                                  str(git_mirror.DEFAULT_SUBMODULE_JOBS)]
+    if remove_dot_git:  # snapshot needs no history of submodules
+        common_git_clone_init_line.append('--depth=1')
+    if paths:  # only submodules of checked out paths
+        submodule_paths = [path for path in git_mirror.get_submodule_paths(directory, env) if
+                           git_mirror.is_path_needed(path, paths)]
+        if not submodule_paths:
+            common_git_clone_init_line = None
+        else:
+            common_git_clone_init_line.extend(['--'] + submodule_paths)
+    if common_git_clone_init_line:
+        with build_trace.phase('submodule_update', url=url):
+            subprocess.call(common_git_clone_init_line, cwd=directory, env=env)
     if remove_dot_git:
         shutil.rmtree(os.path.join(directory, '.git'))
-    os.chdir(current_dir)
     return directory
 
 
@@ -163,20 +235,23 @@ def symlink_force(target, link_name):
 
 # Search for number in array
 def binary_search_impl(number, array, lo, hi):
-    if hi < lo:
-        return False
-
-    mid = (lo + hi) // 2
-    if number == array[mid]:
-        return True
-    elif number < array[mid]:
-        return binary_search_impl(number, array, lo, mid - 1)
-    else:
-        return binary_search_impl(number, array, mid + 1, hi)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if number == array[mid]:
+            return True
+        elif number < array[mid]:
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    return False
 
 
 def binary_search_number(anum, array):  # convenience interface to binary_search()
-    return binary_search_impl(anum, array, 0, len(array) - 1)
+    return membership.contains(array, anum)
+
+
+def binary_search_numbers(numbers, array):  # mask of numbers found in sorted array, searched at once
+    return membership.contains_batch(array, numbers)
 
 
 def regenerate_dbus_machine_id():
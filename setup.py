@@ -121,5 +121,6 @@ setup(
     cmdclass={
         'upload': UploadCommand
     },
-    scripts=['pyfastogt/exe/request_fastogt_license_key', 'pyfastogt/exe/regenerate_machine_id']
+    scripts=['pyfastogt/exe/request_fastogt_license_key', 'pyfastogt/exe/regenerate_machine_id',
+             'pyfastogt/exe/build_fastogt_targets', 'pyfastogt/exe/clean_email_list']
 )
@@ -0,0 +1,107 @@
+import io
+import os
+import shutil
+import stat
+import subprocess
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from pyfastogt import archive
+
+FILES = {'project-1.0/README': b'readme', 'project-1.0/src/main.c': b'int main;', 'project-1.0/configure': b'#!/bin/sh'}
+EXECUTABLES = {'project-1.0/configure'}
+
+
+def make_tar(path: str, mode: str, files=None):
+    with tarfile.open(path, mode) as tar:
+        for name, data in (files or FILES).items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755 if name in EXECUTABLES else 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return path
+
+
+def make_zip(path: str):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for name, data in FILES.items():
+            info = zipfile.ZipInfo(name)
+            info.external_attr = (0o755 if name in EXECUTABLES else 0o644) << 16
+            zip_file.writestr(info, data)
+    return path
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.dest_dir = os.path.join(self.dir.name, 'dest')
+        os.mkdir(self.dest_dir)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _check_extracted(self, top_level: str):
+        self.assertEqual(top_level, os.path.join(self.dest_dir, 'project-1.0'))
+        for name, data in FILES.items():
+            with open(os.path.join(self.dest_dir, name), 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertTrue(os.stat(os.path.join(self.dest_dir, 'project-1.0', 'configure')).st_mode & stat.S_IXUSR)
+        shutil.rmtree(top_level)
+
+    def test_extract_formats(self):
+        archives = [make_tar(os.path.join(self.dir.name, 'project.tar.gz'), 'w:gz'),
+                    make_tar(os.path.join(self.dir.name, 'project.tar.xz'), 'w:xz'),
+                    make_tar(os.path.join(self.dir.name, 'project.tar.bz2'), 'w:bz2'),
+                    make_tar(os.path.join(self.dir.name, 'project.tar'), 'w'),
+                    make_zip(os.path.join(self.dir.name, 'project.zip'))]
+        for decompressors in (archive.DECOMPRESSORS, {}):  # external decompressors and python fallback
+            with mock.patch.object(archive, 'DECOMPRESSORS', decompressors):
+                for path in archives:
+                    with self.subTest(path=path, decompressors=bool(decompressors)):
+                        self._check_extracted(archive.extract_archive(path, self.dest_dir))
+
+    @unittest.skipUnless(shutil.which('zstd'), 'zstd not found')
+    def test_extract_zstd(self):
+        tar_path = make_tar(os.path.join(self.dir.name, 'project.tar'), 'w')
+        zst_path = os.path.join(self.dir.name, 'project.tar.zst')
+        subprocess.check_call(['zstd', '-q', tar_path, '-o', zst_path])
+        self._check_extracted(archive.extract_archive(zst_path, self.dest_dir))
+        with mock.patch.object(archive, 'DECOMPRESSORS', {}):
+            with self.assertRaises(archive.ArchiveError):
+                archive.extract_archive(zst_path, self.dest_dir)
+
+    def test_extract_stream(self):
+        path = make_tar(os.path.join(self.dir.name, 'project.tar.gz'), 'w:gz')
+        for decompressors in (archive.DECOMPRESSORS, {}):
+            with mock.patch.object(archive, 'DECOMPRESSORS', decompressors), open(path, 'rb') as f:
+                self._check_extracted(archive.extract_tar_stream(f, 'gz', self.dest_dir))
+                self.assertEqual(f.read(), b'')  # stream is read to its end
+
+    def test_top_level_dir(self):
+        path = make_tar(os.path.join(self.dir.name, 'flat.tar.gz'), 'w:gz', {'a.txt': b'a', 'b/c.txt': b'c'})
+        self.assertEqual(archive.extract_archive(path, self.dest_dir), self.dest_dir)
+        path = make_tar(os.path.join(self.dir.name, 'single.tar.gz'), 'w:gz', {'./single.txt': b'a'})
+        self.assertEqual(archive.extract_archive(path, self.dest_dir), self.dest_dir)
+
+    def test_corrupted_archive(self):
+        path = os.path.join(self.dir.name, 'broken.tar.gz')
+        with open(path, 'wb') as f:
+            f.write(b'not a gzip stream')
+        for decompressors in (archive.DECOMPRESSORS, {}):
+            with mock.patch.object(archive, 'DECOMPRESSORS', decompressors):
+                with self.assertRaises((archive.ArchiveError, tarfile.TarError)):
+                    archive.extract_archive(path, self.dest_dir)
+
+    @unittest.skipUnless(hasattr(tarfile, 'tar_filter'), 'tarfile without extraction filters')
+    def test_member_outside_dest_rejected(self):
+        path = make_tar(os.path.join(self.dir.name, 'evil.tar.gz'), 'w:gz', {'../evil.txt': b'evil'})
+        with self.assertRaises(tarfile.TarError):
+            archive.extract_archive(path, self.dest_dir)
+        self.assertFalse(os.path.exists(os.path.join(self.dir.name, 'evil.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from pyfastogt import build_cache, system_info
+from pyfastogt.build_cache import BuildCache
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com', GIT_COMMITTER_NAME='test',
+               GIT_COMMITTER_EMAIL='test@example.com')
+
+
+def write_file(path: str, data: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def git(args: list, cwd: str):
+    subprocess.check_call(['git'] + args, cwd=cwd, env=GIT_ENV, stdout=subprocess.DEVNULL)
+
+
+class BuildCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.dir.name, 'snappy')
+        write_file(os.path.join(self.source_dir, 'CMakeLists.txt'), 'project(snappy)\n')
+        self.cache = BuildCache(os.path.join(self.dir.name, 'cache'))
+        platforms = system_info.get_supported_platform_by_name('linux')
+        self.platform = platforms.make_platform_by_arch(platforms.get_architecture_by_arch_name('x86_64'), [])
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _key(self, flags=None, build_type='RELEASE') -> str:
+        return self.cache.make_key(self.source_dir, 'cmake', flags or ['-DBUILD_SHARED_LIBS=OFF'], self.platform,
+                                   build_type, '/opt/prefix')
+
+    def test_key_changes_with_inputs(self):
+        key = self._key()
+        self.assertEqual(self._key(), key)
+        self.assertNotEqual(self._key(['-DBUILD_SHARED_LIBS=ON']), key)
+        self.assertNotEqual(self._key(build_type='DEBUG'), key)
+
+        # directories generated by builds do not change source
+        write_file(os.path.join(self.source_dir, 'build_cmake_release', 'CMakeCache.txt'), 'cache')
+        write_file(os.path.join(self.source_dir, 'stage_release', 'lib', 'libsnappy.a'), 'lib')
+        self.assertEqual(self._key(), key)
+        write_file(os.path.join(self.source_dir, 'snappy.cc'), 'int x;')
+        self.assertNotEqual(self._key(), key)
+
+    def test_git_source_revision(self):
+        git(['init', '-q'], self.source_dir)
+        git(['add', '-A'], self.source_dir)
+        git(['commit', '-q', '-m', 'init'], self.source_dir)
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=self.source_dir).decode().strip()
+        self.assertEqual(build_cache.source_id(self.source_dir), 'git:' + revision)
+
+        # local changes are hashed
+        write_file(os.path.join(self.source_dir, 'CMakeLists.txt'), 'project(changed)\n')
+        self.assertIsNone(build_cache.git_source_revision(self.source_dir))
+        self.assertTrue(build_cache.source_id(self.source_dir).startswith('tree:'))
+
+    def test_restore_installed_files(self):
+        installed_dir = os.path.join(self.dir.name, 'installed')
+        write_file(os.path.join(installed_dir, 'lib', 'libsnappy.a'), 'lib')
+        os.symlink('libsnappy.a', os.path.join(installed_dir, 'lib', 'libsnappy.so'))
+        key = self._key()
+        prefix_path = os.path.join(self.dir.name, 'prefix')
+        self.assertFalse(self.cache.restore(key, prefix_path))
+
+        self.cache.put(key, installed_dir)
+        self.assertTrue(self.cache.restore(key, prefix_path))
+        with open(os.path.join(prefix_path, 'lib', 'libsnappy.a')) as f:
+            self.assertEqual(f.read(), 'lib')
+        self.assertEqual(os.readlink(os.path.join(prefix_path, 'lib', 'libsnappy.so')), 'libsnappy.a')
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits(), stats.misses(), stats.stores()), (1, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
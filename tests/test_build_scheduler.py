@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pyfastogt import build_scheduler, build_trace
+from pyfastogt.build_history import BuildHistory
+from pyfastogt.build_utils import BuildError
+
+
+def compile_target():
+    with build_trace.phase('compile'):
+        time.sleep(0.2)
+
+
+def fail_target():
+    raise BuildError('compile failed')
+
+
+class BuildSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.history = BuildHistory(os.path.join(self.dir.name, 'history.json'))
+        build_trace.set_tracer(build_trace.BuildTracer())
+
+    def tearDown(self):
+        build_trace.set_tracer(None)
+        self.dir.cleanup()
+
+    def _scheduler(self, use_threads: bool) -> build_scheduler.BuildScheduler:
+        scheduler = build_scheduler.BuildScheduler(2, use_jobserver=False, use_threads=use_threads,
+                                                   history=self.history)
+        scheduler.add_target(build_scheduler.BuildTarget('a', compile_target))
+        scheduler.add_target(build_scheduler.BuildTarget('b', compile_target, ['a'], version='1.0'))
+        return scheduler
+
+    def _check_phases(self, use_threads: bool):
+        results = self._scheduler(use_threads).run()
+        self.assertTrue(all(result.is_success() for result in results.values()))
+        for name, version in (('a', None), ('b', '1.0')):
+            record = BuildHistory(self.history.path()).get(name, version)
+            self.assertEqual(list(record.phases().keys()), ['compile'])
+            self.assertGreaterEqual(record.phases()['compile'], 0.2)
+            self.assertGreaterEqual(record.durations()[0], record.phases()['compile'])
+
+    def test_phases_recorded_with_processes(self):
+        self._check_phases(False)
+        # events of forked builds reach the tracer of scheduler too
+        self.assertEqual(sorted(event.target() for event in build_trace.get_tracer().events()), ['a', 'b'])
+
+    def test_phases_recorded_with_threads(self):
+        self._check_phases(True)
+
+    def test_failed_target_skips_dependents(self):
+        scheduler = build_scheduler.BuildScheduler(2, use_jobserver=False)
+        scheduler.add_target(build_scheduler.BuildTarget('a', fail_target))
+        scheduler.add_target(build_scheduler.BuildTarget('b', compile_target, ['a']))
+        with self.assertRaises(BuildError):
+            scheduler.run()
+        results = scheduler.results()
+        self.assertEqual(results['a'].status(), build_scheduler.BuildResultStatus.FAILED)
+        self.assertEqual(results['a'].message(), 'compile failed')
+        self.assertEqual(results['b'].status(), build_scheduler.BuildResultStatus.SKIPPED)
+
+
+if __name__ == '__main__':
+    unittest.main()
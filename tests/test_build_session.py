@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyfastogt import build_utils
+from pyfastogt.build_session import SESSION_HOOKS_DIR_NAME, BuildSession
+
+
+def write_file(path: str, data: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read_file(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+class BuildSessionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.dir.name, 'prefix')
+        write_file(os.path.join(self.prefix, 'lib', 'libfoo.so'), 'v1')
+        os.symlink('libfoo.so', os.path.join(self.prefix, 'lib', 'libfoo.so.1'))
+        self.hooks = []
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _session(self, keep_generations=2) -> BuildSession:
+        return BuildSession(self.prefix, hooks={'ldconfig': lambda: self.hooks.append('ldconfig')},
+                            keep_generations=keep_generations)
+
+    def _install(self, session: BuildSession, files: dict):  # as BuildRequest installs staged builds
+        installed_dir = os.path.join(self.dir.name, 'stage')
+        shutil.rmtree(installed_dir, ignore_errors=True)
+        for path, data in files.items():
+            write_file(os.path.join(installed_dir, path), data)
+        shutil.copytree(installed_dir, session.staging_path(), symlinks=True,
+                        copy_function=build_utils.copy_file_replace, dirs_exist_ok=True)
+
+    def test_commit_swaps_prefix(self):
+        with self._session() as session:
+            self._install(session, {'lib/libbar.so': 'bar'})
+            session.defer_hook('ldconfig')
+            session.defer_hook('ldconfig')
+            self.assertFalse(os.path.exists(os.path.join(self.prefix, 'lib', 'libbar.so')))
+            staging_path = session.staging_path()
+
+        self.assertTrue(os.path.islink(self.prefix))
+        self.assertEqual(os.path.realpath(self.prefix), os.path.realpath(staging_path))
+        self.assertEqual(read_file(os.path.join(self.prefix, 'lib', 'libbar.so')), 'bar')
+        self.assertEqual(os.readlink(os.path.join(self.prefix, 'lib', 'libfoo.so.1')), 'libfoo.so')
+        self.assertFalse(os.path.exists(os.path.join(self.prefix, SESSION_HOOKS_DIR_NAME)))
+        self.assertEqual(self.hooks, ['ldconfig'])
+
+    def test_staging_hardlinks_not_written_through(self):
+        self._session().begin()  # stray staging, removed with old generations later
+        with self._session() as session:
+            pass
+        current_lib = os.path.join(os.path.realpath(self.prefix), 'lib', 'libfoo.so')
+
+        session = self._session()
+        session.begin()
+        staged_lib = os.path.join(session.staging_path(), 'lib', 'libfoo.so')
+        self.assertEqual(os.stat(staged_lib).st_ino, os.stat(current_lib).st_ino)
+
+        self._install(session, {'lib/libfoo.so': 'v2'})
+        self.assertEqual(read_file(staged_lib), 'v2')
+        self.assertEqual(read_file(current_lib), 'v1')
+        session.rollback()
+        self.assertEqual(read_file(os.path.join(self.prefix, 'lib', 'libfoo.so')), 'v1')
+
+    def test_rollback_keeps_prefix(self):
+        with self.assertRaises(RuntimeError):
+            with self._session() as session:
+                self._install(session, {'lib/libfoo.so': 'v2'})
+                staging_path = session.staging_path()
+                raise RuntimeError('build failed')
+
+        self.assertFalse(os.path.exists(staging_path))
+        self.assertFalse(os.path.islink(self.prefix))
+        self.assertEqual(read_file(os.path.join(self.prefix, 'lib', 'libfoo.so')), 'v1')
+
+    def test_old_generations_removed(self):
+        session = self._session()
+        for version in ('v2', 'v3', 'v4'):
+            with session:
+                self._install(session, {'lib/libfoo.so': version})
+        # entries which are not generations are left alone
+        write_file(os.path.join(session.generations_path(), 'notes.txt'), 'notes')
+        os.symlink(session.generations_path(), os.path.join(session.generations_path(), 'backup'))
+        with session:
+            self._install(session, {'lib/libfoo.so': 'v5'})
+
+        names = sorted(os.listdir(session.generations_path()))
+        self.assertEqual(len(names), 4)
+        self.assertIn('notes.txt', names)
+        self.assertIn('backup', names)
+        versions = sorted(read_file(os.path.join(session.generations_path(), name, 'lib', 'libfoo.so'))
+                          for name in names if name[0].isdigit())
+        self.assertEqual(versions, ['v4', 'v5'])
+        self.assertEqual(read_file(os.path.join(self.prefix, 'lib', 'libfoo.so')), 'v5')
+
+
+if __name__ == '__main__':
+    unittest.main()
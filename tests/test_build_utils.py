@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from pyfastogt import build_utils
+
+CMAKE_LISTS = '''cmake_minimum_required(VERSION 3.5)
+project(sample NONE)
+install(FILES sample.txt DESTINATION share)
+'''
+PREFIX_PATH = '/opt/sample'
+
+
+class BuildCommandCmakeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.dir.name, 'sample')
+        os.mkdir(self.source_dir)
+        for name, data in (('CMakeLists.txt', CMAKE_LISTS), ('sample.txt', 'sample')):
+            with open(os.path.join(self.source_dir, name), 'w') as f:
+                f.write(data)
+        self.build_dir = os.path.join(self.source_dir, 'build_cmake_release')
+        self.marker_path = os.path.join(self.build_dir, 'marker')  # object of previous build
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _build(self, flags: list, incremental: bool):
+        destdir = os.path.join(self.dir.name, 'stage')
+        build_utils.build_command_cmake(PREFIX_PATH, flags,
+                                        build_system=build_utils.get_supported_build_system_by_name('single_make'),
+                                        destdir=destdir, incremental=incremental, cwd=self.source_dir)
+        installed_path = os.path.join(build_utils.get_destdir_prefix_path(destdir, PREFIX_PATH), 'share', 'sample.txt')
+        with open(installed_path) as f:
+            self.assertEqual(f.read(), 'sample')
+
+    def _build_twice(self, first_flags: list, flags: list, incremental: bool) -> bool:  # build dir is kept
+        self._build(first_flags, True)
+        open(self.marker_path, 'w').close()
+        cache_mtime = os.stat(os.path.join(self.build_dir, 'CMakeCache.txt')).st_mtime_ns
+        self._build(flags, incremental)
+        kept = os.path.exists(self.marker_path)
+        self.assertEqual(os.stat(os.path.join(self.build_dir, 'CMakeCache.txt')).st_mtime_ns == cache_mtime, kept)
+        return kept
+
+    def test_incremental_keeps_build_dir(self):
+        self.assertTrue(self._build_twice(['-DSAMPLE=1'], ['-DSAMPLE=1'], True))
+        fingerprint = build_utils.read_cmake_fingerprint(self.build_dir)
+        self.assertIn('-DSAMPLE=1', fingerprint['cmake_line'])
+        self.assertIn('-DCMAKE_INSTALL_PREFIX=%s' % PREFIX_PATH, fingerprint['cmake_line'])
+        self.assertEqual(fingerprint['build_system'], 'single_make')
+
+    def test_changed_flags_rebuild(self):
+        self.assertFalse(self._build_twice(['-DSAMPLE=1'], ['-DSAMPLE=2'], True))
+        self.assertIn('-DSAMPLE=2', build_utils.read_cmake_fingerprint(self.build_dir)['cmake_line'])
+
+    def test_full_rebuild_without_incremental(self):
+        self.assertFalse(self._build_twice(['-DSAMPLE=1'], ['-DSAMPLE=1'], False))
+        self.assertIsNone(build_utils.read_cmake_fingerprint(self.build_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from pyfastogt.cache_store import CacheStore, CacheStoreError
+
+
+def fill(size: int, data=b'x'):
+    def fill_entry(path: str):
+        with open(os.path.join(path, 'data'), 'wb') as f:
+            f.write(data * size)
+
+    return fill_entry
+
+
+def put_entries(root_path: str, worker: int, count: int):
+    store = CacheStore(root_path, 1024 * 1024)
+    for i in range(count):
+        store.put('{0}-{1}'.format(worker, i), fill(100))
+
+
+class CacheStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = CacheStore(os.path.join(self.dir.name, 'cache'), 300)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _read(self, key: str):
+        data = []
+
+        def read_entry(path: str):
+            with open(os.path.join(path, 'data'), 'rb') as f:
+                data.append(f.read())
+
+        return data[0] if self.store.read(key, read_entry) else None
+
+    def test_least_recently_used_evicted(self):
+        for key in ('a', 'b', 'c'):
+            self.store.put(key, fill(100))
+            time.sleep(0.01)
+        self.assertIsNotNone(self.store.get('a'))  # b is least recently used now
+        time.sleep(0.01)
+        self.store.put('d', fill(100))
+
+        self.assertIsNone(self.store.get('b'))
+        self.assertFalse(os.path.exists(self.store.entry_path('b')))
+        for key in ('a', 'c', 'd'):
+            self.assertEqual(self._read(key), b'x' * 100)
+        self.assertEqual(self.store.size(), 300)
+        stats = self.store.stats()
+        self.assertEqual((stats.stores(), stats.evictions(), stats.misses()), (4, 1, 1))
+
+    def test_put_replaces_entry(self):
+        self.store.put('a', fill(100))
+        self.store.put('a', fill(200, b'y'))
+        self.assertEqual(self._read('a'), b'y' * 200)
+        self.assertEqual(self.store.size(), 200)
+
+    def test_entry_larger_than_cache(self):
+        with self.assertRaises(CacheStoreError):
+            self.store.put('a', fill(301))
+        self.assertIsNone(self.store.get('a'))
+        self.assertEqual(os.listdir(os.path.join(self.store.root_path(), CacheStore.TMP_DIR_NAME)), [])
+
+    def test_entry_not_removed_while_read(self):
+        self.store.put('a', fill(100))
+        clearing = threading.Thread(target=self.store.clear)
+
+        def read_entry(path: str):
+            clearing.start()
+            time.sleep(0.3)
+            # clear waits for file lock held by read
+            self.assertTrue(clearing.is_alive())
+            self.assertTrue(os.path.exists(os.path.join(path, 'data')))
+
+        self.assertTrue(self.store.read('a', read_entry))
+        clearing.join()
+        self.assertFalse(os.path.exists(self.store.entry_path('a')))
+
+    def test_processes_share_index(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=put_entries, args=(self.store.root_path(), i, 10)) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        store = CacheStore(self.store.root_path(), 1024 * 1024)
+        self.assertEqual(store.stats().stores(), 40)
+        self.assertEqual(store.size(), 40 * 100)
+        for worker in range(4):
+            for i in range(10):
+                self.assertIsNotNone(store.get('{0}-{1}'.format(worker, i)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from pyfastogt import download
+
+DATA = os.urandom(3 * 1024 * 1024 + 123)
+ETAG = '"test"'
+LAST_MODIFIED = 'Tue, 15 Nov 1994 08:12:31 GMT'
+
+
+def is_if_range_valid(if_range: str, etag: str, last_modified) -> bool:  # strong comparison of RFC 9110
+    if if_range.startswith(('"', 'W/')):
+        return not if_range.startswith('W/') and if_range == etag
+    return if_range == last_modified
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            broken = server.broken > 0
+            if broken:
+                server.broken -= 1
+            if_range = self.headers.get('If-Range')
+            if if_range:
+                server.if_ranges.append(if_range)
+
+        start, end = 0, len(DATA) - 1
+        ranged = self.headers.get('Range')
+        if ranged and if_range and not is_if_range_valid(if_range, server.etag, server.last_modified):
+            ranged = None  # whole file is sent instead
+        if ranged:
+            first, _, last = ranged[len('bytes='):].partition('-')
+            start = int(first)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, end, len(DATA)))
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', server.etag)
+        if server.last_modified:
+            self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if broken:  # half of body, then connection is dropped
+            self.wfile.write(DATA[start:start + (end - start + 1) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(DATA[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.broken = 0
+        self.server.etag = ETAG
+        self.server.last_modified = None
+        self.server.if_ranges = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}/file.bin'.format(self.server.server_address[1])
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def _downloader(self, segments=4) -> download.Downloader:
+        return download.Downloader(segments=segments, retries=3, backoff=0, timeout=5,
+                                   min_segment_size=256 * 1024, progress=False)
+
+    def _read(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_segments(self):
+        path = self._downloader().download(self.url, os.path.join(self.dir, 'file.bin'))
+        self.assertEqual(self._read(path), DATA)
+        self.assertFalse(os.path.exists(path + download.STATE_FILE_SUFFIX))
+        self.assertEqual(self.server.requests, 5)  # probe + 4 segments
+
+    def test_segment_broken_in_the_middle(self):
+        self.server.broken = 2
+        path = self._downloader().download(self.url, os.path.join(self.dir, 'file.bin'))
+        self.assertEqual(self._read(path), DATA)
+
+    def test_stream_continues_broken_body(self):
+        self.server.broken = 1
+        with self._downloader().open_stream(self.url) as stream:
+            data = b''.join(iter(lambda: stream.read(64 * 1024), b''))
+        self.assertEqual(data, DATA)
+
+    def test_weak_etag_not_used_for_if_range(self):
+        self.server.etag = 'W/"test"'
+        path = self._downloader().download(self.url, os.path.join(self.dir, 'file.bin'))
+        self.assertEqual(self._read(path), DATA)
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(self.server.if_ranges, [])
+
+        self.server.requests = 0
+        self.server.last_modified = LAST_MODIFIED
+        path = self._downloader().download(self.url, os.path.join(self.dir, 'file2.bin'))
+        self.assertEqual(self._read(path), DATA)
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(self.server.if_ranges, [LAST_MODIFIED] * 4)
+
+    def test_stream_continues_with_weak_etag(self):
+        self.server.etag = 'W/"test"'
+        self.server.last_modified = LAST_MODIFIED
+        self.server.broken = 1
+        with self._downloader().open_stream(self.url) as stream:
+            data = b''.join(iter(lambda: stream.read(64 * 1024), b''))
+        self.assertEqual(data, DATA)
+        self.assertEqual(self.server.if_ranges, [LAST_MODIFIED])
+
+    def test_pool_close_closes_connections_of_all_threads(self):
+        pool = download.ConnectionPool(timeout=5)
+
+        def fetch(_):
+            response = pool.request('GET', self.url, {'Range': 'bytes=0-9'})
+            response.read()
+            return pool.local_.conns[('http', urlsplit(self.url).netloc)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            conns = set(executor.map(fetch, range(4)))
+        self.assertTrue(all(conn.sock for conn in conns))
+        pool.close()
+        self.assertTrue(all(conn.sock is None for conn in conns))
+
+        response = pool.request('GET', self.url, {'Range': 'bytes=0-9'})  # new connection after close
+        self.assertEqual(response.read(), DATA[:10])
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from pyfastogt import download
+from pyfastogt.download_cache import DownloadCache
+
+DATA = b'archive' * 1000
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+class DownloadCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = DownloadCache(os.path.join(self.dir.name, 'cache'))
+        self.downloads_path = os.path.join(self.dir.name, 'downloads')  # url per line, shared by processes
+        patch = mock.patch.object(download, 'download', self._download)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _download(self, url: str, file_path: str) -> str:
+        with open(self.downloads_path, 'a') as f:
+            f.write(url + '\n')
+        time.sleep(0.2)
+        with open(file_path, 'wb') as f:
+            f.write(DATA)
+        return file_path
+
+    def _downloads(self) -> list:
+        if not os.path.exists(self.downloads_path):
+            return []
+        with open(self.downloads_path) as f:
+            return f.read().splitlines()
+
+    def _fetch(self, name: str, sha256=SHA256, url='http://example.com/archive.tar.gz') -> str:
+        path = self.cache.fetch(url, os.path.join(self.dir.name, name), sha256)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        return path
+
+    def test_hit_without_download(self):
+        first = self._fetch('first.tar.gz')
+        second = self._fetch('second.tar.gz')
+        self.assertEqual(len(self._downloads()), 1)
+        self.assertEqual(os.stat(first).st_ino, os.stat(second).st_ino)  # both share cached file
+        self.assertEqual(self.cache.sha256('http://example.com/archive.tar.gz', SHA256), SHA256)
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits(), stats.misses(), stats.stores()), (2, 1, 1))
+
+    def test_hash_is_part_of_key(self):
+        self._fetch('first.tar.gz')
+        self._fetch('second.tar.gz', sha256=None)
+        self.assertEqual(len(self._downloads()), 2)
+        # hash of file cached without expected one is computed
+        self.assertEqual(self.cache.sha256('http://example.com/archive.tar.gz'), SHA256)
+
+    def test_checksum_mismatch_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(download.DownloadError):
+                self.cache.fetch('http://example.com/archive.tar.gz', os.path.join(self.dir.name, 'bad.tar.gz'),
+                                 '0' * 64)
+        self.assertEqual(len(self._downloads()), 2)
+        self.assertIsNone(self.cache.sha256('http://example.com/archive.tar.gz', '0' * 64))
+        self.assertEqual(self.cache.store().size(), 0)
+
+    def test_processes_wait_for_first_download(self):
+        context = multiprocessing.get_context('fork')
+        fetches = [context.Process(target=self._fetch, args=('file%d.tar.gz' % i,)) for i in range(4)]
+        for process in fetches:
+            process.start()
+        for process in fetches:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(len(self._downloads()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
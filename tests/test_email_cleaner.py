@@ -0,0 +1,107 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pyfastogt import disposable_domains, email_cleaner
+
+EMAILS = ['User@Example.com', ' user@example.com ', '<other@example.org>', 'admin@example.com', 'not an email',
+          'someone@tempmail.com', '', 'other@example.org']
+EXPECTED = {'user@example.com': email_cleaner.STATUS_VALID, 'other@example.org': email_cleaner.STATUS_VALID,
+            'admin@example.com': email_cleaner.STATUS_ROLE, 'not an email': email_cleaner.STATUS_INVALID,
+            'someone@tempmail.com': email_cleaner.STATUS_DISPOSABLE}
+
+
+class EmailCleanerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.input_path = self._write('emails.txt', EMAILS * 3)
+        self.output_dir = os.path.join(self.dir.name, 'out')
+        self.index_path = os.path.join(self.dir.name, 'domains.idx')
+        disposable_domains.build_index(self._write('domains.txt', ['tempmail.com']), self.index_path)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _write(self, name: str, lines: list) -> str:
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def _clean(self, **kwargs) -> email_cleaner.CleanStats:
+        return email_cleaner.clean_email_list(self.input_path, self.output_dir, jobs=2,
+                                              disposable_index=self.index_path, **kwargs)
+
+    def test_partition_flushes_buffers(self):
+        partitions_dir = os.path.join(self.dir.name, 'partitions')
+        os.mkdir(partitions_dir)
+        flushes = []
+        flush_partitions = email_cleaner._flush_partitions
+
+        def record_flush(path, buffers):
+            flushes.append(sum(len(buffer) for buffer in buffers))
+            flush_partitions(path, buffers)
+
+        lines = ['user{0}@example.com'.format(i) for i in range(1000)]
+        with mock.patch.object(email_cleaner, '_flush_partitions', record_flush):
+            total = email_cleaner._partition(self._write('many.txt', lines + lines), partitions_dir, 4, False,
+                                             buffer_size=1)
+        self.assertEqual(total, 2000)
+        self.assertGreater(len(flushes), 1)
+        names = sorted(os.listdir(partitions_dir))
+        self.assertEqual(names, ['0.txt', '1.txt', '2.txt', '3.txt'])
+        partitioned = []
+        for name in names:
+            with open(os.path.join(partitions_dir, name)) as f:
+                emails = f.read().splitlines()
+            # both copies of address are in the same partition
+            self.assertTrue(all(emails.count(email) == 2 for email in emails))
+            partitioned.extend(emails)
+        self.assertEqual(sorted(partitioned), sorted(lines + lines))
+
+    def test_csv_chunks(self):
+        stats = self._clean(partition_size=16)
+        self.assertGreater(len(stats.output_files()), 1)
+        expected_files = [os.path.join(self.output_dir, email_cleaner.OUTPUT_FILE_TEMPLATE.format(i)) for i in
+                          range(len(stats.output_files()))]
+        self.assertEqual(stats.output_files(), expected_files)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), [os.path.basename(path) for path in stats.output_files()])
+
+        rows = []
+        for path in stats.output_files():
+            with open(path, newline='') as f:
+                rows.extend(tuple(row) for row in csv.reader(f))
+        self.assertEqual(sorted(rows), sorted(EXPECTED.items()))
+        self.assertEqual(stats.total(), 21)  # empty lines are skipped
+        self.assertEqual(stats.unique(), len(EXPECTED))
+        self.assertEqual(stats.counts(), {email_cleaner.STATUS_VALID: 2, email_cleaner.STATUS_INVALID: 1,
+                                          email_cleaner.STATUS_ROLE: 1, email_cleaner.STATUS_NO_MX: 0,
+                                          email_cleaner.STATUS_DISPOSABLE: 1})
+
+    def test_split_statuses(self):
+        stats = self._clean(partition_size=16, split_statuses=True)
+        found = {}
+        for path in stats.output_files():
+            status = os.path.basename(path)[len('part-00000-'):-len('.csv')]
+            with open(path) as f:
+                emails = f.read().splitlines()
+            self.assertTrue(emails)  # no files of statuses without addresses
+            for email in emails:
+                found[email] = status
+        self.assertEqual(found, EXPECTED)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), sorted(os.path.basename(path)
+                                                                     for path in stats.output_files()))
+
+    def test_missing_disposable_index_warns(self):
+        with self.assertLogs(level='WARNING'):
+            stats = email_cleaner.clean_email_list(self.input_path, self.output_dir, jobs=1)
+        self.assertEqual(stats.counts()[email_cleaner.STATUS_DISPOSABLE], 0)
+        with self.assertRaises(email_cleaner.EmailCleanerError):
+            email_cleaner.clean_email_list(self.input_path, self.output_dir,
+                                           disposable_index=os.path.join(self.dir.name, 'missing.idx'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pyfastogt import disposable_domains, email_validation
+
+DISPOSABLE_DOMAINS = {'tempmail.com'}
+BROKEN_DOMAINS = {'broken.com'}  # service answers 500
+
+
+class DisposableHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        domain = self.path.rsplit('/', 1)[-1]
+        with self.server.lock:
+            self.server.requests[domain] = self.server.requests.get(domain, 0) + 1
+        if domain in BROKEN_DOMAINS:
+            status, body = 500, b'{}'
+        else:
+            status, body = 200, json.dumps({'disposable': domain in DISPOSABLE_DOMAINS}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Resolver(object):  # MX lookup stub, counts lookups and concurrent ones
+    def __init__(self, delay=0.0):
+        self.delay_ = delay
+        self.lock_ = threading.Lock()
+        self.lookups_ = {}
+        self.running_ = 0
+        self.max_running_ = 0
+
+    def __call__(self, domain: str) -> bool:
+        with self.lock_:
+            self.lookups_[domain] = self.lookups_.get(domain, 0) + 1
+            self.running_ += 1
+            self.max_running_ = max(self.max_running_, self.running_)
+        time.sleep(self.delay_)
+        with self.lock_:
+            self.running_ -= 1
+        return domain != 'nomx.com'
+
+
+class EmailValidatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), DisposableHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = {}
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}/v1/disposable/'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _validate(self, emails: list, resolver, **kwargs) -> list:
+        return email_validation.validate_emails(emails, resolver=resolver, disposable_url=self.url, **kwargs)
+
+    def test_one_lookup_per_domain(self):
+        domains = ['example.com', 'example.org', 'tempmail.com', 'nomx.com']
+        emails = ['user{0}@{1}'.format(i, domain) for i in range(50) for domain in domains]
+        resolver = Resolver(0.01)
+        result = self._validate(emails, resolver)
+
+        expected = {'example.com': True, 'example.org': True, 'tempmail.com': False, 'nomx.com': False}
+        self.assertEqual(result, [expected[email.rpartition('@')[2]] for email in emails])
+        self.assertEqual(resolver.lookups_, {domain: 1 for domain in domains})
+        # no disposable check of domain without MX
+        self.assertEqual(self.server.requests, {'example.com': 1, 'example.org': 1, 'tempmail.com': 1})
+
+    def test_failed_lookup_cached_for_error_ttl(self):
+        validator = email_validation.EmailValidator(resolver=Resolver(), disposable_url=self.url, error_ttl=0.5)
+        try:
+            emails = ['a@broken.com', 'b@broken.com']
+            self.assertEqual(asyncio.run(validator.validate_batch(emails)), [False, False])
+            self.assertEqual(asyncio.run(validator.validate_batch(emails)), [False, False])
+            self.assertEqual(self.server.requests, {'broken.com': 1})
+
+            time.sleep(0.6)
+            self.assertEqual(asyncio.run(validator.validate_batch(emails)), [False, False])
+            self.assertEqual(self.server.requests, {'broken.com': 2})
+        finally:
+            validator.close()
+
+    def test_empty_offline_index_stays_offline(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            text_path = os.path.join(tmp_dir, 'domains.txt')
+            index_path = os.path.join(tmp_dir, 'domains.idx')
+            open(text_path, 'w').close()
+            disposable_domains.build_index(text_path, index_path)
+            with disposable_domains.DisposableDomains(index_path) as index:
+                result = self._validate(['user@tempmail.com'], Resolver(), disposable_domains=index)
+        self.assertEqual(result, [True])
+        self.assertEqual(self.server.requests, {})
+
+    def test_concurrency_limit(self):
+        emails = ['user@domain{0}.com'.format(i) for i in range(40)]
+        resolver = Resolver(0.02)
+        result = self._validate(emails, resolver, concurrency=4)
+        self.assertEqual(result, [True] * len(emails))
+        self.assertEqual(resolver.max_running_, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from pyfastogt import git_mirror, utils
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com', GIT_COMMITTER_NAME='test',
+               GIT_COMMITTER_EMAIL='test@example.com', GIT_CONFIG_NOSYSTEM='1', GIT_CONFIG_COUNT='1',
+               GIT_CONFIG_KEY_0='protocol.file.allow', GIT_CONFIG_VALUE_0='always')
+
+
+def git(args: list, cwd: str) -> str:
+    return subprocess.check_output(['git'] + args, cwd=cwd, env=GIT_ENV, stderr=subprocess.DEVNULL).decode('utf-8')
+
+
+def write_file(path: str, data: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def list_tree(root: str) -> dict:  # relative path -> content of files, .git skipped
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [name for name in dir_names if name != '.git']
+        for name in file_names:
+            if name == '.git':  # gitfile of submodule checkout
+                continue
+            path = os.path.join(dir_path, name)
+            with open(path) as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+class GitMirrorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.repos = os.path.join(self.dir.name, 'repos')
+        self.work = os.path.join(self.dir.name, 'work')
+        os.makedirs(self.work)
+        self.sub_url = self._make_repo('sub', {'sub.txt': 'sub\n'})
+        self.url = self._make_repo('main', {'README': 'main\n', 'src/main.c': 'int main;\n',
+                                            'docs/index.txt': 'docs\n', 'ignored.txt': 'ignored\n',
+                                            'version.txt': '$Format:%H$\n',
+                                            '.gitattributes': 'ignored.txt export-ignore\nversion.txt export-subst\n'})
+        main_dir = os.path.join(self.repos, 'main')
+        git(['submodule', 'add', '../sub', 'src/sub'], main_dir)
+        git(['commit', '-q', '-m', 'add submodule'], main_dir)
+        self.mirror = git_mirror.GitMirrorCache(os.path.join(self.dir.name, 'mirror'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _make_repo(self, name: str, files: dict) -> str:
+        repo_dir = os.path.join(self.repos, name)
+        os.makedirs(repo_dir)
+        git(['init', '-q', '-b', 'master'], repo_dir)
+        for path, data in files.items():
+            write_file(os.path.join(repo_dir, path), data)
+        git(['add', '-A'], repo_dir)
+        git(['commit', '-q', '-m', 'init'], repo_dir)
+        return 'file://' + repo_dir
+
+    def _checkout(self) -> str:  # reference tree, plain clone of upstream
+        dest_dir = os.path.join(self.dir.name, 'checkout')
+        git(['clone', '-q', '--recursive', self.url, dest_dir], self.dir.name)
+        return dest_dir
+
+    def test_mirror_reused(self):
+        mirror_path = self.mirror.update(self.url, GIT_ENV)
+        main_dir = os.path.join(self.repos, 'main')
+        write_file(os.path.join(main_dir, 'new.txt'), 'new\n')
+        git(['add', '-A'], main_dir)
+        git(['commit', '-q', '-m', 'new'], main_dir)
+        inode = os.stat(os.path.join(mirror_path, 'objects')).st_ino
+
+        self.assertEqual(self.mirror.update(self.url, GIT_ENV), mirror_path)
+        # same mirror is fetched into, not cloned again
+        self.assertEqual(os.stat(os.path.join(mirror_path, 'objects')).st_ino, inode)
+        self.assertEqual(git(['rev-parse', 'HEAD'], mirror_path), git(['rev-parse', 'HEAD'], main_dir))
+        self.assertEqual(sorted(name for name in os.listdir(self.mirror.path()) if name.endswith('.git')),
+                         sorted([os.path.basename(mirror_path)]))
+
+    def test_clone_keeps_git(self):
+        dest_dir = utils.git_clone(self.url, remove_dot_git=False, cwd=self.work, env=GIT_ENV, mirror=self.mirror)
+        self.assertTrue(os.path.isdir(os.path.join(dest_dir, '.git')))
+        self.assertEqual(list_tree(dest_dir), list_tree(self._checkout()))
+        # origin is upstream, not local mirror
+        self.assertEqual(git(['remote', 'get-url', 'origin'], dest_dir).strip(), self.url)
+        self.assertEqual(git(['remote', 'get-url', 'origin'], os.path.join(dest_dir, 'src', 'sub')).strip(),
+                         self.sub_url)
+
+    def test_export_matches_checkout(self):
+        dest_dir = utils.git_clone(self.url, cwd=self.work, env=GIT_ENV, mirror=self.mirror)
+        self.assertFalse(os.path.exists(os.path.join(dest_dir, '.git')))
+        self.assertFalse(os.path.exists(os.path.join(dest_dir, 'src', 'sub', '.git')))
+        # export-ignore and export-subst of git archive are not applied
+        self.assertEqual(list_tree(dest_dir), list_tree(self._checkout()))
+
+    def test_sparse_paths(self):
+        for remove_dot_git in (True, False):
+            work_dir = os.path.join(self.work, str(remove_dot_git))
+            os.makedirs(work_dir)
+            dest_dir = utils.git_clone(self.url, remove_dot_git=remove_dot_git, cwd=work_dir, env=GIT_ENV,
+                                       mirror=self.mirror, paths=['docs'])
+            files = set(list_tree(dest_dir)) - {'.gitmodules'}
+            self.assertEqual(files, {os.path.join('docs', 'index.txt')})
+
+    def test_sparse_paths_with_submodule(self):
+        for remove_dot_git in (True, False):
+            work_dir = os.path.join(self.work, str(remove_dot_git))
+            os.makedirs(work_dir)
+            dest_dir = utils.git_clone(self.url, remove_dot_git=remove_dot_git, cwd=work_dir, env=GIT_ENV,
+                                       mirror=self.mirror, paths=['src'])
+            files = set(list_tree(dest_dir)) - {'.gitmodules'}
+            self.assertEqual(files, {os.path.join('src', 'main.c'), os.path.join('src', 'sub', 'sub.txt')})
+
+
+if __name__ == '__main__':
+    unittest.main()
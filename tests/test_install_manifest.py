@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyfastogt.install_manifest import InstallManifest
+
+
+def write_file(path: str, data: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read_file(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def install_owner(prefix_path: str, installed_dir: str, owner: str):
+    InstallManifest(prefix_path).install(installed_dir, owner)
+
+
+class InstallManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.dir.name, 'prefix')
+        self.manifest = InstallManifest(self.prefix)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _stage(self, name: str, files: dict, links=None) -> str:  # links: path -> symlink target
+        installed_dir = os.path.join(self.dir.name, 'stage', name)
+        shutil.rmtree(installed_dir, ignore_errors=True)
+        os.makedirs(installed_dir)
+        for path, data in files.items():
+            write_file(os.path.join(installed_dir, path), data)
+        for path, target in (links or {}).items():
+            os.symlink(target, os.path.join(installed_dir, path))
+        return installed_dir
+
+    def _prefix_file(self, rel_path: str) -> str:
+        return os.path.join(self.prefix, rel_path)
+
+    def test_only_changed_files_copied(self):
+        files = {'include/foo.h': 'v1', 'lib/libfoo.a': 'v1', 'lib/libfoo.so.1': 'v1'}
+        result = self.manifest.install(self._stage('foo', files, {'lib/libfoo.so': 'libfoo.so.1'}), 'foo')
+        self.assertEqual(sorted(result.copied()), ['include/foo.h', 'lib/libfoo.a', 'lib/libfoo.so', 'lib/libfoo.so.1'])
+        self.assertTrue(result.shared_libraries_changed())
+        header_stat = os.stat(self._prefix_file('include/foo.h'))
+
+        files['lib/libfoo.a'] = 'v2'
+        result = self.manifest.install(self._stage('foo', files, {'lib/libfoo.so': 'libfoo.so.1'}), 'foo')
+        self.assertEqual(result.copied(), ['lib/libfoo.a'])
+        self.assertEqual(sorted(result.unchanged()), ['include/foo.h', 'lib/libfoo.so', 'lib/libfoo.so.1'])
+        self.assertFalse(result.shared_libraries_changed())
+        self.assertEqual(read_file(self._prefix_file('lib/libfoo.a')), 'v2')
+        self.assertEqual(os.readlink(self._prefix_file('lib/libfoo.so')), 'libfoo.so.1')
+        # unchanged file is not rewritten
+        new_stat = os.stat(self._prefix_file('include/foo.h'))
+        self.assertEqual((new_stat.st_ino, new_stat.st_mtime_ns), (header_stat.st_ino, header_stat.st_mtime_ns))
+
+    def test_missing_files_removed(self):
+        self.manifest.install(self._stage('foo', {'include/foo.h': 'v1', 'include/old.h': 'v1'}), 'foo')
+        result = self.manifest.install(self._stage('foo', {'include/foo.h': 'v1'}), 'foo')
+        self.assertEqual(result.removed(), ['include/old.h'])
+        self.assertFalse(os.path.exists(self._prefix_file('include/old.h')))
+        self.assertEqual(InstallManifest(self.prefix).files('foo'), self.manifest.files('foo'))
+
+    def test_file_of_other_owner_kept(self):
+        self.manifest.install(self._stage('foo', {'include/common.h': 'foo'}), 'foo')
+        self.manifest.install(self._stage('bar', {'include/common.h': 'bar'}), 'bar')
+        result = self.manifest.install(self._stage('foo', {}), 'foo')
+        self.assertEqual(result.removed(), [])
+        self.assertEqual(read_file(self._prefix_file('include/common.h')), 'bar')
+        self.assertEqual(self.manifest.owner_of('include/common.h'), 'bar')
+
+    def test_replaced_file_not_written_through(self):
+        installed_dir = self._stage('foo', {'lib/libfoo.a': 'v1'})
+        self.manifest.install(installed_dir, 'foo', hardlink=True)
+        staged_path = os.path.join(installed_dir, 'lib', 'libfoo.a')
+        self.assertEqual(os.stat(self._prefix_file('lib/libfoo.a')).st_ino, os.stat(staged_path).st_ino)
+
+        self.manifest.install(self._stage('foo2', {'lib/libfoo.a': 'v2'}), 'foo')
+        self.assertEqual(read_file(self._prefix_file('lib/libfoo.a')), 'v2')
+        self.assertEqual(read_file(staged_path), 'v1')
+
+    def test_parallel_installs(self):
+        context = multiprocessing.get_context('fork')
+        installs = [context.Process(target=install_owner, args=(
+            self.prefix, self._stage('target%d' % i, {'lib/lib%d.a' % i: str(i)}), 'target%d' % i)) for i in range(8)]
+        for process in installs:
+            process.start()
+        for process in installs:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        manifest = InstallManifest(self.prefix)
+        self.assertEqual(manifest.owners(), ['target%d' % i for i in range(8)])
+        for i in range(8):
+            self.assertEqual(read_file(self._prefix_file('lib/lib%d.a' % i)), str(i))
+
+
+if __name__ == '__main__':
+    unittest.main()
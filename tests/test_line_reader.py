@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from pyfastogt import line_reader, utils
+
+LINES = ['first', '  padded  ', 'crlf', '', 'юникод строка', 'last']
+
+
+class LineReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'lines.txt')
+        with open(self.path, 'wb') as f:  # last line without new line
+            f.write('first\n  padded  \ncrlf\r\n\nюникод строка\nlast'.encode('utf-8'))
+        self.expected = [line.strip() for line in LINES]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_lines_across_blocks(self):
+        for use_mmap in (True, False):
+            for block_size in (1, 3, 7, 4096):  # lines and multibyte characters split between blocks
+                with self.subTest(use_mmap=use_mmap, block_size=block_size):
+                    lines = list(line_reader.iter_lines(self.path, use_mmap=use_mmap, block_size=block_size))
+                    self.assertEqual(lines, self.expected)
+
+    def test_batches(self):
+        batches = list(line_reader.iter_batches(self.path, batch_size=4, block_size=5))
+        self.assertEqual([len(batch) for batch in batches], [4, 2])
+        self.assertEqual(sum(batches, []), self.expected)
+        self.assertEqual(list(utils.read_file_line_by_line(self.path, batch_size=4)), batches)
+
+    def test_progress(self):
+        reports = []
+        list(line_reader.iter_line_blocks(self.path, block_size=8, progress=lambda read, total: reports.append(
+            (read, total))))
+        size = os.path.getsize(self.path)
+        self.assertEqual(reports[-1], (size, size))
+        self.assertEqual([read for read, _ in reports], sorted(read for read, _ in reports))
+
+    def test_empty_and_missing_file(self):
+        empty_path = os.path.join(self.dir.name, 'empty.txt')
+        open(empty_path, 'w').close()
+        self.assertEqual(list(line_reader.iter_lines(empty_path)), [])
+        with self.assertRaises(line_reader.LineReaderError):
+            list(line_reader.iter_lines(os.path.join(self.dir.name, 'missing.txt')))
+        with self.assertRaises(utils.CommonError):
+            utils.read_file_line_by_line_to_list(os.path.join(self.dir.name, 'missing.txt'))
+
+    def test_hash_set(self):
+        lines = ['user{0}@example.com'.format(i % 500) for i in range(2000)]
+        hash_set = line_reader.HashSet(lines, chunk_size=64)  # merged from many sorted chunks
+        self.assertEqual(len(hash_set), 500)
+        self.assertEqual(list(hash_set.hashes()), sorted(set(hash_set.hashes())))
+        self.assertIn('user499@example.com', hash_set)
+        self.assertNotIn('user500@example.com', hash_set)
+        self.assertEqual(list(hash_set.contains_batch(['user1@example.com', 'other@example.com'])), [True, False])
+
+        compact = utils.read_file_line_by_line_to_set(self.path, compact=True)
+        self.assertEqual(len(compact), len(set(self.expected)))
+        self.assertEqual(utils.read_file_line_by_line_to_set(self.path), set(self.expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
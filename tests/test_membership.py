@@ -0,0 +1,51 @@
+import random
+import unittest
+from array import array
+
+from pyfastogt import membership, utils
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class MembershipTestCase(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(7)
+        self.values = sorted(generator.sample(range(1000000), 5000))
+        self.needles = [generator.randrange(1000000) for _ in range(3000)] + self.values[:100] + [-1, 10 ** 7]
+        self.expected = [needle in set(self.values) for needle in self.needles]
+
+    def _sequences(self) -> list:
+        sequences = [self.values, array('q', self.values)]
+        if numpy:
+            sequences.append(numpy.array(self.values, dtype=numpy.int64))
+        return sequences
+
+    def test_contains(self):
+        for values in self._sequences():
+            with self.subTest(kind=type(values).__name__):
+                self.assertEqual([membership.contains(values, needle) for needle in self.needles], self.expected)
+                self.assertTrue(membership.contains(values, self.values[0]))
+                self.assertTrue(membership.contains(values, self.values[-1]))
+        self.assertFalse(membership.contains([], 1))
+
+    def test_binary_search_number(self):
+        self.assertEqual([utils.binary_search_number(needle, self.values) for needle in self.needles], self.expected)
+        self.assertEqual([utils.binary_search_impl(needle, self.values, 0, len(self.values) - 1)
+                          for needle in self.needles], self.expected)
+
+    def test_contains_batch(self):
+        for values in self._sequences():
+            for use_numpy in (True, False):
+                with self.subTest(kind=type(values).__name__, use_numpy=use_numpy):
+                    mask = membership.contains_batch(values, array('q', self.needles), use_numpy=use_numpy)
+                    self.assertEqual([bool(found) for found in mask], self.expected)
+        self.assertEqual([bool(found) for found in utils.binary_search_numbers(self.needles, self.values)],
+                         self.expected)
+        self.assertEqual(list(membership.contains_batch([], [1, 2])), [False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
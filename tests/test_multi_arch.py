@@ -0,0 +1,54 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pyfastogt import multi_arch
+from pyfastogt.build_utils import BuildRequest
+
+ARCHS = ['x86_64', 'i386']
+
+
+class MultiArchBuildTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _record(self, *args):
+        with self.lock:
+            self.calls.append(args)
+
+    def _build(self, names: list) -> dict:
+        request = multi_arch.MultiArchBuildRequest('linux', ARCHS, os.path.join(self.dir.name, 'build'),
+                                                   os.path.join(self.dir.name, 'prefix', '{arch}'))
+        test = self
+
+        def build_openssl(self, version, have_shared=False):
+            test._record(self.platform().architecture().name(), 'openssl', version)
+
+        def build_snappy(self):
+            test._record(self.platform().architecture().name(), 'snappy')
+
+        with mock.patch.object(BuildRequest, 'build_openssl', build_openssl), \
+                mock.patch.object(BuildRequest, 'build_snappy', build_snappy):
+            return request.build(names)
+
+    def test_versioned_targets_for_every_arch(self):
+        results = self._build(['openssl=3.0.13', 'snappy'])
+        self.assertTrue(all(result.is_success() for result in results.values()))
+        self.assertEqual(sorted(self.calls), sorted([(arch, 'openssl', '3.0.13') for arch in ARCHS] +
+                                                    [(arch, 'snappy') for arch in ARCHS]))
+
+    def test_missing_version_fails_arch_builds(self):
+        results = self._build(['openssl'])
+        self.assertEqual(sorted(results.keys()), sorted(ARCHS))
+        self.assertFalse(any(result.is_success() for result in results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
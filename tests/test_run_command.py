@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from pyfastogt import run_command
+from pyfastogt.run_command import Command, CommandRunner, MessageType, Policy
+
+
+def python_command(code: str) -> list:
+    return [sys.executable, '-c', code]
+
+
+class RecordPolicy(Policy):  # output lines and status messages of command
+    def __init__(self):
+        Policy.__init__(self)
+        self.lines_ = []
+        self.statuses_ = []
+
+    def process(self, message):
+        if message.type() == MessageType.MESSAGE:
+            self.lines_.append(message.message())
+        else:
+            self.statuses_.append(message.message())
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+SLEEP_CODE = 'import os, time; print(os.getpid(), flush=True); time.sleep(30)'
+
+
+class CommandRunnerTestCase(unittest.TestCase):
+    def test_output_and_exit_codes(self):
+        stdout_policy, stderr_policy = RecordPolicy(), RecordPolicy()
+        commands = [Command(python_command('import sys; print("a"); print("b", file=sys.stderr); print("c")'),
+                            stdout_policy, stderr_policy),
+                    Command(python_command('import sys; sys.exit(3)'))]
+        results = run_command.run_commands(commands)
+        self.assertEqual([result.returncode() for result in results], [0, 3])
+        self.assertEqual([result.succeeded() for result in results], [True, False])
+        self.assertEqual(stdout_policy.lines_, ['a', 'c'])
+        self.assertEqual(stderr_policy.lines_, ['b'])
+        self.assertIn('finished successfully', stdout_policy.statuses_[-1])
+
+    def test_timeout_terminates_process(self):
+        policy = RecordPolicy()
+        start = time.monotonic()
+        result = run_command.run_commands([Command(python_command(SLEEP_CODE), policy, timeout=0.5)])[0]
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(result.timed_out())
+        self.assertFalse(result.succeeded())
+        self.assertLess(result.returncode(), 0)  # terminated by signal
+        self.assertFalse(is_running(int(policy.lines_[0])))
+        self.assertIn('timed out', policy.statuses_[-1])
+
+    def test_cancel_terminates_process(self):
+        policy = RecordPolicy()
+        runner = CommandRunner(1)
+
+        async def run():
+            running = runner.start(Command(python_command(SLEEP_CODE), policy))
+            waiting = runner.start(Command(python_command('print("never")')))
+            while not policy.lines_:
+                await asyncio.sleep(0.05)
+            running.cancel()
+            waiting.cancel()
+            return await asyncio.gather(running, waiting, return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+        self.assertFalse(is_running(int(policy.lines_[0])))
+        self.assertIn('cancelled', policy.statuses_[-1])
+
+    def test_cancelled_commands_of_run(self):
+        runner = CommandRunner(1)
+        commands = [Command(python_command(SLEEP_CODE)), Command(python_command('print("never")'))]
+
+        async def run():
+            task = asyncio.ensure_future(runner.run(commands))
+            await asyncio.sleep(0.5)
+            for pending in asyncio.all_tasks():
+                if pending is not task and pending is not asyncio.current_task():
+                    pending.cancel()
+            return await task
+
+        results = asyncio.run(run())
+        self.assertEqual([result.cancelled() for result in results], [True, True])
+
+    def test_overlong_lines_in_chunks(self):
+        policy = RecordPolicy()
+        with mock.patch.object(run_command, 'STREAM_LINE_LIMIT', 16):
+            code = 'import sys; sys.stdout.write("x" * 40 + "\\nshort\\n" + "y" * 10)'
+            result = run_command.run_commands([Command(python_command(code), policy)])[0]
+        self.assertTrue(result.succeeded())
+        self.assertEqual(''.join(policy.lines_[:-2]), 'x' * 40)
+        self.assertTrue(all(len(line) <= 16 for line in policy.lines_))
+        self.assertEqual(policy.lines_[-2:], ['short', 'y' * 10])
+
+    def test_runner_reused_by_other_loop(self):
+        runner = CommandRunner(1)
+        commands = [Command(python_command('print(1)')), Command(python_command('print(2)'))]
+        for _ in range(2):  # semaphore of first loop must not be used by second one
+            results = asyncio.run(runner.run(commands))
+            self.assertEqual([result.returncode() for result in results], [0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
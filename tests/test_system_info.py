@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pyfastogt import system_info
+
+GIB = 1024 * 1024 * 1024
+
+
+class CgroupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.dir.name, 'cgroup')
+        self.proc_cgroup = os.path.join(self.dir.name, 'proc_cgroup')
+        self.meminfo = os.path.join(self.dir.name, 'meminfo')
+        self._write(self.meminfo, 'MemTotal: 16777216 kB\nMemAvailable: 8388608 kB\n')
+        patches = [mock.patch.object(system_info, 'CGROUP_ROOT_PATH', self.root),
+                   mock.patch.object(system_info, 'PROC_SELF_CGROUP_PATH', self.proc_cgroup),
+                   mock.patch.object(system_info, 'PROC_MEMINFO_PATH', self.meminfo),
+                   mock.patch.object(os, 'sched_getaffinity', lambda pid: set(range(8)), create=True)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    @staticmethod
+    def _write(path: str, data: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def test_no_cgroup(self):
+        self.assertIsNone(system_info.get_cgroup_cpu_limit())
+        self.assertIsNone(system_info.get_cgroup_memory_available())
+        self.assertEqual(system_info.get_usable_cpu_count(), 8)
+        self.assertEqual(system_info.get_available_memory(), 8 * GIB)
+
+    def test_affinity(self):
+        with mock.patch.object(os, 'sched_getaffinity', lambda pid: {0, 1}, create=True):
+            self.assertEqual(system_info.get_usable_cpu_count(), 2)
+
+    def test_cgroup_v2(self):
+        self._write(self.proc_cgroup, '0::/build/job\n')
+        self._write(os.path.join(self.root, 'build', 'job', 'cpu.max'), 'max 100000\n')
+        self._write(os.path.join(self.root, 'build', 'cpu.max'), '250000 100000\n')  # parent limits too
+        self._write(os.path.join(self.root, 'build', 'job', 'memory.max'), str(4 * GIB))
+        self._write(os.path.join(self.root, 'build', 'job', 'memory.current'), str(GIB))
+
+        self.assertEqual(system_info.get_cgroup_cpu_limit(), 2.5)
+        self.assertEqual(system_info.get_usable_cpu_count(), 3)
+        self.assertEqual(system_info.get_cgroup_memory_available(), 3 * GIB)
+        self.assertEqual(system_info.get_available_memory(), 3 * GIB)
+        self.assertEqual(system_info.get_build_jobs(), 3)
+        self.assertEqual(system_info.get_build_jobs(2 * GIB), 1)
+
+    def test_cgroup_v1(self):
+        self._write(self.proc_cgroup, '4:memory:/docker/abc\n3:cpu,cpuacct:/docker/abc\n')
+        cpu_dir = os.path.join(self.root, 'cpu', 'docker', 'abc')
+        self._write(os.path.join(cpu_dir, 'cpu.cfs_quota_us'), '400000')
+        self._write(os.path.join(cpu_dir, 'cpu.cfs_period_us'), '100000')
+        memory_dir = os.path.join(self.root, 'memory', 'docker', 'abc')
+        self._write(os.path.join(memory_dir, 'memory.limit_in_bytes'), str(2 * GIB))
+        self._write(os.path.join(memory_dir, 'memory.usage_in_bytes'), str(GIB // 2))
+        unlimited_dir = os.path.join(self.root, 'memory')  # root of hierarchy reports huge number
+        self._write(os.path.join(unlimited_dir, 'memory.limit_in_bytes'), str(9223372036854771712))
+        self._write(os.path.join(unlimited_dir, 'memory.usage_in_bytes'), str(GIB))
+
+        self.assertEqual(system_info.get_cgroup_cpu_limit(), 4.0)
+        self.assertEqual(system_info.get_usable_cpu_count(), 4)
+        self.assertEqual(system_info.get_cgroup_memory_available(), GIB + GIB // 2)
+        self.assertEqual(system_info.get_build_jobs(), 1)
+        self.assertEqual(system_info.get_build_jobs(GIB // 4), 4)
+
+    def test_unlimited_cgroup_v1(self):
+        self._write(self.proc_cgroup, '3:cpu,cpuacct:/\n')
+        self._write(os.path.join(self.root, 'cpu', 'cpu.cfs_quota_us'), '-1')
+        self._write(os.path.join(self.root, 'cpu', 'cpu.cfs_period_us'), '100000')
+        self.assertIsNone(system_info.get_cgroup_cpu_limit())
+        self.assertEqual(system_info.get_usable_cpu_count(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()